@@ -103,10 +103,33 @@ def init(site, sites_path=None, new_site=False):
 	if not sites_path:
 		sites_path = '.'
 
+	local.site = site
+	local.sites_path = sites_path
+	local.site_path = os.path.join(sites_path, site)
+
+	init_request_locals(new_site=new_site)
+
+	local.conf = _dict(get_site_config())
+	local.lang = local.conf.lang or "en"
+
+	local.module_app = None
+	local.app_modules = None
+
+	local.jenv = None
+	local.jloader =None
+
+	setup_module_map()
+
+	local.initialised = True
+
+def init_request_locals(new_site=False):
+	"""Reset the request / job scoped state of `frappe.local` (logs, flags, user, response and
+	local caches), leaving the site config, module map and database connection as they are."""
 	local.error_log = []
 	local.message_log = []
 	local.debug_log = []
 	local.realtime_log = []
+	local.realtime_buffer = None
 	local.flags = _dict({
 		"ran_schedulers": [],
 		"currently_saving": [],
@@ -124,41 +147,26 @@ def init(site, sites_path=None, new_site=False):
 	local.rollback_observers = []
 	local.test_objects = {}
 
-	local.site = site
-	local.sites_path = sites_path
-	local.site_path = os.path.join(sites_path, site)
-
 	local.request_ip = None
 	local.response = _dict({"docs":[]})
 	local.task_id = None
 
-	local.conf = _dict(get_site_config())
-	local.lang = local.conf.lang or "en"
 	local.lang_full_dict = None
-
-	local.module_app = None
-	local.app_modules = None
 	local.system_settings = _dict()
 
 	local.user = None
 	local.user_perms = None
-	local.session = None
 	local.role_permissions = {}
 	local.valid_columns = {}
 	local.new_doc_templates = {}
 	local.link_count = {}
+	local.query_profiler = None
 
-	local.jenv = None
-	local.jloader =None
 	local.cache = {}
 	local.meta_cache = {}
 	local.form_dict = _dict()
 	local.session = _dict()
 
-	setup_module_map()
-
-	local.initialised = True
-
 def connect(site=None, db_name=None):
 	"""Connect to site database instance.
 
@@ -204,12 +212,13 @@ def get_conf(site=None):
 			return local.conf
 
 class init_site:
-	def __init__(self, site=None):
+	def __init__(self, site=None, sites_path=None):
 		'''If site==None, initialize it for empty site ('') to load common_site_config.json'''
 		self.site = site or ''
+		self.sites_path = sites_path
 
 	def __enter__(self):
-		init(self.site)
+		init(self.site, sites_path=self.sites_path)
 		return local
 
 	def __exit__(self, type, value, traceback):
@@ -220,6 +229,9 @@ def destroy():
 	if db:
 		db.close()
 
+	if getattr(local, "realtime_buffer", None):
+		local.realtime_buffer.flush()
+
 	release_local(local)
 
 # memcache
@@ -621,6 +633,22 @@ def get_doc(arg1, arg2=None):
 	import frappe.model.document
 	return frappe.model.document.get_doc(arg1, arg2)
 
+def get_docs(doctype, names):
+	"""Return `frappe.model.document.Document` objects of the given type and names, loading
+	the parents and each child table with one query for all of them.
+
+	:param doctype: DocType name as string.
+	:param names: List of document names.
+
+	Example:
+
+		for todo in frappe.get_docs("ToDo", ["TD0001", "TD0002"]):
+			todo.save()
+
+	"""
+	import frappe.model.document
+	return frappe.model.document.get_docs(doctype, names)
+
 def get_last_doc(doctype):
 	"""Get last created document of this type."""
 	d = get_all(doctype, ["name"], order_by="creation desc", limit_page_length=1)
@@ -1334,6 +1362,19 @@ def enqueue(*args, **kwargs):
 	import frappe.utils.background_jobs
 	return frappe.utils.background_jobs.enqueue(*args, **kwargs)
 
+def enqueue_batched(method, key, item, **kwargs):
+	'''
+		Add `item` to a batch, `method` is called with a list of items by one background job
+
+		:param method: method string, called as `method(items)`
+		:param key: items with the same method and key are batched together
+		:param item: value to be added to the batch
+		:param batch_size: (optional) maximum number of items per call
+		:param max_delay: (optional) seconds after the first item at which the batch is processed
+	'''
+	import frappe.utils.background_jobs
+	return frappe.utils.background_jobs.enqueue_batched(method, key, item, **kwargs)
+
 def get_doctype_app(doctype):
 	def _get_doctype_app():
 		doctype_module = local.db.get_value("DocType", doctype, "module")
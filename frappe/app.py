@@ -11,20 +11,13 @@ import logging
 from werkzeug.wrappers import Request
 from werkzeug.local import LocalManager
 from werkzeug.exceptions import HTTPException, NotFound
-from werkzeug.contrib.profiler import ProfilerMiddleware
-from werkzeug.wsgi import SharedDataMiddleware
 
+# handlers (api, website, desk) are imported on their first request, see `warm_up` to preload them
 import frappe
-import frappe.handler
 import frappe.auth
-import frappe.api
-import frappe.async
 import frappe.utils.response
-import frappe.website.render
+import frappe.utils.query_profiler
 from frappe.utils import get_site_name
-from frappe.middlewares import StaticDataMiddleware
-from frappe.utils.error import make_error_snapshot
-from frappe.core.doctype.communication.comment import update_comments_in_parent_after_request
 from frappe import _
 
 local_manager = LocalManager([frappe.local])
@@ -54,11 +47,13 @@ def application(request):
 		init_request(request)
 
 		if frappe.local.form_dict.cmd:
+			import frappe.handler
 			response = frappe.handler.handle()
 
 		elif frappe.request.path.startswith("/api/"):
 			if frappe.local.form_dict.data is None:
 					frappe.local.form_dict.data = request.get_data()
+			import frappe.api
 			response = frappe.api.handle()
 
 		elif frappe.request.path.startswith('/backups'):
@@ -68,6 +63,7 @@ def application(request):
 			response = frappe.utils.response.download_private_file(request.path)
 
 		elif frappe.local.request.method in ('GET', 'HEAD', 'POST'):
+			import frappe.website.render
 			response = frappe.website.render.render()
 
 		else:
@@ -93,6 +89,9 @@ def application(request):
 		if response and hasattr(frappe.local, 'cookie_manager'):
 			frappe.local.cookie_manager.flush_cookies(response=response)
 
+		if getattr(frappe.local, 'query_profiler', None):
+			frappe.utils.query_profiler.stop(response=response)
+
 		frappe.destroy()
 
 	return response
@@ -111,6 +110,9 @@ def init_request(request):
 	if frappe.local.conf.get('maintenance_mode'):
 		raise frappe.SessionStopped
 
+	if frappe.utils.query_profiler.is_enabled_for_request(request):
+		frappe.utils.query_profiler.start()
+
 	make_form_dict(request)
 
 	frappe.local.http_request = frappe.auth.HTTPRequest()
@@ -178,16 +180,20 @@ def handle_exception(e):
 			frappe.local.login_manager.clear_cookies()
 
 	if http_status_code >= 500:
+		from frappe.utils.error import make_error_snapshot
 		frappe.logger().error('Request Error', exc_info=True)
 		make_error_snapshot(e)
 
 	if return_as_message:
+		import frappe.website.render
 		response = frappe.website.render.render("message",
 			http_status_code=http_status_code)
 
 	return response
 
 def after_request(rollback):
+	from frappe.core.doctype.communication.comment import update_comments_in_parent_after_request
+
 	if (frappe.local.request.method in ("POST", "PUT") or frappe.local.flags.commit) and frappe.db:
 		if frappe.db.transaction_writes:
 			frappe.db.commit()
@@ -206,12 +212,88 @@ def after_request(rollback):
 
 application = local_manager.make_middleware(application)
 
+# doctypes needed by almost every request
+warm_up_doctypes = ("DocType", "DocField", "DocPerm", "Custom DocPerm", "User", "Role", "Has Role",
+	"System Settings", "Module Def", "Custom Field", "Property Setter", "File", "Communication",
+	"ToDo", "Version", "Error Log", "Website Settings", "Print Format")
+
+def warm_up(sites=None):
+	'''Loads what the workers of a preforking server (`gunicorn --preload`) would otherwise load
+	lazily on their first requests. Called in the master, before forking, so that workers share
+	it copy-on-write. See `on_starting` to call it from gunicorn.
+
+	- imports all modules of installed apps
+	- compiles jinja templates of installed apps, see `frappe.utils.jinja.get_bytecode_cache`
+	- loads hooks, the module map and metas of core doctypes in the cache of each site
+
+	:param sites: List of sites to warm up, all sites if not given.'''
+	import gc
+	from frappe.utils.jinja import compile_templates
+
+	with frappe.init_site(sites_path=_sites_path):
+		apps = frappe.get_all_apps(with_internal_apps=False, sites_path=_sites_path)
+
+	for app in apps:
+		import_app_modules(app)
+
+	for site in (sites or frappe.utils.get_sites(_sites_path)):
+		try:
+			frappe.init(site=site, sites_path=_sites_path)
+			frappe.connect()
+			frappe.get_hooks()
+			for doctype in warm_up_doctypes:
+				frappe.get_meta(doctype)
+
+			compile_templates()
+
+		except Exception:
+			# site may not be installed completely
+			frappe.logger(__name__).error('Could not warm up site {0}'.format(site), exc_info=True)
+
+		finally:
+			frappe.destroy()
+
+	if hasattr(gc, 'freeze'):
+		# objects created so far are not moved by the collector, so pages stay shared
+		gc.freeze()
+
+def import_app_modules(app):
+	'''Imports all modules of the app, except patches and tests'''
+	import pkgutil
+
+	try:
+		package = frappe.get_module(app)
+	except ImportError:
+		return
+
+	for loader, name, is_package in pkgutil.walk_packages(package.__path__, app + '.',
+		onerror=lambda name: None):
+		if '.patches' in name or '.tests' in name or name.rsplit('.', 1)[-1].startswith('test_'):
+			continue
+
+		try:
+			frappe.get_module(name)
+		except Exception:
+			# imported again, and fails loudly, when a request needs it
+			frappe.logger(__name__).error('Could not import {0}'.format(name), exc_info=True)
+
+def on_starting(server):
+	'''gunicorn server hook, runs `warm_up` in the master before workers are forked. Needs
+	`preload_app`, so that workers inherit what the master loaded. In the gunicorn config file:
+
+		preload_app = True
+		from frappe.app import on_starting'''
+	warm_up()
+
 def serve(port=8000, profile=False, site=None, sites_path='.'):
 	global application, _site, _sites_path
 	_site = site
 	_sites_path = sites_path
 
 	from werkzeug.serving import run_simple
+	from werkzeug.contrib.profiler import ProfilerMiddleware
+	from werkzeug.wsgi import SharedDataMiddleware
+	from frappe.middlewares import StaticDataMiddleware
 
 	if profile:
 		application = ProfilerMiddleware(application, sort_by=('cumtime', 'calls'))
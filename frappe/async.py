@@ -17,6 +17,10 @@ END_LINE = '<!-- frappe: end-file -->'
 TASK_LOG_MAX_AGE = 86400  # 1 day in seconds
 redis_server = None
 
+# messages published within this many seconds of each other are sent together
+REALTIME_FLUSH_INTERVAL = 0.2
+REALTIME_BUFFER_SIZE = 500
+
 @frappe.whitelist()
 def get_pending_tasks_for_doc(doctype, docname):
 	return frappe.db.sql_list("select name from `tabAsync Task` where status in ('Queued', 'Running') and reference_doctype=%s and reference_name=%s", (doctype, docname))
@@ -97,7 +101,7 @@ def publish_realtime(event=None, message=None, room=None,
 		if not params in frappe.local.realtime_log:
 			frappe.local.realtime_log.append(params)
 	else:
-		emit_via_redis(event, message, room)
+		get_realtime_buffer().add(event, message, room)
 
 def emit_via_redis(event, message, room):
 	"""Publish real-time updates via redis
@@ -114,19 +118,91 @@ def emit_via_redis(event, message, room):
 		pass
 
 def put_log(line_no, line, task_id=None):
-	r = get_redis_server()
 	if not task_id:
 		task_id = frappe.local.task_id
-	task_progress_room = get_task_progress_room(task_id)
-	task_log_key = "task_log:" + task_id
-	publish_realtime('task_progress', {
-		"message": {
-			"lines": {line_no: line}
-		},
-		"task_id": task_id
-	}, room=task_progress_room)
-	r.hset(task_log_key, line_no, line)
-	r.expire(task_log_key, 3600)
+
+	# lines are sent and saved together with the other lines of this interval
+	get_realtime_buffer().add_log(task_id, line_no, line)
+
+class RealtimeBuffer(object):
+	'''Publishes messages to redis in one pipeline per `REALTIME_FLUSH_INTERVAL`, instead of
+	one `PUBLISH` per message. The first message after an interval is sent right away, and the
+	rest are sent with the next message after the interval, at commit or at the end of the
+	request / job.
+
+	Only the last `progress` message of a room and title is sent, and task log lines of
+	an interval are sent as one message. A buffer belongs to `frappe.local`, so it is
+	only used by one thread.'''
+	def __init__(self):
+		self.redis = get_redis_server()
+		self.last_flush = 0
+		self.reset()
+
+	def reset(self):
+		self.messages = []
+		self.progress = {}
+		self.logs = {}
+
+	def add(self, event, message, room):
+		payload = frappe.as_json({'event': event, 'message': message, 'room': room})
+		if event == 'progress':
+			key = (room, isinstance(message, dict) and message.get('title'))
+			if key in self.progress:
+				# superseded
+				self.messages[self.progress[key]] = payload
+				payload = None
+			else:
+				self.progress[key] = len(self.messages)
+
+		if payload:
+			self.messages.append(payload)
+
+		self.flush_if_due()
+
+	def add_log(self, task_id, line_no, line):
+		self.logs.setdefault((task_id, get_task_progress_room(task_id)), {})[line_no] = line
+		self.flush_if_due()
+
+	def flush_if_due(self):
+		if (time.time() - self.last_flush >= REALTIME_FLUSH_INTERVAL
+			or len(self.messages) >= REALTIME_BUFFER_SIZE):
+			self.flush()
+
+	def flush(self):
+		messages, logs = self.messages, self.logs
+		self.reset()
+		self.last_flush = time.time()
+
+		if not (messages or logs):
+			return
+
+		pipe = self.redis.pipeline(transaction=False)
+		for (task_id, room), lines in logs.items():
+			task_log_key = "task_log:" + task_id
+			pipe.hmset(task_log_key, lines)
+			pipe.expire(task_log_key, 3600)
+			pipe.publish('events', frappe.as_json({'event': 'task_progress',
+				'message': {'message': {'lines': lines}, 'task_id': task_id},
+				'room': room}))
+
+		for payload in messages:
+			pipe.publish('events', payload)
+
+		try:
+			pipe.execute()
+		except redis.exceptions.ConnectionError:
+			pass
+
+def get_realtime_buffer():
+	if not getattr(frappe.local, 'realtime_buffer', None):
+		frappe.local.realtime_buffer = RealtimeBuffer()
+
+	return frappe.local.realtime_buffer
+
+def flush_realtime_buffer():
+	'''Sends messages published so far, called at the end of a request or job'''
+	if getattr(frappe.local, 'realtime_buffer', None):
+		frappe.local.realtime_buffer.flush()
 
 
 def get_redis_server():
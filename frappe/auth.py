@@ -13,16 +13,13 @@ import frappe.utils.user
 from frappe import conf
 from frappe.sessions import Session, clear_sessions, delete_session
 from frappe.modules.patch_handler import check_session_stopped
-from frappe.translate import get_lang_code
 from frappe.utils.password import check_password
 from frappe.core.doctype.authentication_log.authentication_log import add_authentication_log
 from frappe.utils.background_jobs import enqueue
-from frappe.twofactor import (should_run_2fa, authenticate_for_2factor,
-	confirm_otp_token, get_cached_user_pass)
 
 from six.moves.urllib.parse import quote
 
-import pyotp, base64, os
+import base64, os
 
 class HTTPRequest:
 	def __init__(self):
@@ -53,6 +50,7 @@ class HTTPRequest:
 		frappe.local.login_manager = LoginManager()
 
 		if frappe.form_dict._lang:
+			from frappe.translate import get_lang_code
 			lang = get_lang_code(frappe.form_dict._lang)
 			if lang:
 				frappe.local.lang = lang
@@ -120,6 +118,9 @@ class LoginManager:
 				self.set_user_info()
 
 	def login(self):
+		from frappe.twofactor import (should_run_2fa, authenticate_for_2factor,
+			confirm_otp_token, get_cached_user_pass)
+
 		# clear cache
 		frappe.clear_cache(user = frappe.form_dict.get('usr'))
 		user, pwd = get_cached_user_pass()
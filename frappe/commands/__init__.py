@@ -4,8 +4,6 @@
 from __future__ import unicode_literals, absolute_import, print_function
 import sys
 import click
-import cProfile
-import pstats
 import frappe
 import frappe.utils
 from functools import wraps
@@ -18,12 +16,14 @@ def pass_context(f):
 	def _func(ctx, *args, **kwargs):
 		profile = ctx.obj['profile']
 		if profile:
+			import cProfile
 			pr = cProfile.Profile()
 			pr.enable()
 
 		ret = f(frappe._dict(ctx.obj), *args, **kwargs)
 
 		if profile:
+			import pstats
 			pr.disable()
 			s = StringIO()
 			ps = pstats.Stats(pr, stream=s)\
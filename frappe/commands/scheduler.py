@@ -134,6 +134,26 @@ def show_pending_jobs(context, site=None):
 
 	return pending_jobs
 
+@click.command('job-metrics')
+@click.option('--site', help='site name, all sites if not given')
+@click.option('--hours', default=24, help='number of hours to look back')
+@click.option('--method', default=None, help='only this method')
+def job_metrics(site=None, hours=24, method=None):
+	"Show queue wait and run time of background jobs, per site, queue and method"
+	from frappe.utils.job_metrics import get_job_metrics, format_percentile
+
+	with frappe.init_site(site):
+		metrics = get_job_metrics(site=site, hours=hours, method=method)
+
+	for m in metrics:
+		print("{0} {1} {2}".format(m.site, m.queue, m.method))
+		print("  runs: {0}, finished: {1}, failed: {2}, retries: {3}".format(int(m.count or 0),
+			int(m.finished or 0), int(m.failed or 0), int(m.retries or 0)))
+		for histogram in ('wait', 'run'):
+			if m.get('avg_' + histogram) is not None:
+				print("  {0}: avg {1:.3f}s, p50 {2}, p95 {3}, p99 {4}".format(histogram, m['avg_' + histogram],
+					*[format_percentile(m['{0}_p{1}'.format(histogram, p)]) for p in (50, 95, 99)]))
+
 @click.command('purge-jobs')
 @click.option('--site', help='site name')
 @click.option('--queue', default=None, help='one of "low", "default", "high')
@@ -152,9 +172,11 @@ def start_scheduler():
 
 @click.command('worker')
 @click.option('--queue', type=str)
-def start_worker(queue):
+@click.option('--persistent', is_flag=True, default=False, help='Keep the site context between jobs')
+@click.option('--priority', type=click.Choice(['high', 'normal', 'low']), help='Only pick up jobs of this priority')
+def start_worker(queue, persistent=False, priority=None):
 	from frappe.utils.background_jobs import start_worker
-	start_worker(queue)
+	start_worker(queue, persistent=persistent, priority=priority)
 
 @click.command('ready-for-migration')
 @click.option('--site', help='site name')
@@ -184,6 +206,7 @@ commands = [
 	disable_scheduler,
 	doctor,
 	enable_scheduler,
+	job_metrics,
 	purge_jobs,
 	ready_for_migration,
 	scheduler,
@@ -71,4 +71,42 @@ class TestDocType(unittest.TestCase):
 		field.fieldtype = "HTML"
 		field.label = "Some HTML Field"
 		doc.search_fields = "some_fieldname,some_html_field"
-		self.assertRaises(frappe.ValidationError, doc.save)
\ No newline at end of file
+		self.assertRaises(frappe.ValidationError, doc.save)
+
+	def test_meta_snapshot(self):
+		from frappe.model.meta import get_meta_version
+
+		frappe.clear_cache(doctype="ToDo")
+		meta = frappe.get_meta("ToDo")
+		self.assertEquals(meta.get_field("description").fieldname, "description")
+		self.assertEquals([df.fieldname for df in meta.get_link_fields()],
+			[df.fieldname for df in meta.fields if df.fieldtype=="Link"])
+
+		# the snapshot is reused after the meta cache is cleared
+		version = get_meta_version("ToDo")
+		frappe.cache().delete_value("meta")
+		frappe.local.meta_cache = {}
+		self.assertEquals(frappe.cache().hget("meta_snapshot", "ToDo")[0], version)
+
+		# and rebuilt when a custom field is added
+		custom_field = frappe.get_doc({
+			"doctype": "Custom Field",
+			"dt": "ToDo",
+			"label": "Test Meta Snapshot",
+			"fieldname": "test_meta_snapshot",
+			"fieldtype": "Data"
+		}).insert()
+		frappe.cache().delete_value("meta")
+		frappe.local.meta_cache = {}
+
+		self.assertTrue(frappe.get_meta("ToDo").get_field("test_meta_snapshot"))
+		self.assertNotEquals(get_meta_version("ToDo"), version)
+
+		custom_field.delete()
+		frappe.clear_cache(doctype="ToDo")
+
+		# snapshots are removed when the cache of all doctypes is cleared
+		from frappe.model.meta import clear_cache
+		frappe.get_meta("ToDo")
+		clear_cache()
+		self.assertEquals(frappe.cache().hget("meta_snapshot", "ToDo"), None)
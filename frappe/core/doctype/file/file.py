@@ -12,15 +12,12 @@ import frappe
 import json
 import os
 import shutil
-import requests
-import requests.exceptions
 import mimetypes, imghdr
 
 from frappe.utils.file_manager import delete_file_data_content, get_content_hash, get_random_filename
 from frappe import _
 from frappe.utils.nestedset import NestedSet
 from frappe.utils import strip, get_files_path
-from PIL import Image, ImageOps
 from six import StringIO, string_types
 from six.moves.urllib.parse import unquote
 import zipfile
@@ -175,6 +172,9 @@ class File(NestedSet):
 =======
 	def make_thumbnail(self, set_as_thumbnail=True, width=300, height=300, suffix="small", crop=False):
 >>>>>>> 176d241496ede1357a309fa44a037b757a252581
+		import requests.exceptions
+		from PIL import Image, ImageOps
+
 		if self.file_url:
 			if self.file_url.startswith("/files"):
 				try:
@@ -359,6 +359,7 @@ def get_extension(filename, extn, content):
 	return extn
 
 def get_local_image(file_url):
+	from PIL import Image
 	file_path = frappe.get_site_path("public", file_url.lstrip("/"))
 
 	try:
@@ -384,6 +385,9 @@ def get_local_image(file_url):
 	return image, filename, extn
 
 def get_web_image(file_url):
+	import requests, requests.exceptions
+	from PIL import Image
+
 	# download
 	file_url = frappe.utils.get_url(file_url)
 	r = requests.get(file_url, stream=True)
@@ -44,9 +44,11 @@ class Report(Document):
 
 	def on_update(self):
 		self.export_doc()
+		frappe.cache().delete_value("cached_report_dependencies")
 
 	def on_trash(self):
 		delete_custom_role('report', self.name)
+		frappe.cache().delete_value("cached_report_dependencies")
 
 	def set_doctype_roles(self):
 		if not self.get('roles') and self.is_standard == 'No':
@@ -53,3 +53,85 @@ class TestReport(unittest.TestCase):
 			report = frappe.get_doc('Report', 'Test Report')
 
 		self.assertNotEquals(report.is_permitted(), True)
+
+	def test_report_result_cache(self):
+		from frappe.desk.query_report import (run, get_report_cache_key, get_prepared_report,
+			get_report_dependencies)
+
+		if frappe.db.exists("Report", "Test Cached Report"):
+			frappe.delete_doc("Report", "Test Cached Report")
+
+		report = frappe.get_doc({
+			'doctype': 'Report',
+			'ref_doctype': 'ToDo',
+			'report_name': 'Test Cached Report',
+			'report_type': 'Query Report',
+			'is_standard': 'No',
+			'query': 'select name from tabToDo',
+			'cache_results': 1
+		}).insert(ignore_permissions=True)
+
+		key = get_report_cache_key(report, [], frappe.session.user)
+		out = run(report.name)
+		self.assertEquals(frappe.cache().get_value(key, expires=True), out)
+		self.assertEquals(get_prepared_report(report.name), out)
+
+		# filters and writes to the ref doctype change the key
+		self.assertNotEquals(get_report_cache_key(report, {"owner": "Guest"}, frappe.session.user), key)
+
+		# versions change when the transaction is committed
+		todo = frappe.get_doc({"doctype": "ToDo", "description": "_Test cached report"}).insert()
+		self.assertEquals(get_report_cache_key(report, [], frappe.session.user), key)
+		frappe.db.commit()
+		key = get_report_cache_key(report, [], frappe.session.user)
+		self.assertTrue(todo.name in [d[0] for d in run(report.name)["result"]])
+
+		# and on writes through frappe.db
+		frappe.db.set_value("ToDo", todo.name, "description", "_Test cached report changed")
+		frappe.db.commit()
+		self.assertNotEquals(get_report_cache_key(report, [], frappe.session.user), key)
+
+		todo.delete()
+		frappe.db.commit()
+
+		# child tables are invalidated by saving their parent
+		report.cache_depends_on = "Has Role"
+		dependencies = get_report_dependencies(report)
+		self.assertTrue("User" in dependencies)
+		self.assertFalse("Has Role" in dependencies)
+
+	def test_export_file(self):
+		from frappe.desk.reportview import get_export_data, write_export_file
+
+		frappe.get_doc({"doctype": "ToDo", "description": "_Test export"}).insert()
+		rows, total = get_export_data("ToDo", {"fields": ["`tabToDo`.`name`", "`tabToDo`.`description`"],
+			"filters": [["ToDo", "description", "=", "_Test export"]], "as_list": True}, with_count=True)
+
+		path = write_export_file(rows, "CSV", "ToDo", total=total)
+		with open(path, "r") as f:
+			content = f.read()
+		os.remove(path)
+
+		self.assertEquals(total, 1)
+		self.assertTrue(content.startswith("Sr,Name,Description"))
+		self.assertTrue("_Test export" in content)
+
+	def test_export_permission(self):
+		from frappe.desk.query_report import get_export_data
+
+		if not frappe.db.exists("Report", "Test Export Report"):
+			frappe.get_doc({
+				'doctype': 'Report',
+				'ref_doctype': 'ToDo',
+				'report_name': 'Test Export Report',
+				'report_type': 'Query Report',
+				'is_standard': 'No',
+				'query': 'select name from tabToDo'
+			}).insert(ignore_permissions=True)
+
+		# no roles on the report, but no report permission on ToDo
+		frappe.set_user("Guest")
+		try:
+			self.assertRaises(frappe.PermissionError, get_export_data, "Test Export Report", {})
+		finally:
+			frappe.set_user("Administrator")
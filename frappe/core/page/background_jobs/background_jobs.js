@@ -13,6 +13,19 @@ frappe.pages['background_jobs'].on_page_load = function(wrapper) {
 
 frappe.pages['background_jobs'].on_page_show = function(wrapper) {
 	frappe.pages.background_jobs.refresh_jobs();
+	frappe.pages.background_jobs.show_metrics();
+}
+
+frappe.pages.background_jobs.show_metrics = function() {
+	var page = frappe.pages.background_jobs.page;
+
+	frappe.call({
+		method: 'frappe.core.page.background_jobs.background_jobs.get_job_metrics',
+		callback: function(r) {
+			page.body.find('.metrics-area').html(
+				frappe.render_template('background_jobs_metrics', {metrics: r.message || []}));
+		}
+	});
 }
 
 frappe.pages.background_jobs.refresh_jobs = function() {
@@ -49,3 +49,9 @@ def get_info(show_failed=False):
 				for j in q.get_jobs()[:10]: add_job(j, q.name)
 
 	return jobs
+
+@frappe.whitelist()
+def get_job_metrics(hours=24):
+	'''Returns wait and run time of jobs of this site, per queue and method'''
+	from frappe.utils.job_metrics import get_job_metrics as _get_job_metrics
+	return _get_job_metrics(site=frappe.local.site, hours=cint(hours) or 24)
@@ -6,9 +6,10 @@ from __future__ import unicode_literals
 import frappe, json
 from frappe import _
 import frappe.permissions
-import re, csv, os
+import re, csv, os, tempfile
 from frappe.utils.csvutils import UnicodeWriter
-from frappe.utils import cstr, formatdate, format_datetime
+from frappe.desk.reportview import set_export_response
+from frappe.utils import formatdate, format_datetime, get_user_format
 from  frappe.core.page.data_import_tool.data_import_tool import get_data_keys
 from six import string_types
 
@@ -214,8 +215,15 @@ def get_template(doctype=None, parent_doctype=None, all_doctypes="No", with_data
 			if 'lft' in table_columns and 'rgt' in table_columns:
 				order_by = '`tab{doctype}`.`lft` asc'.format(doctype=parent_doctype)
 
+			# load meta and date format before streaming,
+			# no other query can run while rows are being fetched
+			frappe.get_meta(doctype)
+			get_user_format()
+
 			# get permitted data only
-			data = frappe.get_list(doctype, fields=["*"], limit_page_length=None, order_by=order_by)
+			# stream parent rows if child rows need not be queried for each of them
+			data = frappe.get_list(doctype, fields=["*"], limit_page_length=None, order_by=order_by,
+				as_iterator=not all_doctypes)
 
 			for doc in data:
 				op = docs_to_export.get("op")
@@ -256,52 +264,45 @@ def get_template(doctype=None, parent_doctype=None, all_doctypes="No", with_data
 				for row in row_group:
 					w.writerow(row)
 
-	w = UnicodeWriter()
-	key = 'parent' if parent_doctype != doctype else 'name'
-
-	add_main_header()
-
-	w.writerow([''])
-	tablerow = [get_data_keys_definition().doctype, ""]
-	labelrow = [_("Column Labels:"), "ID"]
-	fieldrow = [get_data_keys_definition().columns, key]
-	mandatoryrow = [_("Mandatory:"), _("Yes")]
-	typerow = [_('Type:'), 'Data (text)']
-	inforow = [_('Info:'), '']
-	columns = [key]
-
-	build_field_columns(doctype)
+	# rows are written to a temporary file as they are read
+	fd, path = tempfile.mkstemp(suffix=".csv")
+	with os.fdopen(fd, "wb") as f:
+		w = UnicodeWriter(file=f)
+		key = 'parent' if parent_doctype != doctype else 'name'
 
-	if all_doctypes:
-		for d in child_doctypes:
-			append_empty_field_column()
-			if (select_columns and select_columns.get(d['doctype'], None)) or not select_columns:
-				# if atleast one column is selected for this doctype
-				build_field_columns(d['doctype'], d['parentfield'])
+		add_main_header()
 
-	add_field_headings()
-	add_data()
+		w.writerow([''])
+		tablerow = [get_data_keys_definition().doctype, ""]
+		labelrow = [_("Column Labels:"), "ID"]
+		fieldrow = [get_data_keys_definition().columns, key]
+		mandatoryrow = [_("Mandatory:"), _("Yes")]
+		typerow = [_('Type:'), 'Data (text)']
+		inforow = [_('Info:'), '']
+		columns = [key]
+
+		build_field_columns(doctype)
+
+		if all_doctypes:
+			for d in child_doctypes:
+				append_empty_field_column()
+				if (select_columns and select_columns.get(d['doctype'], None)) or not select_columns:
+					# if atleast one column is selected for this doctype
+					build_field_columns(d['doctype'], d['parentfield'])
+
+		add_field_headings()
+		add_data()
 
 	if from_data_import == "Yes" and excel_format == "Yes":
-		filename = frappe.generate_hash("", 10)
-		with open(filename, 'wb') as f:
-			f.write(cstr(w.getvalue()).encode("utf-8"))
-		f = open(filename)
-		reader = csv.reader(f)
-
 		from frappe.utils.xlsxutils import make_xlsx
-		xlsx_file = make_xlsx(reader, "Data Import Template")
 
-		f.close()
-		os.remove(filename)
+		xlsx_path = path[:-len(".csv")] + ".xlsx"
+		with open(path) as f, open(xlsx_path, "wb") as xlsx_file:
+			make_xlsx(csv.reader(f), "Data Import Template", xlsx_file)
+		os.remove(path)
 
-		# write out response as a xlsx type
-		frappe.response['filename'] = doctype + '.xlsx'
-		frappe.response['filecontent'] = xlsx_file.getvalue()
-		frappe.response['type'] = 'binary'
+		# send the file from disk
+		set_export_response(xlsx_path, doctype, "Excel")
 
 	else:
-		# write out response as a type csv
-		frappe.response['result'] = cstr(w.getvalue())
-		frappe.response['type'] = 'csv'
-		frappe.response['doctype'] = doctype
+		set_export_response(path, doctype, "CSV")
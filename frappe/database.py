@@ -7,20 +7,23 @@
 from __future__ import unicode_literals
 import MySQLdb
 from MySQLdb.times import DateTimeDeltaType
-from markdown2 import UnicodeWithAttrs
+from MySQLdb.cursors import SSCursor
 import warnings
 import datetime
+import time
 import frappe
 import frappe.defaults
 import frappe.async
 import re
 import redis
+from itertools import islice
 import frappe.model.meta
 from frappe.utils import now, get_datetime, cstr
 from frappe import _
 from six import text_type, binary_type, string_types, integer_types
 from frappe.utils.global_search import sync_global_search
 from frappe.model.utils.link_count import flush_local_link_count
+from frappe.utils import query_profiler
 from six import iteritems, text_type
 
 
@@ -46,12 +49,20 @@ class Database:
 
 		self.password = password or frappe.conf.db_password
 		self.value_cache = {}
+		self._unbuffered_cursor = None
+
+		# results of `get_values` for this connection (request / job), by doctype
+		self.lookup_cache = {}
+		self.lookup_cache_size = 0
+		self.lookup_cache_hits = 0
+		self.lookup_cache_misses = 0
 
 	def get_db_login(self, ac_name):
 		return ac_name
 
 	def connect(self):
 		"""Connects to a database as set in `site_config.json`."""
+		from markdown2 import UnicodeWithAttrs
 		warnings.filterwarnings('ignore', category=MySQLdb.Warning)
 		usessl = 0
 		if frappe.conf.db_ssl_ca and frappe.conf.db_ssl_cert and frappe.conf.db_ssl_key:
@@ -99,7 +110,8 @@ class Database:
 			frappe.throw(_("Not permitted"), frappe.PermissionError)
 
 	def sql(self, query, values=(), as_dict = 0, as_list = 0, formatted = 0,
-		debug=0, ignore_ddl=0, as_utf8=0, auto_commit=0, update=None):
+		debug=0, ignore_ddl=0, as_utf8=0, auto_commit=0, update=None, as_iterator=0,
+		chunk_size=1000, as_record=0):
 		"""Execute a SQL query and fetch all rows.
 
 		:param query: SQL query.
@@ -112,6 +124,9 @@ class Database:
 		:param as_utf8: Encode values as UTF 8.
 		:param auto_commit: Commit after executing the query.
 		:param update: Update this dict to all rows (if returned `as_dict`).
+		:param as_iterator: Stream rows from an unbuffered (server-side) cursor instead of fetching all.
+		:param chunk_size: Number of rows fetched at a time when `as_iterator` is set.
+		:param as_record: Return rows as read-only `Record` objects (lighter than `as_dict`).
 
 		Examples:
 
@@ -125,17 +140,34 @@ class Database:
 			frappe.db.sql("select name from tabCustomer where name like %(name)s and owner=%(owner)s",
 				{"name": "a%", "owner":"test@example.com"})
 
+			# stream a large table without loading it in memory
+			for d in frappe.db.sql("select name, email from tabContact", as_dict=True, as_iterator=True):
+				print(d.email)
+
 		"""
 		if not self._conn:
 			self.connect()
 
+		if self._unbuffered_cursor:
+			# the server sends nothing else until all rows of the streamed result are read
+			raise frappe.QueryInProgressError(_("Cannot run a query while the result of another query is being streamed"))
+
 		# in transaction validations
 		self.check_transaction_status(query)
 
+		if self.lookup_cache:
+			self.invalidate_lookup_cache(query)
+
 		# autocommit
 		if auto_commit: self.commit()
 
+		cursor = self._cursor
+		if as_iterator:
+			# unbuffered cursor: rows stay on the server until fetched
+			cursor = self._unbuffered_cursor = self._conn.cursor(SSCursor)
+
 		# execute
+		start_time = time.time()
 		try:
 			if values!=():
 				if isinstance(values, dict):
@@ -158,7 +190,7 @@ class Database:
 					frappe.log("with values:")
 					frappe.log(values)
 					frappe.log(">>>>")
-				self._cursor.execute(query, values)
+				cursor.execute(query, values)
 
 			else:
 				if debug:
@@ -169,7 +201,7 @@ class Database:
 					frappe.log(query)
 					frappe.log(">>>>")
 
-				self._cursor.execute(query)
+				cursor.execute(query)
 
 		except Exception as e:
 			# ignore data definition errors
@@ -186,12 +218,24 @@ class Database:
 			# 		auto_commit=auto_commit, update=update)
 
 			else:
+				if as_iterator:
+					self._unbuffered_cursor = None
+					cursor.close()
 				raise
 
+		if frappe.conf.slow_query_threshold or getattr(frappe.local, "query_profiler", None):
+			query_profiler.record(query, values, time.time() - start_time, cursor.rowcount)
+
+		if as_iterator:
+			return UnbufferedResult(self, cursor, self.iterate_cursor(cursor, chunk_size, as_dict=as_dict,
+				as_list=as_list, as_utf8=as_utf8, update=update, as_record=as_record))
+
 		if auto_commit: self.commit()
 
 		# scrub output if required
-		if as_dict:
+		if as_record:
+			return self.fetch_as_records()
+		elif as_dict:
 			ret = self.fetch_as_dict(formatted, as_utf8)
 			if update:
 				for r in ret:
@@ -204,6 +248,63 @@ class Database:
 		else:
 			return self._cursor.fetchall()
 
+	def iter_sql(self, query, values=(), as_dict=0, as_list=0, chunk_size=1000, debug=0, update=None):
+		"""Execute a SQL query and return an iterator over its rows. Rows are fetched
+		`chunk_size` at a time from an unbuffered cursor, so memory is bounded by the chunk
+		and not by the size of the result.
+
+		**Note:** no other query can be run on this connection until the iterator is exhausted
+		or closed. Use it as a context manager to close it if rows may be left unread.
+
+		Example:
+
+			with frappe.db.iter_sql("select name, email from tabContact") as rows:
+				for name, email in rows:
+					...
+		"""
+		return self.sql(query, values, as_dict=as_dict, as_list=as_list, debug=debug,
+			update=update, as_iterator=True, chunk_size=chunk_size)
+
+	def iterate_cursor(self, cursor, chunk_size=1000, as_dict=0, as_list=0, as_utf8=0, update=None,
+		as_record=0):
+		"""Internal. Yields rows from an unbuffered cursor, fetching `chunk_size` rows at a time.
+		The cursor is closed by the `UnbufferedResult` wrapping this generator."""
+		columns = [d[0] for d in cursor.description or ()]
+		record_type = get_record_type(columns) if as_record else None
+		while True:
+			rows = cursor.fetchmany(chunk_size)
+			if not rows:
+				break
+
+			for r in rows:
+				if as_utf8:
+					r = [v.encode('utf-8') if type(v) is text_type else v for v in r]
+
+				if as_record:
+					r = record_type(r)
+				elif as_dict:
+					r = frappe._dict(zip(columns, r))
+					if update:
+						r.update(update)
+				elif as_list or as_utf8:
+					r = list(r)
+
+				yield r
+
+	def close_unbuffered_cursor(self, cursor):
+		"""Internal. Read the unread rows of a cursor opened for `as_iterator`, close it
+		and release the connection."""
+		if self._unbuffered_cursor is not cursor:
+			# already released, or the connection was closed
+			return
+
+		self._unbuffered_cursor = None
+		try:
+			while cursor.fetchmany(10000):
+				pass
+		finally:
+			cursor.close()
+
 	def explain_query(self, query, values=None):
 		"""Print `EXPLAIN` in error log."""
 		try:
@@ -256,23 +357,36 @@ class Database:
 	def fetch_as_dict(self, formatted=0, as_utf8=0):
 		"""Internal. Converts results to dict."""
 		result = self._cursor.fetchall()
+		columns = self.get_column_names()
+
+		if not (formatted or as_utf8):
+			# values are returned as is, no need to look at each one of them
+			return [frappe._dict(zip(columns, r)) for r in result]
+
 		ret = []
 		needs_formatting = self.needs_formatting(result, formatted)
 
 		for r in result:
-			row_dict = frappe._dict({})
-			for i in range(len(r)):
+			values = []
+			for val in r:
 				if needs_formatting:
-					val = self.convert_to_simple_type(r[i], formatted)
-				else:
-					val = r[i]
+					val = self.convert_to_simple_type(val, formatted)
 
 				if as_utf8 and type(val) is text_type:
 					val = val.encode('utf-8')
-				row_dict[self._cursor.description[i][0]] = val
-			ret.append(row_dict)
+				values.append(val)
+			ret.append(frappe._dict(zip(columns, values)))
 		return ret
 
+	def fetch_as_records(self):
+		"""Internal. Converts results to read-only `Record` objects."""
+		record_type = get_record_type(self.get_column_names())
+		return [record_type(r) for r in self._cursor.fetchall()]
+
+	def get_column_names(self):
+		"""Returns column names of the last result."""
+		return [d[0] for d in self._cursor.description or ()]
+
 	def needs_formatting(self, result, formatted):
 		"""Returns true if the first row in the result has a Date, Datetime, Long Int."""
 		if result and result[0]:
@@ -285,8 +399,8 @@ class Database:
 		return False
 
 	def get_description(self):
-		"""Returns result metadata."""
-		return self._cursor.description
+		"""Returns result metadata (of the result being streamed, if any)."""
+		return (self._unbuffered_cursor or self._cursor).description
 
 	def convert_to_simple_type(self, v, formatted=0):
 		"""Format date, time, longint values."""
@@ -319,6 +433,9 @@ class Database:
 
 	def convert_to_lists(self, res, formatted=0, as_utf8=0):
 		"""Convert tuple output to lists (internal)."""
+		if not (formatted or as_utf8):
+			return [list(r) for r in res]
+
 		nres = []
 		needs_formatting = self.needs_formatting(res, formatted)
 		for r in res:
@@ -462,6 +579,16 @@ class Database:
 			(doctype, filters, fieldname) in self.value_cache:
 			return self.value_cache[(doctype, filters, fieldname)]
 
+		lookup_key = None
+		if not (debug or update or isinstance(filters, list)):
+			lookup_key = get_lookup_key(filters, fieldname, ignore, as_dict, order_by)
+			if lookup_key is not None:
+				cached = self.lookup_cache.get(doctype, {}).get(lookup_key)
+				if cached is not None:
+					self.lookup_cache_hits += 1
+					return copy_rows(cached)
+				self.lookup_cache_misses += 1
+
 		if not order_by: order_by = 'modified desc'
 
 		if isinstance(filters, list):
@@ -493,8 +620,49 @@ class Database:
 		if cache and isinstance(filters, string_types):
 			self.value_cache[(doctype, filters, fieldname)] = out
 
+		if lookup_key is not None and out is not None:
+			self.set_lookup_cache(doctype, lookup_key, out)
+			out = copy_rows(out)
+
 		return out
 
+	def set_lookup_cache(self, doctype, key, value):
+		"""Internal. Cache result of a `get_values` lookup till the next write on `doctype`."""
+		if self.lookup_cache_size >= LOOKUP_CACHE_MAX_SIZE:
+			self.clear_lookup_cache()
+
+		self.lookup_cache.setdefault(doctype, {})[key] = value
+		self.lookup_cache_size += 1
+
+	def invalidate_lookup_cache(self, query):
+		"""Internal. Drop cached lookups of tables the query may write to.
+		Clears everything on rollback or if the tables cannot be found."""
+		cmd = query.lstrip()[:10].lower().split(None, 1)
+		if cmd and cmd[0] in READ_QUERY_COMMANDS:
+			return
+
+		tables = set(a or b for a, b in TABLE_NAME_PATTERN.findall(query))
+		if not tables or "Singles" in tables or (cmd and cmd[0]=="rollback"):
+			self.clear_lookup_cache()
+			return
+
+		for doctype in tables:
+			if doctype in self.lookup_cache:
+				self.lookup_cache_size -= len(self.lookup_cache.pop(doctype))
+
+	def clear_lookup_cache(self):
+		self.lookup_cache = {}
+		self.lookup_cache_size = 0
+
+	def get_lookup_cache_stats(self):
+		"""Returns hits, misses and the rate of lookups served from the request cache."""
+		total = self.lookup_cache_hits + self.lookup_cache_misses
+		return frappe._dict({
+			"hits": self.lookup_cache_hits,
+			"misses": self.lookup_cache_misses,
+			"hit_rate": (float(self.lookup_cache_hits) / total) if total else 0.0
+		})
+
 	def get_values_from_single(self, fields, filters, doctype, as_dict=False, debug=False, update=None):
 		"""Get values from `tabSingles` (Single DocTypes) (internal).
 
@@ -626,6 +794,45 @@ class Database:
 		else:
 			return {}
 
+	def bulk_insert(self, doctype, fields, values, chunk_size=10000, ignore_duplicates=False,
+		update_on_duplicate=None):
+		"""Insert many rows in the table of the given DocType, with one `INSERT` query
+		for every `chunk_size` rows. Does not call the ORM triggers or set defaults.
+
+		:param doctype: DocType name, or the name of a table starting with `__` (like `__global_search`).
+		:param fields: List of column names.
+		:param values: List (or iterator) of rows, each row having values in the order of `fields`.
+		:param chunk_size: Number of rows inserted per query.
+		:param ignore_duplicates: Skip rows that violate a unique key (`INSERT IGNORE`).
+		:param update_on_duplicate: List of fields to update from the row if it violates a unique key.
+
+		Example:
+
+			frappe.db.bulk_insert("ToDo", ["name", "description"],
+				[["todo-1", "Call Jane"], ["todo-2", "Call John"]])
+		"""
+		query = "insert {ignore}into `{table}` ({fields}) values ".format(
+			ignore="ignore " if ignore_duplicates else "",
+			table=doctype if doctype.startswith("__") else "tab" + doctype,
+			fields=", ".join(["`" + f + "`" for f in fields]))
+		row_placeholder = "(" + ", ".join(["%s"] * len(fields)) + ")"
+		on_duplicate = ""
+		if update_on_duplicate:
+			on_duplicate = " on duplicate key update " + ", ".join(["`{0}` = values(`{0}`)".format(f)
+				for f in update_on_duplicate])
+
+		values = iter(values)
+		while True:
+			rows = list(islice(values, chunk_size))
+			if not rows:
+				break
+
+			self.sql(query + ", ".join([row_placeholder] * len(rows)) + on_duplicate,
+				[v for row in rows for v in row])
+
+		if not doctype.startswith("__"):
+			self.clear_report_cache(doctype)
+
 	def update(self, *args, **kwargs):
 		"""Update multiple values. Alias for `set_value`."""
 		return self.set_value(*args, **kwargs)
@@ -689,6 +896,8 @@ class Database:
 		if dt in self.value_cache:
 			del self.value_cache[dt]
 
+		self.clear_report_cache(dt)
+
 	def set(self, doc, field, val):
 		"""Set value in document. **Avoid**"""
 		doc.db_set(field, val)
@@ -699,6 +908,7 @@ class Database:
 		modified = now()
 		frappe.db.sql("""update `tab{doctype}` set `modified`=%s
 			where name=%s""".format(doctype=doctype), (modified, docname))
+		self.clear_report_cache(doctype)
 		return modified
 
 	def set_temp(self, value):
@@ -753,13 +963,24 @@ class Database:
 		self.flush_realtime_log()
 		self.enqueue_global_search()
 		flush_local_link_count()
+		self.update_report_data_versions()
+
+	def update_report_data_versions(self):
+		if frappe.flags.report_data_changed:
+			from frappe.desk.query_report import update_report_data_versions
+			update_report_data_versions()
+
+	def clear_report_cache(self, doctype):
+		from frappe.desk.query_report import clear_report_cache
+		clear_report_cache(doctype)
 
 	def enqueue_global_search(self):
 		if frappe.flags.update_global_search:
 			try:
-				frappe.enqueue('frappe.utils.global_search.sync_global_search',
-					now=frappe.flags.in_test or frappe.flags.in_install or frappe.flags.in_migrate,
-					flags=frappe.flags.update_global_search)
+				# values of many requests are synced together
+				frappe.enqueue_batched('frappe.utils.global_search.sync_global_search_batch',
+					'global_search', frappe.flags.update_global_search,
+					now=frappe.flags.in_test or frappe.flags.in_install or frappe.flags.in_migrate)
 			except redis.exceptions.ConnectionError:
 				sync_global_search()
 
@@ -767,14 +988,18 @@ class Database:
 
 	def flush_realtime_log(self):
 		for args in frappe.local.realtime_log:
-			frappe.async.emit_via_redis(*args)
+			frappe.async.get_realtime_buffer().add(*args)
 
 		frappe.local.realtime_log = []
 
+		# sent in one pipeline, along with messages published before the commit
+		frappe.async.flush_realtime_buffer()
+
 	def rollback(self):
 		"""`ROLLBACK` current transaction."""
 		self.sql("rollback")
 		self.begin()
+		frappe.flags.report_data_changed = []
 		for obj in frappe.local.rollback_observers:
 			if hasattr(obj, "on_rollback"):
 				obj.on_rollback()
@@ -888,6 +1113,7 @@ class Database:
 			self._cursor.close()
 			self._conn.close()
 			self._cursor = None
+			self._unbuffered_cursor = None
 			self._conn = None
 
 	def escape(self, s, percent=True):
@@ -906,3 +1132,143 @@ class Database:
 			s = s.replace("%", "%%")
 
 		return s
+
+
+LOOKUP_CACHE_MAX_SIZE = 10000
+READ_QUERY_COMMANDS = ("select", "show", "desc", "describe", "explain", "commit", "start", "begin")
+TABLE_NAME_PATTERN = re.compile(r"`tab([^`]+)`|\btab(\w+)")
+
+def get_lookup_key(filters, fieldname, *args):
+	"""Returns a hashable key for the arguments of a `get_values` lookup,
+	`None` if they cannot be cached."""
+	def _freeze(value):
+		if isinstance(value, dict):
+			return tuple(sorted((k, _freeze(v)) for k, v in iteritems(value)))
+		elif isinstance(value, (list, tuple)):
+			return tuple(_freeze(v) for v in value)
+		return value
+
+	key = (_freeze(filters), _freeze(fieldname)) + args
+	try:
+		hash(key)
+	except TypeError:
+		return None
+
+	return key
+
+def copy_rows(rows):
+	"""Returns a copy of cached `get_values` rows, so that callers can modify them."""
+	return [frappe._dict(r) if isinstance(r, dict) else (list(r) if isinstance(r, list) else r)
+		for r in rows]
+
+class UnbufferedResult(object):
+	"""Iterator over the rows of a query streamed from an unbuffered cursor (`as_iterator`).
+
+	The cursor is closed when the rows are exhausted, when `close` is called, at the end
+	of a `with` block or when the iterator is garbage collected, whichever is first."""
+	def __init__(self, db, cursor, rows):
+		self.db = db
+		self.cursor = cursor
+		self.rows = rows
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		try:
+			return next(self.rows)
+		except BaseException:
+			# StopIteration or an error while fetching
+			self.close()
+			raise
+
+	next = __next__
+
+	def close(self):
+		if self.cursor is not None:
+			cursor, self.cursor = self.cursor, None
+			self.rows.close()
+			self.db.close_unbuffered_cursor(cursor)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def __del__(self):
+		try:
+			self.close()
+		except Exception:
+			# connection already closed
+			pass
+
+class Record(tuple):
+	"""Read-only, tuple backed query result row. Values can be accessed by index,
+	column name or as attributes, like `frappe._dict`, at a fraction of its memory.
+
+	Use `frappe.db.sql(query, as_record=True)` for rows that will not be modified.
+	Columns that clash with tuple methods (`count`, `index`) can only be read with `get`."""
+	__slots__ = ()
+	_fields = ()
+	_index = {}
+
+	def __getattr__(self, key):
+		idx = self._index.get(key)
+		if idx is None:
+			if key.startswith("__"):
+				raise AttributeError(key)
+			return None
+		return tuple.__getitem__(self, idx)
+
+	def __setattr__(self, key, value):
+		raise AttributeError("Record is read-only")
+
+	def __getitem__(self, key):
+		if isinstance(key, string_types):
+			return tuple.__getitem__(self, self._index[key])
+		return tuple.__getitem__(self, key)
+
+	def __contains__(self, key):
+		return key in self._index
+
+	def __reduce__(self):
+		# record classes are created at runtime, pickle the columns along with the values
+		return (make_record, (self._fields, tuple(self)))
+
+	def get(self, key, default=None):
+		idx = self._index.get(key)
+		return default if idx is None else tuple.__getitem__(self, idx)
+
+	def keys(self):
+		return list(self._fields)
+
+	def values(self):
+		return list(self)
+
+	def items(self):
+		return list(zip(self._fields, self))
+
+	def as_dict(self):
+		"""Returns a mutable `frappe._dict` copy of this row."""
+		return frappe._dict(zip(self._fields, self))
+
+	def __repr__(self):
+		return "Record({0})".format(", ".join("{0}={1!r}".format(k, v) for k, v in self.items()))
+
+_record_types = {}
+
+def get_record_type(columns):
+	"""Returns a `Record` class for the given column names, created once per set of columns."""
+	columns = tuple(columns)
+	if columns not in _record_types:
+		_record_types[columns] = type(str("Record"), (Record,), {
+			"__slots__": (),
+			"_fields": columns,
+			"_index": dict((c, i) for i, c in enumerate(columns))
+		})
+
+	return _record_types[columns]
+
+def make_record(columns, values):
+	return get_record_type(columns)(values)
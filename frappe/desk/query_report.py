@@ -4,18 +4,22 @@
 from __future__ import unicode_literals
 
 import frappe
-import os, json
+import os, json, hashlib
 
 from frappe import _
 from frappe.modules import scrub, get_module_path
-from frappe.utils import flt, cint, get_html_format, cstr
+from frappe.utils import flt, cint, get_html_format, cstr, now
 from frappe.model.utils import render_include
 from frappe.translate import send_translations
 import frappe.desk.reportview
 from frappe.permissions import get_role_permissions
 from six import string_types
 
+PREPARE_TIMEOUT = 1500
+
 def get_report_doc(report_name):
+	"""Returns the Report if the user has one of its roles and report permission on its
+	`ref_doctype`. Every path that reads the result of a report must get it from here"""
 	doc = frappe.get_doc("Report", report_name)
 	if not doc.is_permitted():
 		frappe.throw(_("You don't have access to Report: {0}").format(report_name), frappe.PermissionError)
@@ -74,21 +78,21 @@ def run(report_name, filters=None, user=None):
 	if filters and isinstance(filters, string_types):
 		filters = json.loads(filters)
 
-	if not frappe.has_permission(report.ref_doctype, "report"):
-		frappe.msgprint(_("Must have report permission to access this report."),
-			raise_exception=True)
+	if cint(report.cache_results):
+		key = get_report_cache_key(report, filters, user)
+		out = frappe.cache().get_value(key, expires=True)
+		if out is None:
+			out = get_report_result(report, filters, user)
+			frappe.cache().set_value(key, out, expires_in_sec=get_cache_ttl(report))
+		return out
+
+	return get_report_result(report, filters, user)
 
+def get_report_result(report, filters, user):
 	columns, result, message, chart, data_to_be_printed = [], [], None, None, None
 	if report.report_type=="Query Report":
-		if not report.query:
-			frappe.msgprint(_("Must specify a Query to run"), raise_exception=True)
-
-
-		if not report.query.lower().startswith("select"):
-			frappe.msgprint(_("Query must be a SELECT"), raise_exception=True)
-
-		result = [list(t) for t in frappe.db.sql(report.query, filters)]
-		columns = [cstr(c[0]) for c in frappe.db.get_description()]
+		columns, result = get_query_result(report, filters)
+		result = [list(t) for t in result]
 	else:
 		module = report.module or frappe.db.get_value("DocType", report.ref_doctype, "module")
 		if report.is_standard=="Yes":
@@ -118,6 +122,144 @@ def run(report_name, filters=None, user=None):
 	}
 
 
+@frappe.whitelist()
+def prepare_report(report_name, filters=None):
+	"""Run a cached report in the background. Returns `ready` if the result is already
+	cached, else `queued` and `report_prepared` is published to the user when it is"""
+	report = get_report_doc(report_name)
+	if not cint(report.cache_results):
+		frappe.throw(_("Result cache is not enabled for Report {0}").format(report_name))
+
+	if filters and isinstance(filters, string_types):
+		filters = json.loads(filters)
+
+	user = frappe.session.user
+	key = get_report_cache_key(report, filters or [], user)
+	if frappe.cache().get_value(key, expires=True) is not None:
+		return {"status": "ready", "key": key}
+
+	# do not queue the same report again while it is being prepared
+	if not frappe.cache().get_value("preparing:" + key, expires=True):
+		frappe.cache().set_value("preparing:" + key, 1, expires_in_sec=PREPARE_TIMEOUT)
+		frappe.enqueue("frappe.desk.query_report.build_report_cache", queue="long",
+			timeout=PREPARE_TIMEOUT, report_name=report_name, filters=filters, key=key, user=user)
+
+	return {"status": "queued", "key": key}
+
+def build_report_cache(report_name, filters, key, user):
+	try:
+		run(report_name, filters, user)
+	finally:
+		frappe.cache().delete_value("preparing:" + key)
+
+	frappe.publish_realtime("report_prepared", {"report_name": report_name, "key": key}, user=user)
+
+@frappe.whitelist()
+def get_prepared_report(report_name, filters=None):
+	"""Returns the result of a report prepared in the background for these filters. The key
+	is computed for the session user, so results prepared for other users cannot be read"""
+	report = get_report_doc(report_name)
+
+	if filters and isinstance(filters, string_types):
+		filters = json.loads(filters)
+
+	return frappe.cache().get_value(get_report_cache_key(report, filters or [], frappe.session.user),
+		expires=True)
+
+def get_report_cache_key(report, filters, user):
+	"""Returns the cache key for the result of `report`. The key changes with the filters,
+	the permissions of the user and writes to the DocTypes the report depends on"""
+	from frappe.permissions import get_user_permissions
+
+	# user permissions are applied by queries of script reports too (`frappe.get_list`),
+	# whether or not the report applies them to its result
+	permissions = [sorted(frappe.get_roles(user)), get_user_permissions(user)]
+
+	data_version = [frappe.cache().hget("report_data_version", d)
+		for d in get_report_dependencies(report)]
+
+	fingerprint = json.dumps([filters, permissions, data_version], sort_keys=True, default=cstr)
+	return "report_result:{0}:{1}".format(report.name,
+		hashlib.md5(fingerprint.encode("utf-8")).hexdigest())
+
+def get_cache_ttl(report):
+	"""Results are invalidated by writes through the ORM and `frappe.db` (see `clear_report_cache`),
+	but not by raw SQL, so they expire after an hour unless the report sets `cache_ttl`"""
+	return cint(report.cache_ttl) or 3600
+
+def get_report_dependencies(report):
+	"""Returns DocTypes whose changes clear the cached results of `report`. Child
+	DocTypes are replaced by their parents, as rows are written when the parent is saved"""
+	doctypes = []
+	for d in [report.ref_doctype] + (report.cache_depends_on or "").splitlines():
+		d = d.strip()
+		if not d:
+			continue
+
+		for dt in (get_parent_doctypes(d) if frappe.get_meta(d).istable else [d]):
+			if dt not in doctypes:
+				doctypes.append(dt)
+
+	return doctypes
+
+def get_parent_doctypes(doctype):
+	"""Returns DocTypes that have `doctype` as a child table"""
+	return frappe.db.sql_list("""select parent from tabDocField
+		where fieldtype="Table" and options=%s and (parent not like "old_parent:%%")
+		union select dt from `tabCustom Field` where fieldtype="Table" and options=%s""",
+		(doctype, doctype))
+
+def get_cached_report_doctypes():
+	"""Returns `{doctype: [dependencies]}`, the dependencies of cached reports whose data
+	version changes on writes to `doctype`, including writes to their child tables"""
+	def _get():
+		doctypes = {}
+		for report in frappe.get_all("Report", fields=["name", "ref_doctype", "cache_depends_on"],
+			filters={"cache_results": 1, "disabled": 0}):
+			for dt in get_report_dependencies(report):
+				for d in [dt] + [df.options for df in frappe.get_meta(dt).get_table_fields()]:
+					doctypes.setdefault(d, [])
+					if dt not in doctypes[d]:
+						doctypes[d].append(dt)
+		return doctypes
+
+	return frappe.cache().get_value("cached_report_dependencies", _get)
+
+def clear_report_cache(doctype):
+	"""Called on writes to `doctype` by the ORM, `frappe.db.set_value` and `frappe.db.bulk_insert`.
+	Cached report results that depend on it are invalidated when the transaction is committed,
+	see `update_report_data_versions`. Writes by raw SQL are not tracked."""
+	if frappe.flags.in_install or frappe.flags.in_migrate:
+		return
+
+	dependencies = get_cached_report_doctypes().get(doctype)
+	if dependencies:
+		if frappe.flags.report_data_changed is None:
+			frappe.flags.report_data_changed = []
+
+		frappe.flags.report_data_changed.extend(dependencies)
+
+def update_report_data_versions():
+	"""Changes the data version of DocTypes written in the transaction, called after commit so
+	that a report run before it is not cached under the new version"""
+	for doctype in set(frappe.flags.report_data_changed or []):
+		frappe.cache().hset("report_data_version", doctype, now())
+
+	frappe.flags.report_data_changed = []
+
+def get_query_result(report, filters, as_iterator=False):
+	"""Returns columns and rows of a Query Report. Rows are streamed if `as_iterator` is set"""
+	if not report.query:
+		frappe.msgprint(_("Must specify a Query to run"), raise_exception=True)
+
+	if not report.query.lower().startswith("select"):
+		frappe.msgprint(_("Query must be a SELECT"), raise_exception=True)
+
+	result = frappe.db.sql(report.query, filters, as_iterator=as_iterator)
+	columns = [cstr(c[0]) for c in frappe.db.get_description()]
+
+	return columns, result
+
 @frappe.whitelist()
 def export_query():
 	"""export from query reports"""
@@ -139,39 +281,52 @@ def export_query():
 	else:
 		visible_idx = None
 
-	if file_format_type == "Excel":
-
-		data = run(report_name, filters)
-		data = frappe._dict(data)
-		columns = get_columns_dict(data.columns)
-
-		result = [[]]
-
-		# add column headings
-		for idx in range(len(data.columns)):
-			result[0].append(columns[idx]["label"])
-
-		# build table from dict
-		if isinstance(data.result[0], dict):
-			for i,row in enumerate(data.result):
-				# only rows which are visible in the report
-				if row and (i+1 in visible_idx):
-					row_list = []
-					for idx in range(len(data.columns)):
-						row_list.append(row.get(columns[idx]["fieldname"],""))
-					result.append(row_list)
-				elif not row:
-					result.append([])
-		else:
-			result = result + [d for i,d in enumerate(data.result) if (i+1 in visible_idx)]
+	if file_format_type not in ("Excel", "CSV"):
+		return
+
+	get_report_doc(report_name)
 
-		from frappe.utils.xlsxutils import make_xlsx
-		xlsx_file = make_xlsx(result, "Query Report")
+	if cint(data.get("background")):
+		frappe.desk.reportview.enqueue_export("frappe.desk.query_report.get_export_data",
+			file_format_type, report_name, sheet_name="Query Report",
+			report_name=report_name, filters=filters, visible_idx=visible_idx)
+		return
 
-		frappe.response['filename'] = report_name + '.xlsx'
-		frappe.response['filecontent'] = xlsx_file.getvalue()
-		frappe.response['type'] = 'binary'
+	rows, total = get_export_data(report_name, filters, visible_idx)
+	path = frappe.desk.reportview.write_export_file(rows, file_format_type, "Query Report")
+	frappe.desk.reportview.set_export_response(path, report_name, file_format_type)
 
+def get_export_data(report_name, filters, visible_idx=None, with_count=False):
+	"""Returns a generator of the heading and visible rows of a report export and their count"""
+	# checks report permission on the ref doctype before anything is streamed,
+	# in background exports too as the job runs as the user
+	report = get_report_doc(report_name)
+
+	if (report.report_type=="Query Report" and not report.apply_user_permissions
+		and not cint(report.add_total_row) and not cint(report.cache_results)):
+		# nothing to post-process, stream rows straight into the file
+		columns, result = get_query_result(report, filters, as_iterator=True)
+		return get_visible_rows(columns, result, visible_idx), None
+
+	data = frappe._dict(run(report_name, filters))
+	return get_visible_rows(data.columns, data.result, visible_idx), len(data.result)
+
+def get_visible_rows(columns, result, visible_idx=None):
+	"""Yields the heading row followed by rows visible in the report"""
+	columns_dict = get_columns_dict(columns)
+	yield [columns_dict[idx]["label"] for idx in range(len(columns))]
+
+	if visible_idx is not None:
+		visible_idx = set(visible_idx)
+
+	for i, row in enumerate(result):
+		if not row:
+			yield []
+
+		elif visible_idx is None or (i+1 in visible_idx):
+			if isinstance(row, dict):
+				row = [row.get(columns_dict[idx]["fieldname"], "") for idx in range(len(columns))]
+			yield row
 
 def get_report_module_dotted_path(module, report_name):
 	return frappe.local.module_app[scrub(module)] + "." + scrub(module) \
@@ -243,20 +398,43 @@ def get_filtered_data(ref_doctype, columns, data, user):
 	if_owner = role_permissions.get("if_owner", {}).get("report")
 
 	if match_filters_per_doctype:
+		shared = set(shared)
+		existing_values = get_existing_values(data, linked_doctypes, columns_dict)
+
 		for row in data:
 			# Why linked_doctypes.get(ref_doctype)? because if column is empty, linked_doctypes[ref_doctype] is removed
 			if linked_doctypes.get(ref_doctype) and shared and row[linked_doctypes[ref_doctype]] in shared:
 				result.append(row)
 
-			elif has_match(row, linked_doctypes, match_filters_per_doctype, ref_doctype, if_owner, columns_dict, user):
+			elif has_match(row, linked_doctypes, match_filters_per_doctype, ref_doctype, if_owner, columns_dict, user,
+				existing_values):
 				result.append(row)
 	else:
 		result = list(data)
 
 	return result
 
+def get_existing_values(data, linked_doctypes, columns_dict):
+	"""Returns a set of lowercase names of existing documents for each linked doctype,
+	looked up with one query per linked doctype (and 1000 values) instead of one per cell"""
+	existing_values = {}
+	for dt, idx in linked_doctypes.items():
+		if dt=="User" and columns_dict[idx]==columns_dict.get("owner"):
+			# owner match is checked without looking up the user
+			continue
+
+		values = list(set(row[idx] for row in data if row and row[idx]))
+		existing_values[dt] = existing = set()
 
-def has_match(row, linked_doctypes, doctype_match_filters, ref_doctype, if_owner, columns_dict, user):
+		for start in range(0, len(values), 1000):
+			batch = values[start:start + 1000]
+			existing.update(cstr(name).lower() for name in frappe.db.sql_list("""select name from `tab{0}`
+				where name in ({1})""".format(dt, ", ".join(["%s"] * len(batch))), batch))
+
+	return existing_values
+
+def has_match(row, linked_doctypes, doctype_match_filters, ref_doctype, if_owner, columns_dict, user,
+	existing_values=None):
 	"""Returns True if after evaluating permissions for each linked doctype
 		- There is an owner match for the ref_doctype
 		- `and` There is a user permission match for all linked doctypes
@@ -267,7 +445,15 @@ def has_match(row, linked_doctypes, doctype_match_filters, ref_doctype, if_owner
 		Each doctype could have multiple conflicting user permission doctypes.
 		Hence even if one of the sets allows a match, it is true.
 		This behavior is equivalent to the trickling of user permissions of linked doctypes to the ref doctype.
+
+		If `existing_values` (see `get_existing_values`) is passed, it is used instead of
+		checking if each linked document exists in the database.
 	"""
+	def exists(dt, value):
+		if existing_values is not None and dt in existing_values:
+			return bool(value) and cstr(value).lower() in existing_values[dt]
+		return frappe.db.exists(dt, value)
+
 	resultant_match = True
 
 	if not row:
@@ -293,7 +479,7 @@ def has_match(row, linked_doctypes, doctype_match_filters, ref_doctype, if_owner
 					if dt=="User" and columns_dict[idx]==columns_dict.get("owner"):
 						continue
 
-					if dt in match_filters and row[idx] not in match_filters[dt] and frappe.db.exists(dt, row[idx]):
+					if dt in match_filters and row[idx] not in match_filters[dt] and exists(dt, row[idx]):
 						match = False
 						break
 
@@ -384,6 +570,8 @@ def get_user_match_filters(doctypes, ref_doctype):
 	for dt in doctypes:
 		filter_list = frappe.desk.reportview.build_match_conditions(dt, False)
 		if filter_list:
-			match_filters[dt] = filter_list
+			# sets, as each row's values are checked for membership
+			match_filters[dt] = [dict((d, set(values)) for d, values in match_filters_for_dt.items())
+				for match_filters_for_dt in filter_list]
 
 	return match_filters
\ No newline at end of file
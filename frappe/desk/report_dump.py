@@ -3,74 +3,125 @@
 
 from __future__ import unicode_literals
 from six.moves import range
+from six import string_types
 import frappe
+from frappe.utils import cint, cstr, now
 import json
 import copy
 
 @frappe.whitelist()
-def get_data(doctypes, last_modified):	
+def get_data(doctypes, last_modified, page_length=None, as_columns=False, compress=False):
+	"""Returns rows of the dump report map of `doctypes` for client side reports.
+
+	If a doctype is in `last_modified`, only rows changed after its cursor are sent,
+	along with the names deleted since then. The cursor is returned as `last_modified`
+	and is either the last modified timestamp or a `[modified, name, started]` continuation
+	token, where `started` is the time of the request, from which deletions are sent next.
+
+	:param page_length: Maximum rows per doctype. `has_more` is set if there are more.
+		Paged rows are ordered by `modified, name` instead of the `order_by` of the map,
+		so that the next page starts where this one ends.
+	:param as_columns: Send `values` as a list of values per column instead of `data` rows.
+	:param compress: Gzip the response if the client accepts it."""
 	data_map = {}
 	for dump_report_map in frappe.get_hooks().dump_report_map:
 		data_map.update(frappe.get_attr(dump_report_map))
-	
-	import datetime
+
 	out = {}
-	
+
 	doctypes = json.loads(doctypes)
 	last_modified = json.loads(last_modified)
-		
-	start = datetime.datetime.now()
+	page_length = cint(page_length)
+	started = now()
+
 	for d in doctypes:
 		args = copy.deepcopy(data_map[d])
 		dt = d.find("[") != -1 and d[:d.find("[")] or d
 		out[dt] = {}
 
+		# qualify modified and name, tables of the map may be joined
 		if args.get("from"):
 			modified_table = "item."
 		else:
-			modified_table = ""
-			
-		conditions = order_by = ""
+			modified_table = "`tab%s`." % dt
+
+		conditions = order_by = limit = ""
 		table = args.get("from") or ("`tab%s`" % dt)
+		cursor = get_cursor(last_modified.get(d))
+
+		if not args.get("conditions"):
+			args['conditions'] = []
+
+		# first table of the map, without joins
+		base_table = table
+		if "," in table:
+			base_table = " ".join(table.split(",")[0].split(" ")[:-1])
+
+		if cursor:
+			args['conditions'].append(get_cursor_condition(cursor, modified_table))
+
+			# tombstones, since the previous request (or dump) started
+			out[dt]["deleted_names"] = frappe.db.sql_list("""select deleted_name
+				from `tabDeleted Document` where deleted_doctype=%s and creation > %s""",
+				(dt, cursor[2]))
 
-		if d in last_modified:
-			if not args.get("conditions"):
-				args['conditions'] = []
-			args['conditions'].append(modified_table + "modified > '" + last_modified[d] + "'")
-			out[dt]["modified_names"] = frappe.db.sql_list("""select %sname from %s
-				where %smodified > %s""" % (modified_table, table, modified_table, "%s"), last_modified[d])
-		
 		if args.get("force_index"):
 			conditions = " force index (%s) " % args["force_index"]
 		if args.get("conditions"):
 			conditions += " where " + " and ".join(args["conditions"])
-		if args.get("order_by"):
+
+		if page_length:
+			# keyset order, so that the next page starts where this one ends
+			order_by = " order by {0}modified, {0}name".format(modified_table)
+			limit = " limit %d" % (page_length + 1)
+		elif args.get("order_by"):
 			order_by = " order by " + args["order_by"]
-		
-		out[dt]["data"] = [list(t) for t in frappe.db.sql("""select %s from %s %s %s""" \
-			% (",".join(args["columns"]), table, conditions, order_by))]
-			
-		# last modified
-		modified_table = table
-		if "," in table:
-			modified_table = " ".join(table.split(",")[0].split(" ")[:-1])
-			
-		tmp = frappe.db.sql("""select `modified` 
-			from %s order by modified desc limit 1""" % modified_table)
-		out[dt]["last_modified"] = tmp and tmp[0][0] or ""
-		out[dt]["columns"] = map(lambda c: c.split(" as ")[-1], args["columns"])
-		
+
+		data = [list(t) for t in frappe.db.sql("""select %s, %smodified, %sname from %s %s %s %s""" \
+			% (",".join(args["columns"]), modified_table, modified_table, table, conditions,
+				order_by, limit))]
+
+		if page_length:
+			if len(data) > page_length:
+				data = data[:page_length]
+				out[dt]["has_more"] = 1
+
+			next_cursor = [data[-1][-2], data[-1][-1], started] if data else None
+			out[dt]["last_modified"] = next_cursor or (cursor and cursor[:2] + [started]) or ""
+
+		else:
+			next_cursor = None
+
+			# last modified
+			tmp = frappe.db.sql("""select `modified`
+				from %s order by modified desc limit 1""" % base_table)
+			out[dt]["last_modified"] = tmp and tmp[0][0] or ""
+
+		if cursor:
+			# every name changed upto the end of this page, whatever the conditions of the map,
+			# so that rows that no longer match them are removed by the client
+			names_conditions = [get_cursor_condition(cursor)]
+			if out[dt].get("has_more"):
+				names_conditions.append("not " + get_cursor_condition(next_cursor))
+
+			out[dt]["modified_names"] = frappe.db.sql_list("""select name from %s where %s""" \
+				% (base_table, " and ".join(names_conditions))) + out[dt]["deleted_names"]
+
+		out[dt]["data"] = [row[:-2] for row in data]
+		out[dt]["columns"] = [c.split(" as ")[-1] for c in args["columns"]]
+
 		if args.get("links"):
 			out[dt]["links"] = args["links"]
-	
+
 	for d in out:
 		unused_links = []
 		# only compress full dumps (not partial)
 		if out[d].get("links") and (d not in last_modified):
 			for link_key in out[d]["links"]:
 				link = out[d]["links"][link_key]
-				if link[0] in out and (link[0] not in last_modified):
-					
+				if (link[0] in out and (link[0] not in last_modified)
+					and not out[link[0]].get("has_more")):
+
 					# make a map of link ids
 					# to index
 					link_map = {}
@@ -79,7 +130,7 @@ def get_data(doctypes, last_modified):
 					for row_idx in range(len(doctype_data["data"])):
 						row = doctype_data["data"][row_idx]
 						link_map[row[col_idx]] = row_idx
-					
+
 					for row in out[d]["data"]:
 						col_idx = out[d]["columns"].index(link_key)
 						# replace by id
@@ -87,8 +138,42 @@ def get_data(doctypes, last_modified):
 							row[col_idx] = link_map.get(row[col_idx])
 				else:
 					unused_links.append(link_key)
-	
+
 		for link in unused_links:
 			del out[d]["links"][link]
-	
+
+	if cint(as_columns):
+		for d in out:
+			data = out[d].pop("data")
+			out[d]["values"] = [list(values) for values in zip(*data)] \
+				if data else [[] for c in out[d]["columns"]]
+
+	if cint(compress):
+		frappe.local.flags.gzip_response = True
+
 	return out
+
+def get_cursor(last_modified):
+	"""Returns `[modified, name, started]` from the cursor sent by the client"""
+	if not last_modified:
+		return None
+
+	if isinstance(last_modified, string_types):
+		# timestamp of the previous dump, rows modified at the same time were already sent
+		return [last_modified, None, last_modified]
+
+	if len(last_modified) < 3:
+		# token without the time of the request, deletions are sent from its row
+		return list(last_modified) + [last_modified[0]]
+
+	return last_modified
+
+def get_cursor_condition(cursor, table=""):
+	"""Returns the condition for rows after `cursor`, qualified by `table` if given"""
+	if cursor[1] is None:
+		return "{0}modified > '{1}'".format(table, frappe.db.escape(cstr(cursor[0]), percent=False))
+
+	return """({0}modified > '{1}'
+		or ({0}modified = '{1}' and {0}name > '{2}'))""".format(table,
+			frappe.db.escape(cstr(cursor[0]), percent=False),
+			frappe.db.escape(cstr(cursor[1]), percent=False))
@@ -4,13 +4,15 @@
 from __future__ import unicode_literals
 """build query for doclistview and return results"""
 
-import frappe, json
-from six.moves import range
+import frappe, json, os, tempfile
 import frappe.permissions
 import MySQLdb
 from frappe.model.db_query import DatabaseQuery
 from frappe import _
-from six import text_type, string_types, StringIO
+from frappe.utils import cint
+from six import string_types
+
+EXPORT_CHUNK_SIZE = 1000
 
 @frappe.whitelist()
 def get():
@@ -117,6 +119,7 @@ def export_query():
 	doctype = form_params.doctype
 	add_totals_row = None
 	file_format_type = form_params["file_format_type"]
+	background = cint(form_params.pop("background", 0))
 
 	del form_params["doctype"]
 	del form_params["file_format_type"]
@@ -132,58 +135,115 @@ def export_query():
 		form_params["filters"] = {"name": ("in", si)}
 		del form_params["selected_items"]
 
-	db_query = DatabaseQuery(doctype)
-	ret = db_query.execute(**form_params)
+	if background:
+		enqueue_export("frappe.desk.reportview.get_export_data", file_format_type, doctype,
+			doctype=doctype, form_params=form_params, add_totals_row=add_totals_row)
+		return
 
-	if add_totals_row:
-		ret = append_totals_row(ret)
+	rows, total = get_export_data(doctype, form_params, add_totals_row)
+	set_export_response(write_export_file(rows, file_format_type, doctype), doctype, file_format_type)
 
-	data = [['Sr'] + get_labels(db_query.fields, doctype)]
-	for i, row in enumerate(ret):
-		data.append([i+1] + list(row))
+def get_export_data(doctype, form_params, add_totals_row=False, with_count=False):
+	"""Returns a generator of the rows of a report builder export and their count"""
+	form_params = frappe._dict(form_params)
+	total = None
 
-	if file_format_type == "CSV":
+	if with_count:
+		total = DatabaseQuery(doctype).execute(fields=["count(*)"], as_list=True,
+			filters=form_params.filters, or_filters=form_params.or_filters)[0][0]
 
-		# convert to csv
-		import csv
-		from frappe.utils.xlsxutils import handle_html
+	# read one row to resolve the columns and load the meta of their doctypes,
+	# the connection is busy while rows are streamed
+	db_query = DatabaseQuery(doctype)
+	db_query.execute(**dict(form_params, limit_page_length=1))
+	labels = ['Sr'] + get_labels(db_query.fields, doctype)
 
-		f = StringIO()
-		writer = csv.writer(f)
-		for r in data:
-			# encode only unicode type strings and not int, floats etc.
-			writer.writerow([handle_html(frappe.as_unicode(v)).encode('utf-8') \
-				if isinstance(v, string_types) else v for v in r])
+	form_params.save_user_settings = False
+	result = DatabaseQuery(doctype).execute(as_iterator=True, **form_params)
 
-		f.seek(0)
-		frappe.response['result'] = text_type(f.read(), 'utf-8')
-		frappe.response['type'] = 'csv'
-		frappe.response['doctype'] = doctype
+	return get_export_rows(labels, result, add_totals_row), total
 
-	elif file_format_type == "Excel":
+def get_export_rows(labels, result, add_totals_row=False):
+	yield labels
 
-		from frappe.utils.xlsxutils import make_xlsx
-		xlsx_file = make_xlsx(data, doctype)
+	totals = [""] * (len(labels) - 1)
+	for i, row in enumerate(result):
+		if add_totals_row:
+			for j, value in enumerate(row):
+				if isinstance(value, (float, int)):
+					totals[j] = (totals[j] or 0) + value
 
-		frappe.response['filename'] = doctype + '.xlsx'
-		frappe.response['filecontent'] = xlsx_file.getvalue()
-		frappe.response['type'] = 'binary'
+		yield [i+1] + list(row)
 
+	if add_totals_row:
+		yield [""] + totals
 
-def append_totals_row(data):
-	if not data:
-		return data
-	data = list(data)
-	totals = []
-	totals.extend([""]*len(data[0]))
+def write_export_file(rows, file_format_type, sheet_name, path=None, total=None):
+	"""Writes `rows` to a CSV or Excel file as they are read and returns the path of the file.
+	If `total` is given, progress is published every `EXPORT_CHUNK_SIZE` rows"""
+	from frappe.utils.csvutils import write_csv
+	from frappe.utils.xlsxutils import make_xlsx
 
-	for row in data:
-		for i in range(len(row)):
-			if isinstance(row[i], (float, int)):
-				totals[i] = (totals[i] or 0) + row[i]
-	data.append(totals)
+	if not path:
+		fd, path = tempfile.mkstemp(suffix=get_export_extension(file_format_type))
+		os.close(fd)
 
-	return data
+	if total:
+		rows = with_progress(rows, total, _("Exporting {0}").format(sheet_name))
+
+	with open(path, "wb") as f:
+		if file_format_type == "CSV":
+			write_csv(rows, f)
+		else:
+			make_xlsx(rows, sheet_name, f)
+
+	return path
+
+def with_progress(rows, total, title):
+	for i, row in enumerate(rows):
+		if i and not i % EXPORT_CHUNK_SIZE:
+			frappe.publish_progress(min(i * 100.0 / total, 100), title=title)
+		yield row
+
+def get_export_extension(file_format_type):
+	return ".csv" if file_format_type == "CSV" else ".xlsx"
+
+def set_export_response(path, filename, file_format_type):
+	"""Sends the generated file from disk, in chunks"""
+	frappe.response['filename'] = filename + get_export_extension(file_format_type)
+	frappe.response['filepath'] = path
+	frappe.response['type'] = 'file'
+
+def enqueue_export(method, file_format_type, filename, sheet_name=None, **kwargs):
+	"""Builds the export in the background. `method` returns the rows to export and,
+	if called `with_count`, their count. The file is attached as a private File and `export_ready` is published to the user"""
+	frappe.enqueue("frappe.desk.reportview.build_export_file", queue="long", timeout=1500,
+		export_method=method, export_kwargs=kwargs, file_format_type=file_format_type,
+		filename=filename, sheet_name=sheet_name)
+
+	frappe.msgprint(_("Your export is being prepared. You will be notified when it is ready."))
+
+def build_export_file(export_method, export_kwargs, file_format_type, filename, sheet_name=None):
+	from frappe.utils import get_files_path
+
+	rows, total = frappe.get_attr(export_method)(with_count=True, **export_kwargs)
+
+	file_name = "{0}-{1}{2}".format(frappe.scrub(filename), frappe.generate_hash(length=8),
+		get_export_extension(file_format_type))
+	path = write_export_file(rows, file_format_type, sheet_name or filename,
+		path=get_files_path(file_name, is_private=1), total=total)
+
+	file_doc = frappe.get_doc({
+		"doctype": "File",
+		"file_name": file_name,
+		"file_url": "/private/files/" + file_name,
+		"file_size": os.path.getsize(path),
+		"folder": "Home",
+		"is_private": 1
+	}).insert(ignore_permissions=True)
+
+	frappe.publish_realtime("export_ready", {"filename": filename, "file_url": file_doc.file_url},
+		user=frappe.session.user)
 
 def get_labels(fields, doctype):
 	"""get column labels based on column names"""
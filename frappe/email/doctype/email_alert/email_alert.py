@@ -86,12 +86,11 @@ def get_context(context):
 		if self.event=="Days After":
 			diff_days = -diff_days
 
-		for name in frappe.db.sql_list("""select name from `tab{0}` where
+		names = frappe.db.sql_list("""select name from `tab{0}` where
 			DATE(`{1}`) = ADDDATE(DATE(%s), INTERVAL %s DAY)""".format(self.document_type,
-				self.date_changed), (nowdate(), diff_days or 0)):
-
-			doc = frappe.get_doc(self.document_type, name)
+				self.date_changed), (nowdate(), diff_days or 0))
 
+		for doc in frappe.get_docs(self.document_type, names):
 			if self.condition and not frappe.safe_eval(self.condition, None, get_context(doc)):
 				continue
 
@@ -13,6 +13,7 @@ from frappe.utils.verified_command import get_signed_params, verify_request
 from html2text import html2text
 from frappe.utils import get_url, nowdate, encode, now_datetime, add_days, split_emails, cstr, cint
 from frappe.utils.file_manager import get_file
+from frappe.model.document import bulk_insert
 from rq.timeouts import JobTimeoutException
 from frappe.utils.scheduler import log
 from six import text_type, string_types
@@ -134,18 +135,24 @@ def add(recipients, sender, subject, **kwargs):
 	"""Add to Email Queue"""
 	if kwargs.get('queue_separately') or len(recipients) > 20:
 		email_queue = None
+		duplicates = []
 		for r in recipients:
 			if not email_queue:
 				email_queue = get_email_queue([r], sender, subject, **kwargs)
 				if kwargs.get('now'):
 					email_queue(email_queue.name, now=True)
-			else:
+			elif kwargs.get('now'):
 				duplicate = email_queue.get_duplicate([r])
 				duplicate.insert(ignore_permissions=True)
+				send_one(duplicate.name, now=True)
+			else:
+				# queued for later, insert all of them together
+				duplicates.append(email_queue.get_duplicate([r]))
 
-				if kwargs.get('now'):
-					send_one(duplicate.name, now=True)
+			frappe.db.commit()
 
+		if duplicates:
+			bulk_insert(duplicates, ignore_permissions=True)
 			frappe.db.commit()
 	else:
 		email_queue = get_email_queue(recipients, sender, subject, **kwargs)
@@ -84,3 +84,4 @@ class IncorrectSitePath(NotFound): pass
 class ImplicitCommitError(ValidationError): pass
 class RetryBackgroundJobError(Exception): pass
 class DocumentLockedError(ValidationError): pass
+class QueryInProgressError(Exception): pass
@@ -3,7 +3,7 @@
 
 from __future__ import unicode_literals
 from six import iteritems, string_types
-import frappe, sys
+import frappe, sys, datetime
 from frappe import _
 from frappe.utils import (cint, flt, now, cstr, strip_html, getdate, get_datetime, to_timedelta,
 	sanitize_html, sanitize_email)
@@ -16,6 +16,7 @@ from frappe.model.db_schema import type_map, varchar_len
 from frappe.utils.password import get_decrypted_password, set_encrypted_password
 
 _classes = {}
+shareable_types = string_types + (datetime.date, datetime.timedelta)
 
 def get_controller(doctype):
 	"""Returns the **class** object of the given DocType.
@@ -46,6 +47,21 @@ def get_controller(doctype):
 
 	return _classes[doctype]
 
+def share_values(rows, shared=None):
+	"""Replaces equal short string and date values of `rows` by a single object. Child rows
+	repeat the same owner, timestamps and link values, which are otherwise separate objects
+	for each row read from the database."""
+	if shared is None:
+		shared = {}
+
+	for row in rows:
+		for key, value in iteritems(row):
+			if isinstance(value, shareable_types) and not (isinstance(value, string_types)
+				and len(value) > 140):
+				row[key] = shared.setdefault(value, value)
+
+	return rows
+
 class BaseDocument(object):
 	ignore_in_getter = ("doctype", "_meta", "meta", "_table_fields", "_valid_columns")
 
@@ -183,40 +199,57 @@ class BaseDocument(object):
 
 	def get_valid_dict(self, sanitize=True):
 		d = frappe._dict()
-		for fieldname in self.meta.get_valid_columns():
-			d[fieldname] = self.get(fieldname)
+		values = self.__dict__
+		for fieldname, fieldtype, unique, label in self.get_column_types():
+			value = d[fieldname] = values.get(fieldname)
 
 			# if no need for sanitization and value is None, continue
-			if not sanitize and d[fieldname] is None:
+			if not sanitize and value is None:
 				continue
 
-			df = self.meta.get_field(fieldname)
-			if df:
-				if df.fieldtype=="Check":
-					if d[fieldname]==None:
+			if fieldtype:
+				if fieldtype=="Check":
+					if value==None:
 						d[fieldname] = 0
 
-					elif (not isinstance(d[fieldname], int) or d[fieldname] > 1):
-						d[fieldname] = 1 if cint(d[fieldname]) else 0
+					elif (not isinstance(value, int) or value > 1):
+						d[fieldname] = 1 if cint(value) else 0
 
-				elif df.fieldtype=="Int" and not isinstance(d[fieldname], int):
-					d[fieldname] = cint(d[fieldname])
+				elif fieldtype=="Int" and not isinstance(value, int):
+					d[fieldname] = cint(value)
 
-				elif df.fieldtype in ("Currency", "Float", "Percent") and not isinstance(d[fieldname], float):
-					d[fieldname] = flt(d[fieldname])
+				elif fieldtype in ("Currency", "Float", "Percent") and not isinstance(value, float):
+					d[fieldname] = flt(value)
 
-				elif df.fieldtype in ("Datetime", "Date") and d[fieldname]=="":
+				elif fieldtype in ("Datetime", "Date") and value=="":
 					d[fieldname] = None
 
-				elif df.get("unique") and cstr(d[fieldname]).strip()=="":
+				elif unique and cstr(value).strip()=="":
 					# unique empty field should be set to None
 					d[fieldname] = None
 
-				if isinstance(d[fieldname], list) and df.fieldtype != 'Table':
-					frappe.throw(_('Value for {0} cannot be a list').format(_(df.label)))
+				if isinstance(d[fieldname], list) and fieldtype != 'Table':
+					frappe.throw(_('Value for {0} cannot be a list').format(_(label)))
 
 		return d
 
+	def get_column_types(self):
+		"""Returns `(fieldname, fieldtype, unique, label)` of the valid columns, cached per
+		doctype in its meta so that `get_valid_dict` does not look up each docfield for each row"""
+		meta = self.meta
+		if not hasattr(meta, "_column_types"):
+			column_types = []
+			for fieldname in meta.get_valid_columns():
+				df = meta.get_field(fieldname)
+				if df:
+					column_types.append((fieldname, df.fieldtype, df.get("unique"), df.label))
+				else:
+					column_types.append((fieldname, None, None, None))
+
+			meta._column_types = column_types
+
+		return meta._column_types
+
 	def init_valid_columns(self):
 		for key in default_fields:
 			if key not in self.__dict__:
@@ -277,8 +310,8 @@ class BaseDocument(object):
 		fieldname = [df.fieldname for df in self.meta.get_table_fields() if df.options==doctype]
 		return fieldname[0] if fieldname else None
 
-	def db_insert(self):
-		"""INSERT the document (with valid columns) in the database."""
+	def get_values_for_insert(self):
+		"""Set name and timestamps if missing and return the valid dict to be inserted."""
 		if not self.name:
 			# name will be set by document class in most cases
 			set_new_name(self)
@@ -287,7 +320,11 @@ class BaseDocument(object):
 			self.creation = self.modified = now()
 			self.created_by = self.modifield_by = frappe.session.user
 
-		d = self.get_valid_dict()
+		return self.get_valid_dict()
+
+	def db_insert(self):
+		"""INSERT the document (with valid columns) in the database."""
+		d = self.get_values_for_insert()
 
 		columns = d.keys()
 		try:
@@ -318,8 +355,15 @@ class BaseDocument(object):
 				raise
 
 		self.set("__islocal", False)
+		self.snapshot_db_values(d)
+		self._changed_columns = None
 
-	def db_update(self):
+	def db_update(self, defer_timestamps=False):
+		"""UPDATE the columns changed since the document was read from or written to the
+		database.
+
+		:param defer_timestamps: If only `modified` and `modified_by` changed, do not write them
+			and return True, so that the caller can update the timestamps of many rows at once."""
 		if self.get("__islocal") or not self.name:
 			self.db_insert()
 			return
@@ -327,23 +371,49 @@ class BaseDocument(object):
 		d = self.get_valid_dict()
 
 		# don't update name, as case might've been changed
-		name = d['name']
-		del d['name']
+		columns = [c for c in self.get_changed_columns(d) if c != "name"]
 
-		columns = d.keys()
+		if defer_timestamps and columns and not set(columns).difference(("modified", "modified_by")):
+			self._changed_columns = []
+			return True
+
+		self._changed_columns = columns
+		if not columns:
+			return
 
 		try:
 			frappe.db.sql("""update `tab{doctype}`
 				set {values} where name=%s""".format(
 					doctype = self.doctype,
 					values = ", ".join(["`"+c+"`=%s" for c in columns])
-				), list(d.values()) + [name])
+				), [d[c] for c in columns] + [d.name])
 		except Exception as e:
 			if e.args[0]==1062 and "Duplicate" in cstr(e.args[1]):
 				self.show_unique_validation_message(e)
 			else:
 				raise
 
+		self.snapshot_db_values(d)
+
+	def snapshot_db_values(self, d=None):
+		"""Remember the values of the valid columns as they are in the database, so that
+		`db_update` writes only the columns changed after this."""
+		if d is None:
+			d = self.get_valid_dict()
+
+		self._db_values = tuple(d.get(c[0]) for c in self.get_column_types())
+
+	def get_changed_columns(self, d):
+		"""Returns columns of the valid dict `d` that differ from `snapshot_db_values`,
+		or all of them if there is no snapshot"""
+		db_values = self.__dict__.get("_db_values")
+		column_types = self.get_column_types()
+
+		if db_values is None or len(db_values) != len(column_types):
+			return list(d)
+
+		return [c[0] for c, value in zip(column_types, db_values) if d.get(c[0]) != value]
+
 	def show_unique_validation_message(self, e):
 		type, value, traceback = sys.exc_info()
 		fieldname, label = str(e).split("'")[-2], None
@@ -442,17 +512,8 @@ class BaseDocument(object):
 
 		return missing
 
-	def get_invalid_links(self, is_submittable=False):
-		'''Returns list of invalid links and also updates fetch values if not set'''
-		def get_msg(df, docname):
-			if self.parentfield:
-				return "{} #{}: {}: {}".format(_("Row"), self.idx, _(df.label), docname)
-			else:
-				return "{}: {}".format(_(df.label), docname)
-
-		invalid_links = []
-		cancelled_links = []
-
+	def get_link_targets(self):
+		'''Yields `(df, doctype, docname)` for each Link and Dynamic Link field that is set'''
 		for df in (self.meta.get_link_fields()
 				 + self.meta.get("fields", {"fieldtype": ('=', "Dynamic Link")})):
 			docname = self.get(df.fieldname)
@@ -467,45 +528,62 @@ class BaseDocument(object):
 					if not doctype:
 						frappe.throw(_("{0} must be set first").format(self.meta.get_label(df.options)))
 
-				# MySQL is case insensitive. Preserve case of the original docname in the Link Field.
+				yield df, doctype, docname
 
-				# get a map of values ot fetch along with this link query
-				# that are mapped as link_fieldname.source_fieldname in Options of
-				# Readonly or Data or Text type fields
-				fields_to_fetch = [
-					_df for _df in self.meta.get_fields_to_fetch(df.fieldname)
-						 if not self.get(_df.fieldname)
-				]
+	def get_invalid_links(self, is_submittable=False, link_values=None):
+		'''Returns list of invalid links and also updates fetch values if not set
 
-				if not fields_to_fetch:
-					# cache a single value type
-					values = frappe._dict(name=frappe.db.get_value(doctype, docname,
-						'name', cache=True))
-				else:
-					values_to_fetch = ['name'] + [_df.options.split('.')[-1]
-						for _df in fields_to_fetch]
+		:param is_submittable: Check for cancelled links (if parent is submittable).
+		:param link_values: Values of linked documents, as returned by `get_link_values`.'''
+		def get_msg(df, docname):
+			if self.parentfield:
+				return "{} #{}: {}: {}".format(_("Row"), self.idx, _(df.label), docname)
+			else:
+				return "{}: {}".format(_(df.label), docname)
 
-					# don't cache if fetching other values too
-					values = frappe.db.get_value(doctype, docname,
-						values_to_fetch, as_dict=True)
+		invalid_links = []
+		cancelled_links = []
+
+		if link_values is None:
+			link_values = get_link_values([self])
+
+		for df, doctype, docname in self.get_link_targets():
+			# MySQL is case insensitive. Preserve case of the original docname in the Link Field.
+
+			# get a map of values ot fetch along with this link query
+			# that are mapped as link_fieldname.source_fieldname in Options of
+			# Readonly or Data or Text type fields
+			fields_to_fetch = [
+				_df for _df in self.meta.get_fields_to_fetch(df.fieldname)
+					 if not self.get(_df.fieldname)
+			]
+
+			values = link_values.get((doctype, cstr(docname).lower()))
+			if not values:
+				# not fetched in bulk (single doctype, or name matched only by collation)
+				values = get_link_value(doctype, docname, fields_to_fetch)
+
+			if frappe.get_meta(doctype).issingle:
+				values.name = doctype
 
-				if frappe.get_meta(doctype).issingle:
-					values.name = doctype
+			setattr(self, df.fieldname, values.name)
 
-				setattr(self, df.fieldname, values.name)
+			for _df in fields_to_fetch:
+				setattr(self, _df.fieldname, values[_df.options.split('.')[-1]])
 
-				for _df in fields_to_fetch:
-					setattr(self, _df.fieldname, values[_df.options.split('.')[-1]])
+			notify_link_count(doctype, docname)
 
-				notify_link_count(doctype, docname)
+			if not values.name:
+				invalid_links.append((df.fieldname, docname, get_msg(df, docname)))
 
-				if not values.name:
-					invalid_links.append((df.fieldname, docname, get_msg(df, docname)))
+			elif (df.fieldname != "amended_from"
+				and (is_submittable or self.meta.is_submittable) and frappe.get_meta(doctype).is_submittable):
 
-				elif (df.fieldname != "amended_from"
-					and (is_submittable or self.meta.is_submittable) and frappe.get_meta(doctype).is_submittable
-					and cint(frappe.db.get_value(doctype, docname, "docstatus"))==2):
+				docstatus = values.docstatus
+				if docstatus is None:
+					docstatus = frappe.db.get_value(doctype, docname, "docstatus")
 
+				if cint(docstatus)==2:
 					cancelled_links.append((df.fieldname, docname, get_msg(df, docname)))
 
 		return invalid_links, cancelled_links
@@ -812,6 +890,80 @@ class BaseDocument(object):
 			for df in self.meta.get("fields", {"fieldtype": ('=', "Text Editor")}):
 				extract_images_from_doc(self, df.fieldname)
 
+def get_link_values(docs):
+	'''Returns values of documents linked from the given documents (and child rows), with one
+	query per linked DocType. Fetches `name`, `docstatus` (if submittable) and the values
+	to be fetched into linking fields.
+
+	Returns a dict keyed by `(doctype, lowercase name)`, as names are case insensitive.'''
+	names, fields = {}, {}
+	for doc in docs:
+		for df, doctype, docname in doc.get_link_targets():
+			meta = frappe.get_meta(doctype)
+			if meta.issingle:
+				continue
+
+			names.setdefault(doctype, set()).add(cstr(docname))
+			doctype_fields = fields.setdefault(doctype, set(["name"]))
+			if meta.is_submittable:
+				doctype_fields.add("docstatus")
+
+			doctype_fields.update(_df.options.split('.')[-1]
+				for _df in doc.meta.get_fields_to_fetch(df.fieldname))
+
+	link_values = {}
+	for doctype, doctype_names in iteritems(names):
+		doctype_names = list(doctype_names)
+		columns = ", ".join("`{0}`".format(f) for f in fields[doctype])
+
+		for start in range(0, len(doctype_names), 1000):
+			batch = doctype_names[start:start + 1000]
+			for d in frappe.db.sql("select {0} from `tab{1}` where name in ({2})".format(columns,
+				doctype, ", ".join(["%s"] * len(batch))), batch, as_dict=True):
+				link_values[(doctype, cstr(d.name).lower())] = d
+
+	return link_values
+
+def get_link_value(doctype, docname, fields_to_fetch):
+	'''Returns `name` and fetch values of a linked document, `name` is `None` if it does not exist'''
+	if not fields_to_fetch:
+		# cache a single value type
+		return frappe._dict(name=frappe.db.get_value(doctype, docname, 'name', cache=True))
+
+	values_to_fetch = ['name'] + [_df.options.split('.')[-1] for _df in fields_to_fetch]
+
+	# don't cache if fetching other values too
+	return frappe.db.get_value(doctype, docname, values_to_fetch, as_dict=True) \
+		or frappe._dict((f, None) for f in values_to_fetch)
+
+def bulk_db_insert(docs, chunk_size=500):
+	"""INSERT the given documents (with valid columns) in the database, with one query
+	per table for every `chunk_size` rows. If a batch fails on a duplicate entry, its rows
+	are inserted one by one so that the offending document is reported as in `db_insert`.
+
+	:param docs: List of `BaseDocument` objects (parents and / or child rows)."""
+	batches = {}
+	for doc in docs:
+		d = doc.get_values_for_insert()
+		batches.setdefault((doc.doctype, tuple(d.keys())), []).append((doc, list(d.values())))
+
+	for (doctype, columns), rows in iteritems(batches):
+		for start in range(0, len(rows), chunk_size):
+			batch = rows[start:start + chunk_size]
+			try:
+				frappe.db.bulk_insert(doctype, columns, [values for doc, values in batch],
+					chunk_size=chunk_size)
+			except Exception as e:
+				if e.args and e.args[0]==1062:
+					# the failed statement is rolled back as a whole
+					for doc, values in batch:
+						doc.db_insert()
+				else:
+					raise
+
+			for doc, values in batch:
+				doc.set("__islocal", False)
+
 def _filter(data, filters, limit=None):
 	"""pass filters as:
 		{"key": "val", "key": ["!=", "val"],
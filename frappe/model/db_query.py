@@ -34,7 +34,7 @@ class DatabaseQuery(object):
 		ignore_permissions=False, user=None, with_comment_count=False,
 		join='left join', distinct=False, start=None, page_length=None, limit=None,
 		ignore_ifnull=False, save_user_settings=False, save_user_settings_fields=False,
-		update=None, add_total_row=None, user_settings=None):
+		update=None, add_total_row=None, user_settings=None, as_iterator=False):
 		if not ignore_permissions and not frappe.has_permission(self.doctype, "read", user=user):
 			frappe.flags.error_message = _('Insufficient Permission for {0}').format(frappe.bold(self.doctype))
 			raise frappe.PermissionError(self.doctype)
@@ -76,6 +76,7 @@ class DatabaseQuery(object):
 		self.flags.ignore_permissions = ignore_permissions
 		self.user = user or frappe.session.user
 		self.update = update
+		self.as_iterator = as_iterator
 		self.user_settings_fields = copy.deepcopy(self.fields)
 		#self.debug = True
 
@@ -87,7 +88,7 @@ class DatabaseQuery(object):
 		else:
 			result = self.build_and_run()
 
-		if with_comment_count and not as_list and self.doctype:
+		if with_comment_count and not as_list and not as_iterator and self.doctype:
 			self.add_comment_count(result)
 
 		if save_user_settings:
@@ -109,7 +110,8 @@ class DatabaseQuery(object):
 		query = """select %(fields)s from %(tables)s %(conditions)s
 			%(group_by)s %(order_by)s %(limit)s""" % args
 
-		return frappe.db.sql(query, as_dict=not self.as_list, debug=self.debug, update=self.update)
+		return frappe.db.sql(query, as_dict=not self.as_list, debug=self.debug, update=self.update,
+			as_iterator=self.as_iterator)
 
 	def prepare_args(self):
 		self.parse_args()
@@ -91,6 +91,9 @@ def delete_doc(doctype=None, name=None, force=0, ignore_doctypes=None, for_reloa
 			delete_from_table(doctype, name, ignore_doctypes, doc)
 			doc.run_method("after_delete")
 
+			from frappe.desk.query_report import clear_report_cache
+			clear_report_cache(doctype)
+
 			# delete attachments
 			remove_all(doctype, name, from_delete=True)
 
@@ -7,7 +7,8 @@ import time
 from frappe import _, msgprint
 from frappe.utils import flt, cstr, now, get_datetime_str, file_lock
 from frappe.utils.background_jobs import enqueue
-from frappe.model.base_document import BaseDocument, get_controller
+from frappe.model.base_document import (BaseDocument, get_controller, bulk_db_insert,
+	get_link_values, share_values)
 from frappe.model.naming import set_new_name
 from six import iteritems, string_types
 from werkzeug.exceptions import NotFound, Forbidden
@@ -52,6 +53,106 @@ def get_doc(arg1, arg2=None):
 
 	raise ImportError(arg1)
 
+def get_docs(doctype, names, chunk_size=1000):
+	"""Returns `Document` objects of `doctype` for `names`, in the same order.
+
+	Parents are loaded with one query and each child table with one query for all of
+	them, instead of one query per parent and per child table as `get_doc` does.
+
+	:param doctype: DocType of the documents.
+	:param names: List of document names.
+	:param chunk_size: Number of documents loaded together."""
+	meta = frappe.get_meta(doctype)
+	if meta.issingle:
+		return [get_doc(doctype)]
+
+	controller = get_controller(doctype)
+	table_fields = meta.get_table_fields()
+
+	docs = []
+	names = list(names)
+	for i in range(0, len(names), chunk_size):
+		chunk = names[i:i + chunk_size]
+		if not chunk:
+			continue
+
+		parents = {}
+		for d in frappe.db.sql("""select * from `tab{0}` where name in ({1})""".format(doctype,
+			", ".join(["%s"] * len(chunk))), chunk, as_dict=True):
+			d.doctype = doctype
+			parents[d.name.lower()] = d
+			for df in table_fields:
+				d[df.fieldname] = []
+
+		shared = {}
+		for df in table_fields:
+			for child in share_values(frappe.db.sql("""select * from `tab{0}`
+				where parenttype=%s and parentfield=%s and parent in ({1})
+				order by idx asc""".format(df.options, ", ".join(["%s"] * len(chunk))),
+				[doctype, df.fieldname] + chunk, as_dict=True), shared):
+				parent = parents.get((child.parent or "").lower())
+				if parent:
+					parent[df.fieldname].append(child)
+
+		for name in chunk:
+			d = parents.get(name.lower())
+			if not d:
+				frappe.throw(_("{0} {1} not found").format(_(doctype), name), frappe.DoesNotExistError)
+
+			doc = controller(d)
+			doc.snapshot_db_values(with_children=True)
+
+			# sometimes __setup__ can depend on child values, hence calling again at the end
+			if hasattr(doc, "__setup__"):
+				doc.__setup__()
+
+			docs.append(doc)
+
+	return docs
+
+def bulk_insert(docs, ignore_permissions=None, ignore_mandatory=None, chunk_size=500):
+	"""Insert many new documents, writing parents and child rows with multi-row `INSERT`
+	queries. Each document is named, validated and runs its `before_insert`, `validate`,
+	`after_insert` and `on_update` methods as with `Document.insert`.
+
+	Documents are processed `chunk_size` at a time: all of a chunk is validated before any
+	of it is written, so validations must not depend on other documents of the same chunk.
+
+	:param docs: List of new `Document` objects or dicts.
+	:param ignore_permissions: Do not check permissions if True.
+	:param ignore_mandatory: Do not validate mandatory fields if True.
+	:param chunk_size: Number of documents validated and written together.
+
+	Example:
+
+		frappe.model.document.bulk_insert([{"doctype": "ToDo", "description": d}
+			for d in descriptions], ignore_permissions=True)
+	"""
+	docs = [get_doc(d) for d in docs]
+	for start in range(0, len(docs), chunk_size):
+		chunk = []
+		for doc in docs[start:start + chunk_size]:
+			if doc.flags.in_print:
+				continue
+
+			if getattr(doc.meta, "issingle", 0):
+				doc.insert(ignore_permissions=ignore_permissions, ignore_mandatory=ignore_mandatory)
+			else:
+				doc.run_before_insert_methods(ignore_permissions, ignore_mandatory)
+				chunk.append(doc)
+
+		rows = []
+		for doc in chunk:
+			rows.append(doc)
+			rows.extend(doc.get_all_children())
+
+		bulk_db_insert(rows, chunk_size=chunk_size)
+
+		for doc in chunk:
+			doc.run_after_insert_methods()
+
+	return docs
+
 class Document(BaseDocument):
 	"""All controllers inherit from `Document`."""
 	def __init__(self, arg1, arg2=None):
@@ -122,15 +223,18 @@ class Document(BaseDocument):
 		else:
 			table_fields = self.meta.get_table_fields()
 
+		shared = {}
 		for df in table_fields:
 			children = frappe.db.get_values(df.options,
 				{"parent": self.name, "parenttype": self.doctype, "parentfield": df.fieldname},
 				"*", as_dict=True, order_by="idx asc")
 			if children:
-				self.set(df.fieldname, children)
+				self.set(df.fieldname, share_values(children, shared))
 			else:
 				self.set(df.fieldname, [])
 
+		self.snapshot_db_values(with_children=True)
+
 		# sometimes __setup__ can depend on child values, hence calling again at the end
 		if hasattr(self, "__setup__"):
 			self.__setup__()
@@ -168,6 +272,31 @@ class Document(BaseDocument):
 		if self.flags.in_print:
 			return
 
+		self.run_before_insert_methods(ignore_permissions, ignore_mandatory)
+
+		# run validate, on update etc.
+
+		# parent
+		if getattr(self.meta, "issingle", 0):
+			self.update_single(self.get_valid_dict())
+		else:
+			try:
+				self.db_insert()
+			except frappe.DuplicateEntryError as e:
+				if not ignore_if_duplicate:
+					raise e
+
+		# children
+		for d in self.get_all_children():
+			d.db_insert()
+
+		self.run_after_insert_methods()
+
+		return self
+
+	def run_before_insert_methods(self, ignore_permissions=None, ignore_mandatory=None):
+		"""Check permissions, set name and run `before_insert` and `validate` (internal).
+		Called by `insert` before the document is written to the database."""
 		self.flags.email_alerts_executed = []
 
 		if ignore_permissions!=None:
@@ -194,22 +323,9 @@ class Document(BaseDocument):
 		self.set_docstatus()
 		self.flags.in_insert = False
 
-		# run validate, on update etc.
-
-		# parent
-		if getattr(self.meta, "issingle", 0):
-			self.update_single(self.get_valid_dict())
-		else:
-			try:
-				self.db_insert()
-			except frappe.DuplicateEntryError as e:
-				if not ignore_if_duplicate:
-					raise e
-
-		# children
-		for d in self.get_all_children():
-			d.db_insert()
-
+	def run_after_insert_methods(self):
+		"""Run `after_insert`, `on_update` etc. (internal).
+		Called by `insert` after the document is written to the database."""
 		self.run_method("after_insert")
 		self.flags.in_insert = True
 
@@ -223,8 +339,6 @@ class Document(BaseDocument):
 		if hasattr(self, "__islocal"):
 			delattr(self, "__islocal")
 
-		return self
-
 	def save(self, *args, **kwargs):
 		"""Wrapper for _save"""
 		return self._save(*args, **kwargs)
@@ -302,15 +416,33 @@ class Document(BaseDocument):
 		if not df:
 			df = self.meta.get_field(fieldname)
 
+		timestamp_only = []
 		for d in self.get(df.fieldname):
-			d.db_update()
+			if d.db_update(defer_timestamps=True):
+				timestamp_only.append(d)
 			rows.append(d.name)
 
+		if timestamp_only:
+			# rows whose only changes are their timestamps, updated in one query
+			frappe.db.sql("""update `tab{0}` set modified=%s, modified_by=%s
+				where name in ({1})""".format(df.options, ", ".join(["%s"] * len(timestamp_only))),
+				[self.modified, self.modified_by] + [d.name for d in timestamp_only])
+			for d in timestamp_only:
+				d.snapshot_db_values()
+
 		if df.options in (self.flags.ignore_children_type or []):
 			# do not delete rows for this because of flags
 			# hack for docperm :(
 			return
 
+		db_rows = (self.__dict__.get("_db_children") or {}).get(fieldname)
+		if self.__dict__.get("_db_children") is not None:
+			self._db_children[fieldname] = set(rows)
+
+		if db_rows is not None and db_rows.issubset(rows):
+			# no row read from the database was removed
+			return
+
 		if rows:
 			# select rows that do not match the ones in the document
 			deleted_rows = frappe.db.sql("""select name from `tab{0}` where parent=%s
@@ -328,6 +460,19 @@ class Document(BaseDocument):
 				and parenttype=%s and parentfield=%s""".format(df.options),
 				(self.name, self.doctype, fieldname))
 
+	def snapshot_db_values(self, d=None, with_children=False):
+		"""Remember the values in the database, and if `with_children`, those of the child
+		rows and their names, so that saving writes only the changed rows and columns."""
+		super(Document, self).snapshot_db_values(d)
+
+		if with_children:
+			self._db_children = {}
+			for df in self.meta.get_table_fields():
+				children = self.get(df.fieldname)
+				for child in children:
+					child.snapshot_db_values()
+				self._db_children[df.fieldname] = set(child.name for child in children)
+
 <<<<<<< HEAD
 =======
 	def get_doc_before_save(self):
@@ -630,10 +775,16 @@ class Document(BaseDocument):
 		if self.flags.ignore_links:
 			return
 
-		invalid_links, cancelled_links = self.get_invalid_links()
+		children = self.get_all_children()
 
-		for d in self.get_all_children():
-			result = d.get_invalid_links(is_submittable=self.meta.is_submittable)
+		# fetch all linked documents of parent and children together
+		link_values = get_link_values([self] + children)
+
+		invalid_links, cancelled_links = self.get_invalid_links(link_values=link_values)
+
+		for d in children:
+			result = d.get_invalid_links(is_submittable=self.meta.is_submittable,
+				link_values=link_values)
 			invalid_links.extend(result[0])
 			cancelled_links.extend(result[1])
 
@@ -826,7 +977,9 @@ class Document(BaseDocument):
 		self.latest = None
 
 	def clear_cache(self):
+		from frappe.desk.query_report import clear_report_cache
 		frappe.cache().hdel("last_modified", self.doctype)
+		clear_report_cache(self.doctype)
 
 	def reset_seen(self):
 		'''Clear _seen property and set current user as seen'''
@@ -30,11 +30,49 @@ def get_meta(doctype, cached=True):
 	if cached:
 		if not frappe.local.meta_cache.get(doctype):
 			frappe.local.meta_cache[doctype] = frappe.cache().hget("meta", doctype,
-				lambda: Meta(doctype))
+				lambda: load_meta(doctype))
 		return frappe.local.meta_cache[doctype]
 	else:
 		return Meta(doctype)
 
+def load_meta(doctype):
+	"""Returns the processed meta of `doctype` stored for the current version of the DocType
+	and its customizations, so that clearing the `meta` cache does not rebuild all of them"""
+	version = get_meta_version(doctype)
+	if version:
+		snapshot = frappe.cache().hget("meta_snapshot", doctype)
+		if snapshot and snapshot[0]==version:
+			return snapshot[1]
+
+	meta = Meta(doctype)
+
+	# custom permissions are not loaded while patching, importing or installing
+	if version and not (frappe.flags.in_patch or frappe.flags.in_import or frappe.flags.in_install):
+		frappe.cache().hset("meta_snapshot", doctype, (version, meta))
+
+	return meta
+
+def get_meta_version(doctype):
+	"""Returns the timestamps and counts of the DocType and its customizations"""
+	try:
+		version = frappe.db.sql("""select
+			(select modified from `tabDocType` where name=%(doctype)s),
+			(select concat(count(*), ':', ifnull(max(modified), '')) from `tabCustom Field`
+				where dt=%(doctype)s),
+			(select concat(count(*), ':', ifnull(max(modified), '')) from `tabProperty Setter`
+				where doc_type=%(doctype)s),
+			(select concat(count(*), ':', ifnull(max(modified), '')) from `tabCustom DocPerm`
+				where parent=%(doctype)s)""", {"doctype": doctype})
+	except Exception as e:
+		if e.args[0]==1146:
+			# during install
+			return None
+		else:
+			raise
+
+	if version and version[0][0]:
+		return tuple(cstr(v) for v in version[0])
+
 def get_table_columns(doctype):
 	return frappe.cache().hget("table_columns", doctype,
 		lambda: frappe.db.get_table_columns(doctype))
@@ -68,6 +106,7 @@ class Meta(Document):
 		else:
 			super(Meta, self).__init__("DocType", doctype)
 		self.process()
+		self.build_field_index()
 
 	def load_from_db(self):
 		try:
@@ -78,8 +117,27 @@ class Meta(Document):
 			else:
 				raise
 
+	def build_field_index(self):
+		"""Index the processed fields by fieldname and by the lists often asked for,
+		these are stored with the meta in cache"""
+		self._fields = {}
+		self._link_fields, self._select_fields, self._global_search_fields = [], [], []
+		for df in self.get("fields"):
+			self._fields[df.fieldname] = df
+
+			if df.fieldtype=="Link" and df.get("options")!="[Select]":
+				self._link_fields.append(df)
+
+			elif df.fieldtype=="Select" and df.get("options") not in ("[Select]", "Loading..."):
+				self._select_fields.append(df)
+
+			if df.get("in_global_search") and df.fieldtype not in no_value_fields:
+				self._global_search_fields.append(df)
+
 	def get_link_fields(self):
-		return self.get("fields", {"fieldtype": "Link", "options":["!=", "[Select]"]})
+		if not hasattr(self, "_link_fields"):
+			self.build_field_index()
+		return list(self._link_fields)
 
 	def get_dynamic_link_fields(self):
 		if not hasattr(self, '_dynamic_link_fields'):
@@ -87,8 +145,9 @@ class Meta(Document):
 		return self._dynamic_link_fields
 
 	def get_select_fields(self):
-		return self.get("fields", {"fieldtype": "Select", "options":["not in",
-			["[Select]", "Loading..."]]})
+		if not hasattr(self, "_select_fields"):
+			self.build_field_index()
+		return list(self._select_fields)
 
 	def get_table_fields(self):
 		if not hasattr(self, "_table_fields"):
@@ -101,7 +160,10 @@ class Meta(Document):
 
 	def get_global_search_fields(self):
 		'''Returns list of fields with `in_global_search` set and `name` if set'''
-		fields = self.get("fields", {"in_global_search": 1, "fieldtype": ["not in", no_value_fields]})
+		if not hasattr(self, "_global_search_fields"):
+			self.build_field_index()
+
+		fields = list(self._global_search_fields)
 		if getattr(self, 'show_name_in_global_search', None):
 			fields.append(frappe._dict(fieldtype='Data', fieldname='name', label='Name'))
 
@@ -123,8 +185,7 @@ class Meta(Document):
 	def get_field(self, fieldname):
 		'''Return docfield from meta'''
 		if not self._fields:
-			for f in self.get("fields"):
-				self._fields[f.fieldname] = f
+			self.build_field_index()
 
 		return self._fields.get(fieldname)
 
@@ -500,7 +561,7 @@ def clear_cache(doctype=None):
 		cache.delete_value(key)
 
 	groups = ["meta", "form_meta", "table_columns", "last_modified",
-		"linked_doctypes", 'email_alerts']
+		"linked_doctypes", 'email_alerts', 'role_permissions', 'meta_snapshot']
 
 	def clear_single(dt):
 		for name in groups:
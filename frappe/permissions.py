@@ -181,81 +181,133 @@ def get_role_permissions(meta, user=None, verbose=False):
 	cache_key = (meta.name, user)
 
 	if not frappe.local.role_permissions.get(cache_key):
-		perms = frappe._dict(
-			apply_user_permissions={},
-			user_permission_doctypes={},
-			if_owner={}
-		)
-		roles = frappe.get_roles(user)
-		dont_match = []
-		has_a_role_with_apply_user_permissions = False
-
-		for p in meta.permissions:
-			if cint(p.permlevel)==0 and (p.role in roles):
-				# apply only for level 0
-
-				for ptype in rights:
-					# build if_owner dict if applicable for this right
-					perms[ptype] = perms.get(ptype, 0) or cint(p.get(ptype))
-
-					if ptype != "set_user_permissions" and p.get(ptype):
-						perms["apply_user_permissions"][ptype] = (perms["apply_user_permissions"].get(ptype, 1)
-							and p.get("apply_user_permissions"))
-
-					if p.if_owner and p.get(ptype):
-						perms["if_owner"][ptype] = 1
-
-					if p.get(ptype) and not p.if_owner and not p.get("apply_user_permissions"):
-						dont_match.append(ptype)
-
-				if p.apply_user_permissions:
-					has_a_role_with_apply_user_permissions = True
-
-					if p.user_permission_doctypes:
-						# set user_permission_doctypes in perms
-						try:
-							user_permission_doctypes = json.loads(p.user_permission_doctypes)
-						except ValueError:
-							user_permission_doctypes = []
-					else:
-						user_permission_doctypes = get_linked_doctypes(meta.name)
-
-					if user_permission_doctypes:
-						# perms["user_permission_doctypes"][ptype] would be a list of list like [["User", "Blog Post"], ["User"]]
-						for ptype in rights:
-							if p.get(ptype):
-								perms["user_permission_doctypes"].setdefault(ptype, []).append(user_permission_doctypes)
-
-		# if atleast one record having both Apply User Permission and If Owner unchecked is found,
-		# don't match for those rights
-		for ptype in rights:
-			if ptype in dont_match:
-				if perms["apply_user_permissions"].get(ptype):
-					del perms["apply_user_permissions"][ptype]
+		compiled = get_compiled_role_permissions(meta, frappe.get_roles(user))
+		frappe.local.role_permissions[cache_key] = expand_role_permissions(compiled)
+
+	return frappe.local.role_permissions[cache_key]
 
-				if perms["if_owner"].get(ptype):
-					del perms["if_owner"][ptype]
+def get_compiled_role_permissions(meta, roles):
+	"""Returns role permissions of the DocType for the given set of roles, compiled by
+	`compile_role_permissions`. Users with the same roles share the result, which is cached
+	across requests and cleared along with the DocType's meta."""
+	roles_key = "\n".join(sorted(set(roles)))
+	compiled_for_doctype = frappe.cache().hget("role_permissions", meta.name) or {}
+
+	if roles_key not in compiled_for_doctype:
+		compiled_for_doctype[roles_key] = compile_role_permissions(build_role_permissions(meta, roles))
+		frappe.cache().hset("role_permissions", meta.name, compiled_for_doctype)
+
+	return compiled_for_doctype[roles_key]
+
+def build_role_permissions(meta, roles):
+	"""Evaluates `meta.permissions` for the given roles, see `get_role_permissions`"""
+	perms = frappe._dict(
+		apply_user_permissions={},
+		user_permission_doctypes={},
+		if_owner={}
+	)
+	dont_match = []
+	has_a_role_with_apply_user_permissions = False
+
+	for p in meta.permissions:
+		if cint(p.permlevel)==0 and (p.role in roles):
+			# apply only for level 0
 
-		# if one row has only "Apply User Permissions" checked and another has only "If Owner" checked,
-		# set Apply User Permissions as checked
-		# i.e. the case when there is a role with apply_user_permissions as 1, but resultant apply_user_permissions is 0
-		if has_a_role_with_apply_user_permissions:
 			for ptype in rights:
-				if perms["if_owner"].get(ptype) and perms["apply_user_permissions"].get(ptype)==0:
-					perms["apply_user_permissions"][ptype] = 1
+				# build if_owner dict if applicable for this right
+				perms[ptype] = perms.get(ptype, 0) or cint(p.get(ptype))
+
+				if ptype != "set_user_permissions" and p.get(ptype):
+					perms["apply_user_permissions"][ptype] = (perms["apply_user_permissions"].get(ptype, 1)
+						and p.get("apply_user_permissions"))
+
+				if p.if_owner and p.get(ptype):
+					perms["if_owner"][ptype] = 1
+
+				if p.get(ptype) and not p.if_owner and not p.get("apply_user_permissions"):
+					dont_match.append(ptype)
+
+			if p.apply_user_permissions:
+				has_a_role_with_apply_user_permissions = True
+
+				if p.user_permission_doctypes:
+					# set user_permission_doctypes in perms
+					try:
+						user_permission_doctypes = json.loads(p.user_permission_doctypes)
+					except ValueError:
+						user_permission_doctypes = []
+				else:
+					user_permission_doctypes = get_linked_doctypes(meta.name)
+
+				if user_permission_doctypes:
+					# perms["user_permission_doctypes"][ptype] would be a list of list like [["User", "Blog Post"], ["User"]]
+					for ptype in rights:
+						if p.get(ptype):
+							perms["user_permission_doctypes"].setdefault(ptype, []).append(user_permission_doctypes)
+
+	# if atleast one record having both Apply User Permission and If Owner unchecked is found,
+	# don't match for those rights
+	for ptype in rights:
+		if ptype in dont_match:
+			if perms["apply_user_permissions"].get(ptype):
+				del perms["apply_user_permissions"][ptype]
+
+			if perms["if_owner"].get(ptype):
+				del perms["if_owner"][ptype]
+
+	# if one row has only "Apply User Permissions" checked and another has only "If Owner" checked,
+	# set Apply User Permissions as checked
+	# i.e. the case when there is a role with apply_user_permissions as 1, but resultant apply_user_permissions is 0
+	if has_a_role_with_apply_user_permissions:
+		for ptype in rights:
+			if perms["if_owner"].get(ptype) and perms["apply_user_permissions"].get(ptype)==0:
+				perms["apply_user_permissions"][ptype] = 1
 
-		# delete 0 values
+	# delete 0 values
 <<<<<<< HEAD
-		for key, value in perms.get("apply_user_permissions").items():
+	for key, value in perms.get("apply_user_permissions").items():
 =======
-		for key, value in list(perms.get("apply_user_permissions").items()):
+	for key, value in list(perms.get("apply_user_permissions").items()):
 >>>>>>> 176d241496ede1357a309fa44a037b757a252581
-			if not value:
-				del perms["apply_user_permissions"][key]
-
-		frappe.local.role_permissions[cache_key] = perms
-
-	return frappe.local.role_permissions[cache_key]
+		if not value:
+			del perms["apply_user_permissions"][key]
+
+	return perms
+
+def compile_role_permissions(perms):
+	"""Returns role permissions as a tuple of bitmasks over `rights` (for the rights, and the rights
+	with `apply_user_permissions` and `if_owner`) along with `user_permission_doctypes`.
+	The rights bitmask is `None` if no permission rule applies to the roles."""
+	def to_bitmask(d):
+		return sum(1 << i for i, ptype in enumerate(rights) if d.get(ptype))
+
+	has_rights = any(ptype in perms for ptype in rights)
+
+	return (to_bitmask(perms) if has_rights else None,
+		to_bitmask(perms.apply_user_permissions),
+		to_bitmask(perms.if_owner),
+		perms.user_permission_doctypes)
+
+def expand_role_permissions(compiled):
+	"""Returns role permissions as a dict, from the tuple returned by `compile_role_permissions`"""
+	rights_mask, apply_user_permissions_mask, if_owner_mask, user_permission_doctypes = compiled
+
+	perms = frappe._dict(
+		apply_user_permissions={},
+		user_permission_doctypes=copy.deepcopy(user_permission_doctypes),
+		if_owner={}
+	)
+
+	for i, ptype in enumerate(rights):
+		bit = 1 << i
+		if rights_mask is not None:
+			perms[ptype] = 1 if rights_mask & bit else 0
+		if apply_user_permissions_mask & bit:
+			perms.apply_user_permissions[ptype] = 1
+		if if_owner_mask & bit:
+			perms.if_owner[ptype] = 1
+
+	return perms
 
 def get_user_permissions(user):
 	from frappe.core.doctype.user_permission.user_permission import get_user_permissions
@@ -103,6 +103,16 @@ frappe.Application = Class.extend({
 			});
 			dialog.get_close_btn().toggle(false);
 		});
+
+		// exports prepared in the background
+		frappe.realtime.on("export_ready", function(data) {
+			frappe.msgprint({
+				message: __("{0} is ready to be downloaded: {1}",
+					[data.filename, repl('<a href="%(url)s" target="_blank">%(url)s</a>', {url: data.file_url})]),
+				indicator: 'green',
+				title: __('Export Ready')
+			});
+		});
 		if (frappe.sys_defaults.email_user_password){
 			var email_list =  frappe.sys_defaults.email_user_password.split(',');
 			for (var u in email_list) {
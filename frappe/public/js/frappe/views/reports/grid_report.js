@@ -6,6 +6,7 @@ frappe.provide("frappe.report_dump");
 $.extend(frappe.report_dump, {
 	data: {},
 	last_modified: {},
+	page_length: 20000,
 	with_data: function(doctypes, callback) {
 		var pre_loaded = Object.keys(frappe.report_dump.last_modified);
 		return frappe.call({
@@ -13,12 +14,22 @@ $.extend(frappe.report_dump, {
 			type: "GET",
 			args: {
 				doctypes: doctypes,
-				last_modified: frappe.report_dump.last_modified
+				last_modified: frappe.report_dump.last_modified,
+				page_length: frappe.report_dump.page_length,
+				as_columns: 1,
+				compress: 1
 			},
 			freeze: true,
 			callback: function(r) {
 				// creating map of data from a list
 				$.each(r.message, function(doctype, doctype_data) {
+					if(doctype_data.values) {
+						// columnar to rows
+						doctype_data.data = doctype_data.values.length
+							? doctype_data.values[0].map(function(v, i) {
+								return doctype_data.values.map(function(column) { return column[i]; });
+							}) : [];
+					}
 					frappe.report_dump.set_data(doctype, doctype_data);
 				});
 
@@ -40,7 +51,17 @@ $.extend(frappe.report_dump, {
 					}
 				});
 
-				callback();
+				// fetch the next pages
+				var pending = doctypes.filter(function(d) {
+					var doctype_data = r.message[d.split("[")[0]];
+					return doctype_data && doctype_data.has_more;
+				});
+
+				if(pending.length) {
+					frappe.report_dump.with_data(pending, callback);
+				} else {
+					callback();
+				}
 			}
 		})
 	},
@@ -63,13 +84,18 @@ $.extend(frappe.report_dump, {
 				replace_dict[row.name] = row;
 			});
 
+			var modified_names = {};
+			$.each(doctype_data.modified_names || [], function(i, name) {
+				modified_names[name] = true;
+			});
+
 			// replace old data
 			$.each(frappe.report_dump.data[doctype], function(i, d) {
 				if(replace_dict[d.name]) {
 					data.push(replace_dict[d.name]);
 					delete replace_dict[d.name];
-				} else if(doctype_data.modified_names.indexOf(d.name)!==-1) {
-					// if modified but not in replace_dict, then assume it as cancelled
+				} else if(modified_names[d.name]) {
+					// if modified but not in replace_dict, then assume it as cancelled or deleted
 					// don't push in data
 				} else {
 					data.push(d);
@@ -14,7 +14,6 @@ import frappe.utils
 from frappe.utils import cint, cstr
 import frappe.model.meta
 import frappe.defaults
-import frappe.translate
 from frappe.utils.change_log import get_change_log
 import redis
 from six.moves.urllib.parse import unquote
@@ -177,7 +176,8 @@ def get():
 	for hook in frappe.get_hooks("extend_bootinfo"):
 		frappe.get_attr(hook)(bootinfo=bootinfo)
 
-	bootinfo["lang"] = frappe.translate.get_user_lang()
+	from frappe.translate import get_user_lang
+	bootinfo["lang"] = get_user_lang()
 	bootinfo["disable_async"] = frappe.conf.disable_async
 
 	# limits
@@ -284,7 +284,8 @@ class Session:
 			self.start_as_guest()
 
 		if self.sid != "Guest":
-			frappe.local.user_lang = frappe.translate.get_user_lang(self.data.user)
+			from frappe.translate import get_user_lang
+			frappe.local.user_lang = get_user_lang(self.data.user)
 			frappe.local.lang = frappe.local.user_lang
 
 	def get_session_record(self):
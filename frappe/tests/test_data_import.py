@@ -2,26 +2,33 @@
 # MIT License. See license.txt
 from __future__ import unicode_literals
 
-import frappe, unittest
+import frappe, unittest, os
 from frappe.core.page.data_import_tool import exporter
 from frappe.core.page.data_import_tool import importer
 from frappe.utils.csvutils import read_csv_content
 
+def get_exported_content():
+	"""Returns the content of the file sent by the last export and removes it"""
+	with open(frappe.response.filepath, "rb") as f:
+		content = f.read()
+	os.remove(frappe.response.filepath)
+	return content
+
 class TestDataImport(unittest.TestCase):
 	def test_export(self):
 		exporter.get_template("User", all_doctypes="No", with_data="No")
-		content = read_csv_content(frappe.response.result)
+		content = read_csv_content(get_exported_content())
 		self.assertTrue(content[1][1], "User")
 
 	def test_export_with_data(self):
 		exporter.get_template("User", all_doctypes="No", with_data="Yes")
-		content = read_csv_content(frappe.response.result)
+		content = read_csv_content(get_exported_content())
 		self.assertTrue(content[1][1], "User")
 		self.assertTrue("Administrator" in [c[1] for c in content if len(c)>1])
 
 	def test_export_with_all_doctypes(self):
 		exporter.get_template("User", all_doctypes="Yes", with_data="Yes")
-		content = read_csv_content(frappe.response.result)
+		content = read_csv_content(get_exported_content())
 		self.assertTrue(content[1][1], "User")
 		self.assertTrue('"Administrator"' in [c[1] for c in content if len(c)>1])
 		self.assertEquals(content[13][0], "DocType:")
@@ -33,14 +40,14 @@ class TestDataImport(unittest.TestCase):
 			frappe.delete_doc("Blog Category", "test-category")
 
 		exporter.get_template("Blog Category", all_doctypes="No", with_data="No")
-		content = read_csv_content(frappe.response.result)
+		content = read_csv_content(get_exported_content())
 		content.append(["", "", "test-category", "Test Cateogry"])
 		importer.upload(content)
 		self.assertTrue(frappe.db.get_value("Blog Category", "test-category", "title"), "Test Category")
 
 		# export with data
 		exporter.get_template("Blog Category", all_doctypes="No", with_data="Yes")
-		content = read_csv_content(frappe.response.result)
+		content = read_csv_content(get_exported_content())
 
 		# overwrite
 		content[-1][3] = "New Title"
@@ -56,7 +63,7 @@ class TestDataImport(unittest.TestCase):
 			"first_name": "Test Import UserRole"}).insert()
 
 		exporter.get_template("Has Role", "User", all_doctypes="No", with_data="No")
-		content = read_csv_content(frappe.response.result)
+		content = read_csv_content(get_exported_content())
 		content.append(["", "test_import_userrole@example.com", "Blogger"])
 		importer.upload(content)
 
@@ -66,7 +73,7 @@ class TestDataImport(unittest.TestCase):
 
 		# overwrite
 		exporter.get_template("Has Role", "User", all_doctypes="No", with_data="No")
-		content = read_csv_content(frappe.response.result)
+		content = read_csv_content(get_exported_content())
 		content.append(["", "test_import_userrole@example.com", "Website Manager"])
 		importer.upload(content, overwrite=True)
 
@@ -76,7 +83,7 @@ class TestDataImport(unittest.TestCase):
 
 	def test_import_with_children(self):
 		exporter.get_template("Event", all_doctypes="Yes", with_data="No")
-		content = read_csv_content(frappe.response.result)
+		content = read_csv_content(get_exported_content())
 
 		content.append([None] * len(content[-2]))
 		content[-1][2] = "__Test Event with children"
@@ -92,7 +99,7 @@ class TestDataImport(unittest.TestCase):
 
 		exporter.get_template("Event", all_doctypes="No", with_data="No", from_data_import="Yes", excel_format="Yes")
 		from frappe.utils.xlsxutils import read_xlsx_file_from_attached_file
-		content = read_xlsx_file_from_attached_file(fcontent=frappe.response.filecontent)
+		content = read_xlsx_file_from_attached_file(fcontent=get_exported_content())
 		content.append(["", "EV00001", "_test", "Private", "05-11-2017 13:51:48", "0", "0", "", "1", "blue"])
 		importer.upload(content)
 		self.assertTrue(frappe.db.get_value("Event", "EV00001", "subject"), "_test")
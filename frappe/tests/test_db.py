@@ -27,3 +27,76 @@ class TestDB(unittest.TestCase):
 	def test_multiple_queries(self):
 		# implicit commit
 		self.assertRaises(frappe.SQLError, frappe.db.sql, """select name from `tabUser`; truncate `tabEmail Queue`""")
+
+	def test_sql_as_iterator(self):
+		query = "select name, enabled from `tabUser` order by name"
+		expected = frappe.db.sql(query, as_dict=True)
+
+		result = frappe.db.sql(query, as_dict=True, as_iterator=True, chunk_size=2)
+		self.assertFalse(isinstance(result, list))
+		self.assertEquals(list(result), expected)
+
+		# connection is usable once the iterator is exhausted
+		self.assertEquals(list(frappe.db.iter_sql(query)), list(frappe.db.sql(query)))
+
+		# no other query while rows are streamed
+		with frappe.db.iter_sql(query, chunk_size=1) as rows:
+			next(rows)
+			self.assertRaises(frappe.QueryInProgressError, frappe.db.sql, query)
+
+		# unread rows are drained when an unread iterator is garbage collected
+		frappe.db.iter_sql(query)
+		self.assertEquals(len(frappe.db.sql(query)), len(expected))
+
+	def test_sql_as_record(self):
+		query = "select name, enabled from `tabUser` order by name"
+		expected = frappe.db.sql(query, as_dict=True)
+		records = frappe.db.sql(query, as_record=True)
+
+		self.assertEquals(len(records), len(expected))
+		for record, d in zip(records, expected):
+			self.assertEquals(record.name, d.name)
+			self.assertEquals(record["enabled"], d.enabled)
+			self.assertEquals(record.get("enabled"), d.get("enabled"))
+			self.assertEquals(record.as_dict(), d)
+
+		self.assertRaises(AttributeError, setattr, records[0], "name", "Guest")
+
+	def test_query_profiler(self):
+		from frappe.utils import query_profiler
+
+		self.assertEquals(query_profiler.normalize_query("""select name from `tabUser`
+			where name in (%s, %s) and enabled=1 and email='a@b.com'"""),
+			"select name from `tabUser` where name in (?) and enabled=? and email=?")
+
+		query_profiler.start()
+		for user in ("Administrator", "Guest"):
+			frappe.db.sql("select name from `tabUser` where name=%s", user)
+		profiler = query_profiler.stop()
+
+		self.assertEquals(profiler.count, 2)
+		self.assertEquals(len(profiler.get_duplicates()), 1)
+		self.assertEquals(profiler.get_duplicates()[0].count, 2)
+		self.assertFalse(frappe.local.query_profiler)
+
+	def test_lookup_cache(self):
+		frappe.db.clear_lookup_cache()
+		hits = frappe.db.lookup_cache_hits
+
+		first_name = frappe.db.get_value("User", "Administrator", "first_name")
+		self.assertEquals(frappe.db.get_value("User", "Administrator", "first_name"), first_name)
+		self.assertTrue(frappe.db.exists("User", "Administrator"))
+		self.assertEquals(frappe.db.lookup_cache_hits, hits + 1)
+
+		# writes on the doctype invalidate cached lookups
+		frappe.db.sql("update `tabUser` set first_name=%s where name='Administrator'", "_Test Admin")
+		self.assertEquals(frappe.db.get_value("User", "Administrator", "first_name"), "_Test Admin")
+
+		# cached results can be modified by the caller
+		user = frappe.db.get_value("User", "Administrator", ["name", "first_name"], as_dict=True)
+		user.first_name = "changed"
+		self.assertEquals(frappe.db.get_value("User", "Administrator", ["name", "first_name"],
+			as_dict=True).first_name, "_Test Admin")
+
+		frappe.db.rollback()
+		self.assertEquals(frappe.db.get_value("User", "Administrator", "first_name"), first_name)
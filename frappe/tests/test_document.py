@@ -54,6 +54,52 @@ class TestDocument(unittest.TestCase):
 		self.assertEquals(frappe.db.get_value("Event", d.name, "subject"),
 			"test-doc-test-event 2")
 
+	def test_bulk_insert(self):
+		from frappe.model.document import bulk_insert
+
+		for i in range(5):
+			frappe.delete_doc_if_exists("Note", "test-doc-test-bulk-note {0}".format(i))
+
+		docs = bulk_insert([{
+			"doctype": "Note",
+			"title": "test-doc-test-bulk-note {0}".format(i),
+			"seen_by": [{"user": "Administrator"}]
+		} for i in range(5)], chunk_size=2)
+
+		for i, d in enumerate(docs):
+			# named by the controller
+			self.assertEquals(d.name, "test-doc-test-bulk-note {0}".format(i))
+			self.assertFalse(d.get("__islocal"))
+			self.assertTrue(frappe.db.exists("Note", d.name))
+			self.assertEquals(frappe.db.get_value("Note Seen By", {"parent": d.name}, "user"),
+				"Administrator")
+
+	def test_get_docs(self):
+		names = [frappe.get_doc({
+			"doctype": "Note",
+			"title": "test-doc-test-get-docs {0}".format(i),
+			"seen_by": [{"user": "Administrator"}, {"user": "Guest"}][:i + 1]
+		}).insert().name for i in range(2)]
+
+		docs = frappe.get_docs("Note", list(reversed(names)))
+
+		self.assertEquals([d.name for d in docs], list(reversed(names)))
+		for d in docs:
+			self.assertEquals(d.as_dict(), frappe.get_doc("Note", d.name).as_dict())
+
+		self.assertRaises(frappe.DoesNotExistError, frappe.get_docs, "Note", ["_Test Missing Note"])
+
+		for name in names:
+			frappe.delete_doc("Note", name)
+
+	def test_share_values(self):
+		from frappe.model.base_document import share_values
+
+		rows = share_values([{"owner": "".join(["Admin", "istrator"]), "idx": 1},
+			{"owner": "".join(["Admin", "istrator"]), "idx": 2}])
+		self.assertTrue(rows[0]["owner"] is rows[1]["owner"])
+		self.assertEquals([d["idx"] for d in rows], [1, 2])
+
 	def test_update(self):
 		d = self.test_insert()
 		d.subject = "subject changed"
@@ -61,6 +107,45 @@ class TestDocument(unittest.TestCase):
 
 		self.assertEquals(frappe.db.get_value(d.doctype, d.name, "subject"), "subject changed")
 
+	def test_update_changed_columns(self):
+		frappe.delete_doc_if_exists("Note", "test-doc-test-changed-columns")
+		d = frappe.get_doc({
+			"doctype": "Note",
+			"title": "test-doc-test-changed-columns",
+			"content": "content",
+			"seen_by": [{"user": "Administrator"}, {"user": "Guest"}]
+		}).insert()
+
+		d = frappe.get_doc("Note", d.name)
+		d.content = "content changed"
+		d.seen_by[1].user = "Administrator"
+		d.save()
+
+		self.assertTrue("content" in d._changed_columns)
+		self.assertFalse("title" in d._changed_columns)
+		self.assertEquals(d.seen_by[0]._changed_columns, [])
+		self.assertEquals(frappe.db.get_value("Note", d.name, "content"), "content changed")
+
+		# timestamps of unchanged rows are still updated
+		self.assertEquals(frappe.db.get_value("Note Seen By", d.seen_by[0].name, "modified"),
+			frappe.utils.get_datetime(d.modified))
+		self.assertEquals(frappe.db.get_value("Note Seen By", d.seen_by[1].name, "user"),
+			"Administrator")
+
+		# removed rows are deleted
+		d.remove(d.seen_by[0])
+		d.save()
+		self.assertEquals(frappe.db.count("Note Seen By", {"parent": d.name}), 1)
+
+		# a db_update after save (as in on_update) does not hide earlier changes from the version
+		from frappe.core.doctype.version.version import get_diff
+		before = frappe.get_doc("Note", d.name)
+		d.content = "content changed again"
+		d.db_update()
+		d.db_update()
+		self.assertEquals(d._changed_columns, [])
+		self.assertTrue("content" in [c[0] for c in get_diff(before, d).changed])
+
 	def test_mandatory(self):
 		frappe.delete_doc_if_exists("User", "test_mandatory@example.com")
 
@@ -124,6 +209,27 @@ class TestDocument(unittest.TestCase):
 
 		self.assertEquals(frappe.db.get_value("User", d.name), d.name)
 
+	def test_link_values_fetched_together(self):
+		from frappe.model.base_document import get_link_values
+
+		d = frappe.get_doc({
+			"doctype": "User",
+			"email": "test_link_values@example.com",
+			"roles": [{"role": "System Manager"}, {"role": "system manager"}, {"role": "ABC"}]
+		})
+
+		link_values = get_link_values([d] + d.get_all_children())
+		self.assertEquals(link_values[("Role", "system manager")].name, "System Manager")
+		self.assertFalse(("Role", "abc") in link_values)
+
+		invalid_links = []
+		for child in d.get("roles"):
+			invalid_links.extend(child.get_invalid_links(link_values=link_values)[0])
+
+		# case of the linked name is corrected
+		self.assertEquals(d.roles[1].role, "System Manager")
+		self.assertEquals([l[1] for l in invalid_links], ["ABC"])
+
 	def test_validate(self):
 		d = self.test_insert()
 		d.starts_on = "2014-01-01"
@@ -0,0 +1,59 @@
+# Copyright (c) 2017, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+from __future__ import unicode_literals
+
+import os
+import sys
+import json
+import subprocess
+import unittest
+
+# modules that should only be imported when a request or command needs them
+lazy_modules = ('babel', 'bleach', 'markdown2', 'num2words', 'html2text', 'requests', 'PIL',
+	'pdfkit', 'openpyxl', 'pyotp', 'jinja2', 'email.mime', 'frappe.translate', 'frappe.email',
+	'frappe.email.queue', 'frappe.email.smtp', 'frappe.email.email_body', 'frappe.website.render',
+	'frappe.handler', 'frappe.api', 'frappe.boot')
+
+# cumulative import time of frappe, in microseconds
+import_time_budget = int(os.environ.get('FRAPPE_IMPORT_TIME_BUDGET', 1500000))
+
+def get_imported_modules(statement):
+	'''Returns names of the modules in `sys.modules` after running `statement` in a new interpreter'''
+	output = subprocess.check_output([sys.executable, '-c',
+		statement + '; import sys, json; print(json.dumps(sorted(sys.modules)))'])
+
+	# last line, in case importing printed something
+	return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+def get_import_times(statement):
+	'''Returns `{module: cumulative_us}` from `python -X importtime`'''
+	process = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', statement],
+		stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+	stderr = process.communicate()[1].decode('utf-8')
+
+	times = {}
+	for line in stderr.splitlines():
+		if not line.startswith('import time:') or '|' not in line:
+			continue
+
+		parts = [p.strip() for p in line[len('import time:'):].split('|')]
+		if parts[1].isdigit():
+			times[parts[2]] = int(parts[1])
+
+	return times
+
+class TestImportTime(unittest.TestCase):
+	def test_lazy_imports(self):
+		modules = get_imported_modules('import frappe, frappe.utils, frappe.app, frappe.commands')
+		self.assertTrue('frappe.app' in modules)
+
+		for module in lazy_modules:
+			self.assertFalse(module in modules, '{0} is imported at startup'.format(module))
+
+	@unittest.skipIf(sys.version_info < (3, 7), 'needs python -X importtime')
+	def test_import_time_budget(self):
+		times = get_import_times('import frappe, frappe.utils, frappe.app')
+		self.assertTrue('frappe' in times, 'frappe could not be imported')
+		self.assertTrue(times['frappe'] < import_time_budget,
+			'frappe takes {0}us to import'.format(times['frappe']))
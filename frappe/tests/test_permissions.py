@@ -81,6 +81,27 @@ class TestPermissions(unittest.TestCase):
 		post = frappe.get_doc("Blog Post", "-test-blog-post")
 		self.assertTrue(post.has_permission("read"))
 
+	def test_compiled_role_permissions(self):
+		from frappe.permissions import (build_role_permissions, compile_role_permissions,
+			expand_role_permissions, get_role_permissions)
+
+		self.set_user_permission_doctypes(["Blog Category"])
+		meta = frappe.get_meta("Blog Post")
+
+		for roles in (["Blogger"], ["Blogger", "Website Manager"], ["Guest"]):
+			perms = build_role_permissions(meta, roles)
+			self.assertEquals(expand_role_permissions(compile_role_permissions(perms)), perms)
+
+		# users with the same roles share the compiled permissions
+		frappe.local.role_permissions = {}
+		get_role_permissions(meta, user="test2@example.com")
+		roles_key = "\n".join(sorted(set(frappe.get_roles("test2@example.com"))))
+		self.assertTrue(roles_key in frappe.cache().hget("role_permissions", "Blog Post"))
+
+		# cleared with the meta
+		frappe.clear_cache(doctype="Blog Post")
+		self.assertFalse(frappe.cache().hget("role_permissions", "Blog Post"))
+
 	def test_user_permissions_in_doc(self):
 		self.set_user_permission_doctypes(["Blog Category"])
 
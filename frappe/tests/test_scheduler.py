@@ -16,6 +16,14 @@ def test_timeout():
 	'''This function needs to be pickleable'''
 	time.sleep(100)
 
+def test_batch(items):
+	frappe.flags.test_batch = (frappe.flags.test_batch or []) + [items]
+
+def test_failing_batch(items):
+	if "bad" in items:
+		raise frappe.ValidationError
+	frappe.flags.test_failing_batch = (frappe.flags.test_failing_batch or []) + items
+
 class TestScheduler(TestCase):
 	def setUp(self):
 		frappe.db.set_global('enabled_scheduler_events', "")
@@ -107,5 +115,201 @@ class TestScheduler(TestCase):
 
 		self.assertTrue(job.is_failed)
 
+	def test_deduplicate_job(self):
+		from frappe.utils.background_jobs import is_job_queued
+
+		job_name = "test_deduplicate_job_" + frappe.generate_hash(length=6)
+		job = enqueue(test_timeout, queue="long", job_name=job_name, deduplicate=True)
+		self.assertTrue(is_job_queued(job_name, queue="long"))
+
+		# not queued again while it is queued
+		self.assertEquals(enqueue(test_timeout, queue="long", job_name=job_name, deduplicate=True), None)
+
+		job.cancel()
+		self.assertFalse(is_job_queued(job_name, queue="long"))
+
+	def test_enqueue_batched(self):
+		from frappe.utils.background_jobs import (enqueue_batched, run_batch, get_redis_conn,
+			get_batch_key, delayed_jobs_key, delayed_job_specs_key, batch_specs_key, batch_processing_key,
+			batch_max_attempts)
+		from six.moves import cPickle as pickle
+		from frappe.utils import cstr
+		from rq.job import Job
+
+		conn = get_redis_conn()
+		method = "frappe.tests.test_scheduler.test_batch"
+		key = frappe.generate_hash(length=6)
+		batch_key = get_batch_key(frappe.local.site, method, key)
+		frappe.flags.test_batch = None
+
+		# a delayed job for a new batch and one more for a full batch
+		jobs = [enqueue_batched(method, key, i, batch_size=2, max_delay=0) for i in (1, 2, 3)]
+		self.assertTrue(conn.zscore(delayed_jobs_key, jobs[0]) is not None)
+		self.assertTrue(jobs[1])
+		self.assertEquals(jobs[2], None)
+		conn.zrem(delayed_jobs_key, jobs[0])
+		Job.fetch(jobs[1], connection=conn).cancel()
+
+		run_batch(method, key, batch_size=2, max_delay=0)
+		self.assertEquals(frappe.flags.test_batch, [[1, 2], [3]])
+
+		# items of a failed call go back to the batch
+		failing_method = "frappe.tests.test_scheduler.test_failing_batch"
+		failing_key = get_batch_key(frappe.local.site, failing_method, key)
+		job_id = enqueue_batched(failing_method, key, 4, max_delay=0)
+		enqueue_batched(failing_method, key, "bad", max_delay=0)
+		conn.zrem(delayed_jobs_key, job_id)
+		frappe.flags.test_failing_batch = None
+
+		for i in range(batch_max_attempts - 1):
+			self.assertRaises(frappe.ValidationError, run_batch, failing_method, key, max_delay=0)
+		self.assertEquals(conn.lrange(failing_key, 0, -1), [pickle.dumps(4), pickle.dumps("bad")])
+		self.assertFalse([k for k in conn.zrange(batch_processing_key, 0, -1) if key in cstr(k)])
+
+		# then items are run one by one, and those that fail are logged and dropped
+		run_batch(failing_method, key, max_delay=0)
+		self.assertEquals(frappe.flags.test_failing_batch, [4])
+		self.assertEquals(conn.llen(failing_key), 0)
+		self.assertFalse(conn.exists(failing_key + ":attempts"))
+		self.assertTrue(frappe.db.exists("Error Log", {"method": failing_method}))
+
+		conn.delete(batch_key, batch_key + ":job", failing_key, failing_key + ":job")
+		conn.hdel(delayed_job_specs_key, jobs[0], job_id)
+		conn.hdel(batch_specs_key, batch_key, failing_key)
+
+	def test_fair_queues(self):
+		from frappe.utils.background_jobs import get_queue_name, rotate_site_queues, get_fair_queue_names
+
+		self.assertEquals(get_queue_name("short", "high"), "short:high")
+		self.assertEquals(get_queue_name("short", "normal", "a"), "short")
+
+		frappe.local.conf.fair_queues = 1
+		try:
+			self.assertEquals(get_queue_name("short", None, "a"), "short:site:a")
+		finally:
+			del frappe.local.conf["fair_queues"]
+
+		names = ["short:site:b", "short:site:a"]
+		self.assertEquals(rotate_site_queues(names, 0, {}), ["short:site:a", "short:site:b"])
+		self.assertEquals(rotate_site_queues(names, 1, {}), ["short:site:b", "short:site:a"])
+
+		# a gets two of three turns
+		self.assertEquals([rotate_site_queues(names, turn, {"a": 2})[0] for turn in range(3)],
+			["short:site:a", "short:site:a", "short:site:b"])
+
+		# queues of sites read by the worker are reused
+		self.assertEquals(get_fair_queue_names(["short"], turn=1, site_queues={"short": names}),
+			["short:high", "short:site:b", "short:site:a", "short", "short:low"])
+
+	def test_delayed_retry(self):
+		from frappe.utils.background_jobs import (get_retry_delay, move_delayed_jobs, get_redis_conn,
+			delayed_jobs_key, delayed_job_specs_key)
+		from six.moves import cPickle as pickle
+		from rq.job import Job
+
+		frappe.local.conf.job_retry_jitter = 0.5
+		try:
+			self.assertTrue(2 <= get_retry_delay(0) <= 3)
+			self.assertTrue(16 <= get_retry_delay(3) <= 24)
+			self.assertTrue(300 <= get_retry_delay(20) <= 450)
+		finally:
+			del frappe.local.conf["job_retry_jitter"]
+
+		conn = get_redis_conn()
+		job_id = frappe.generate_hash(length=10)
+		conn.hset(delayed_job_specs_key, job_id, pickle.dumps({"origin": "long", "timeout": 10,
+			"kwargs": {"site": frappe.local.site, "method": test_timeout, "event": None,
+				"job_name": "test_delayed_retry", "kwargs": {}, "retry": 1}}))
+		conn.execute_command("ZADD", delayed_jobs_key, time.time() - 1, job_id)
+
+		move_delayed_jobs(conn)
+		self.assertEquals(conn.zscore(delayed_jobs_key, job_id), None)
+
+		job = Job.fetch(job_id, connection=conn)
+		self.assertEquals(job.origin, "long")
+		self.assertEquals(job.kwargs["retry"], 1)
+		job.cancel()
+
+	def test_claim_delayed_jobs(self):
+		from frappe.utils.background_jobs import (enqueue_delayed, claim_delayed_jobs, get_redis_conn,
+			delayed_jobs_key, delayed_job_specs_key)
+		from frappe.utils import cstr
+
+		conn = get_redis_conn()
+		job_id = enqueue_delayed(conn, "short", 10, {}, -1)
+		later_id = enqueue_delayed(conn, "short", 10, {}, 60)
+		try:
+			# a due job is claimed only once, along with its spec
+			claimed = [cstr(j) for j, spec in claim_delayed_jobs(conn, time.time())]
+			self.assertTrue(job_id in claimed)
+			self.assertFalse(later_id in claimed)
+			self.assertFalse(job_id in [cstr(j) for j, spec in claim_delayed_jobs(conn, time.time())])
+		finally:
+			conn.zrem(delayed_jobs_key, job_id, later_id)
+			conn.hdel(delayed_job_specs_key, job_id, later_id)
+
+	def test_job_metrics(self):
+		from frappe.utils.job_metrics import record_job, get_job_metrics, format_percentile
+
+		method = "test_job_metrics_" + frappe.generate_hash(length=6)
+		record_job(frappe.local.site, "short", method, 0.05, 2, 0, "finished")
+		record_job(frappe.local.site, "short", method, None, 20, 1, "failed")
+
+		metrics = get_job_metrics(site=frappe.local.site, hours=1, method=method)[0]
+		self.assertEquals(metrics.count, 2)
+		self.assertEquals(metrics.failed, 1)
+		self.assertEquals(metrics.retries, 1)
+		self.assertEquals(metrics.avg_run, 11)
+		self.assertEquals(metrics.run_p50, 5)
+		self.assertEquals(metrics.run_p95, 30)
+		self.assertEquals(metrics.wait_p99, 0.1)
+		self.assertEquals(metrics.run_summary, "11.00s / 30s")
+
+		# overflow bucket is reported as more than the last finite bound
+		record_job(frappe.local.site, "short", method, None, 1000, 0, "finished")
+		record_job(frappe.local.site, "short", method, None, 2000, 0, "finished")
+		metrics = get_job_metrics(site=frappe.local.site, hours=1, method=method)[0]
+		self.assertEquals(metrics.run_p99, ">900")
+		self.assertEquals(format_percentile(metrics.run_p99), ">900s")
+		self.assertEquals(format_percentile(None), "-")
+
+	def test_tick_metrics(self):
+		from frappe.utils.scheduler import set_tick_metrics, get_tick_metrics
+		from frappe.utils.background_jobs import get_redis_conn
+
+		set_tick_metrics(get_redis_conn(), time.time() - 5, 300, 1, 4)
+		tick = get_tick_metrics()
+		self.assertEquals(tick.sites, "300")
+		self.assertTrue(float(tick.duration) >= 5)
+		self.assertTrue(tick.behind)
+
+		# caught up with the next tick
+		set_tick_metrics(get_redis_conn(), time.time(), 300, 0, 4)
+		tick = get_tick_metrics()
+		self.assertTrue(tick.max_duration >= 5)
+		self.assertFalse(tick.behind)
+
+	def test_persistent_worker_context(self):
+		from frappe.utils import background_jobs
+
+		flags, db = frappe.local.flags, frappe.db
+		background_jobs.persistent_worker = True
+		try:
+			frappe.local.config_mtime = background_jobs.get_config_mtime(frappe.local.site)
+			frappe.local.cache["test_persistent_worker"] = {"key": "value"}
+			frappe.flags.test_persistent_worker = True
+
+			background_jobs.connect_site(frappe.local.site)
+
+			# same connection, fresh request state
+			self.assertTrue(frappe.db is db)
+			self.assertFalse(frappe.flags.test_persistent_worker)
+			self.assertFalse("test_persistent_worker" in frappe.local.cache)
+			self.assertEquals(frappe.session.user, "Administrator")
+
+		finally:
+			background_jobs.persistent_worker = False
+			frappe.local.flags = flags
+
 	def tearDown(self):
 		frappe.flags.ran_schedulers = []
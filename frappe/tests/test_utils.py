@@ -84,3 +84,38 @@ class TestDataManipulation(unittest.TestCase):
 		self.assertTrue('<img src="{0}/assets/frappe/test.jpg">'.format(url) in html)
 		self.assertTrue('style="background-image: url(\'{0}/assets/frappe/bg.jpg\') !important"'.format(url) in html)
 		self.assertTrue('<a href="mailto:test@example.com">email</a>' in html)
+
+class TestRealtimeBuffer(unittest.TestCase):
+	def test_coalesce_progress(self):
+		import json, time
+		from frappe.async import RealtimeBuffer
+
+		buffer = RealtimeBuffer()
+		buffer.last_flush = time.time()
+		buffer.add('progress', {'percent': 10, 'title': 'Import'}, 'room')
+		buffer.add('msgprint', 'Imported', 'room')
+		buffer.add('progress', {'percent': 20, 'title': 'Import'}, 'room')
+
+		# superseded progress is replaced in place
+		self.assertEqual(len(buffer.messages), 2)
+		self.assertEqual(json.loads(buffer.messages[0])['message']['percent'], 20)
+
+		# sent with the next message after the interval
+		buffer.last_flush = time.time() - 1
+		buffer.add('msgprint', 'Done', 'room')
+		self.assertEqual(buffer.messages, [])
+
+class TestJinja(unittest.TestCase):
+	def test_bytecode_cache(self):
+		import frappe
+		from frappe.utils.jinja import get_bytecode_cache, get_template
+
+		get_bytecode_cache().clear()
+		get_template("templates/includes/footer/footer.html")
+		compiled = dict(get_bytecode_cache().cache)
+		self.assertTrue(compiled)
+
+		# environment of the next request loads the compiled template
+		frappe.local.jenv = None
+		get_template("templates/includes/footer/footer.html")
+		self.assertEqual(get_bytecode_cache().cache, compiled)
@@ -15,7 +15,6 @@ from six import iteritems, text_type, string_types
 import frappe, os, re, codecs, json
 from frappe.model.utils import render_include, InvalidIncludePath
 from frappe.utils import strip
-from jinja2 import TemplateError
 import itertools, operator
 
 def guess_language(lang_list=None):
@@ -501,6 +500,8 @@ def extract_messages_from_code(code, is_py=False):
 
 	:param code: code from which translatable files are to be extracted
 	:param is_py: include messages in triple quotes e.g. `_('''message''')`"""
+	from jinja2 import TemplateError
+
 	try:
 		code = render_include(code)
 	except (TemplateError, ImportError, InvalidIncludePath):
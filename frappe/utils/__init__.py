@@ -4,12 +4,8 @@
 # util __init__.py
 
 from __future__ import unicode_literals, print_function
-from werkzeug.test import Client
-import os, re, sys, json, hashlib, requests, traceback
-from markdown2 import markdown as _markdown
-from .html_utils import sanitize_html
+import os, re, sys, json, hashlib, traceback
 import frappe
-from frappe.utils.identicon import Identicon
 from email.utils import parseaddr, formataddr
 # utility functions like cint, int, flt, etc.
 from frappe.utils.data import *
@@ -141,6 +137,7 @@ def has_gravatar(email):
 	hexdigest = hashlib.md5(frappe.as_unicode(email).encode('utf-8')).hexdigest()
 
 	gravatar_url = "https://secure.gravatar.com/avatar/{hash}?d=404&s=200".format(hash=hexdigest)
+	import requests
 	try:
 		res = requests.get(gravatar_url)
 		if res.status_code==200:
@@ -157,6 +154,7 @@ def get_gravatar(email):
 	gravatar_url = has_gravatar(email)
 
 	if not gravatar_url:
+		from frappe.utils.identicon import Identicon
 		gravatar_url = Identicon(email).base64()
 
 	return gravatar_url
@@ -334,6 +332,7 @@ def touch_file(path):
 	return path
 
 def get_test_client():
+	from werkzeug.test import Client
 	from frappe.app import application
 	return Client(application)
 
@@ -402,6 +401,7 @@ def get_sites(sites_path=None):
 	return sorted(sites)
 
 def get_request_session(max_retries=3):
+	import requests
 	from urllib3.util import Retry
 	session = requests.Session()
 	session.mount("http://", requests.adapters.HTTPAdapter(max_retries=Retry(total=5, status_forcelist=[500])))
@@ -435,7 +435,14 @@ def watch(path, handler=None, debug=True):
 		observer.stop()
 	observer.join()
 
+def sanitize_html(html, linkify=False):
+	'''Sanitize HTML tags, attributes and style to prevent XSS attacks, see `frappe.utils.html_utils`'''
+	# bleach is slow to import
+	from frappe.utils.html_utils import sanitize_html as _sanitize_html
+	return _sanitize_html(html, linkify=linkify)
+
 def markdown(text, sanitize=True, linkify=True):
+	from markdown2 import markdown as _markdown
 	html = _markdown(text)
 
 	if sanitize:
@@ -2,23 +2,53 @@ from __future__ import unicode_literals, print_function
 import redis
 from rq import Connection, Queue, Worker
 from rq.logutils import setup_loghandlers
-from frappe.utils import cstr
+from rq.worker import SimpleWorker, WorkerStatus
+from rq.exceptions import DequeueTimeout
+from frappe.utils import cstr, cint, flt
 from collections import defaultdict
 import frappe
 import MySQLdb
-import os, socket, time
+import os, socket, time, random
+from uuid import uuid4
+from datetime import datetime
 from frappe import _
 from six import string_types
+from six.moves import cPickle as pickle
 
 default_timeout = 300
+queued_jobs_key = 'frappe:queued_jobs'
+batch_key_prefix = 'frappe:batch'
+
+# batch keys and the job that drains them, to schedule a job for batches left without one
+batch_specs_key = 'frappe:batch_specs'
+
+# lists of items being processed by batch jobs, scored by the time after which
+# their items are put back in the batch (the job was lost)
+batch_processing_key = 'frappe:batch_processing'
+
+# failures of the head of a batch, after which its items are run one by one
+# and those that still fail are logged and dropped
+batch_max_attempts = 3
+
+# jobs to be retried, ids scored by the time at which they are enqueued again
+delayed_jobs_key = 'frappe:delayed_jobs'
+delayed_job_specs_key = 'frappe:delayed_job_specs'
+max_retries = 5
+
+# set by `start_worker`, keeps the site context alive between jobs
+persistent_worker = False
+
 queue_timeout = {
 	'long': 1500,
 	'default': 300,
 	'short': 300
 }
 
+# workers listen on queues of higher priority first
+priorities = ('high', 'normal', 'low')
+
 def enqueue(method, queue='default', timeout=300, event=None,
-	async=True, job_name=None, now=False, **kwargs):
+	async=True, job_name=None, now=False, deduplicate=False, priority=None, **kwargs):
 	'''
 		Enqueue method to be executed using a background worker
 
@@ -29,32 +59,243 @@ def enqueue(method, queue='default', timeout=300, event=None,
 		:param async: if async=False, the method is executed immediately, else via a worker
 		:param job_name: can be used to name an enqueue call, which can be used to prevent duplicate calls
 		:param now: if now=True, the method is executed via frappe.call
+		:param deduplicate: do not enqueue if a job with the same `job_name` is queued or running for this site and queue
+		:param priority: high, normal (default) or low. Workers pick up jobs of higher priority first
 		:param kwargs: keyword arguments to be passed to the method
 	'''
 	if now or frappe.flags.in_migrate:
 		return frappe.call(method, **kwargs)
 
-	q = get_queue(queue, async=async)
+	q = get_queue(queue, async=async, priority=priority, site=frappe.local.site)
 	if not timeout:
 		timeout = queue_timeout.get(queue) or 300
 
-	return q.enqueue_call(execute_job, timeout=timeout,
+	job_name = job_name or cstr(method)
+	if deduplicate and async and is_job_queued(job_name, queue):
+		return None
+
+	job = q.enqueue_call(execute_job, timeout=timeout,
 		kwargs={
 			"site": frappe.local.site,
 			"user": frappe.session.user,
 			"method": method,
 			"event": event,
-			"job_name": job_name or cstr(method),
+			"job_name": job_name,
+			"queue": queue,
 			"async": async,
 			"kwargs": kwargs
 		})
 
-def execute_job(site, method, event, job_name, kwargs, user=None, async=True, retry=0):
+	if async:
+		q.connection.hset(queued_jobs_key, get_job_key(frappe.local.site, queue, job_name), job.id)
+
+	return job
+
+def enqueue_batched(method, key, item, queue='short', timeout=None, batch_size=1000, max_delay=2, now=False):
+	'''
+		Add `item` to a batch that is processed by a single background job. `method` is called
+		with the list of items of the batch, instead of one job per item.
+
+		:param method: method string, called as `method(items)`
+		:param key: items with the same method and key for this site are batched together
+		:param item: picklable value to be added to the batch
+		:param queue: should be either long, default or short
+		:param batch_size: maximum number of items passed to one call of `method`
+		:param max_delay: seconds after the first item of a batch at which its job runs
+		:param now: if now=True, `method` is called immediately with `[item]`
+
+		Returns the id of the job, if a new one was scheduled.
+	'''
+	if now or frappe.flags.in_migrate:
+		return frappe.get_attr(method)([item])
+
+	conn = get_redis_conn()
+	batch_key = get_batch_key(frappe.local.site, method, key)
+	length = conn.rpush(batch_key, pickle.dumps(item))
+
+	spec = {
+		'origin': get_queue_name(queue, None, frappe.local.site),
+		'timeout': timeout or queue_timeout.get(queue) or default_timeout,
+		'kwargs': {
+			'site': frappe.local.site,
+			'user': frappe.session.user,
+			'method': 'frappe.utils.background_jobs.run_batch',
+			'event': None,
+			'job_name': '{0}|{1}'.format(method, key),
+			'queue': queue,
+			'async': True,
+			'kwargs': {'batch_method': method, 'key': key, 'batch_size': batch_size, 'max_delay': max_delay}
+		}
+	}
+
+	# the batch is drained by a job scheduled with its first item, one more job is
+	# enqueued for every full batch so that workers can share a backlog
+	if length % batch_size == 0:
+		return Queue(spec['origin'], connection=conn).enqueue_call(execute_job,
+			timeout=spec['timeout'], kwargs=spec['kwargs']).id
+
+	return schedule_batch(conn, batch_key, spec, max_delay)
+
+def schedule_batch(conn, batch_key, spec, delay):
+	'''Schedules a job to drain the batch after `delay` seconds, unless it already has one.
+	Returns the id of the job if it was scheduled.'''
+	job_id = cstr(uuid4())
+
+	# the job holds the batch until it is done, or till its timeout if it is lost
+	if not conn.set(batch_key + ':job', job_id, nx=True, ex=int(spec['timeout'] + delay) + 60):
+		return None
+
+	conn.hset(batch_specs_key, batch_key, pickle.dumps(spec))
+	return enqueue_delayed(conn, spec['origin'], spec['timeout'], spec['kwargs'], delay, job_id)
+
+def run_batch(batch_method, key, batch_size=1000, max_delay=2):
+	'''Calls `batch_method` with the items added via `enqueue_batched`, `batch_size` at a time,
+	until the batch is empty.
+
+	Items are moved to a list of this job while they are processed, and removed after they
+	are committed. If `batch_method` fails, they are put back at the head of the batch. After
+	`batch_max_attempts` failures, they are run one at a time, and items that fail on their own
+	are logged in Error Log and dropped, so that they do not hold back the rest of the batch.'''
+	from rq import get_current_job
+
+	conn = get_redis_conn()
+	batch_key = get_batch_key(frappe.local.site, batch_method, key)
+	method = frappe.get_attr(batch_method)
+
+	job = get_current_job(conn)
+	job_id = job.id if job else cstr(uuid4())
+	timeout = (job.timeout if job else None) or default_timeout
+	processing_key = '{0}:processing:{1}'.format(batch_key, job_id)
+
+	while True:
+		items = claim_batch(conn, batch_key, processing_key, batch_size, time.time() + timeout)
+		if not items:
+			break
+
+		try:
+			method(items)
+			frappe.db.commit()
+		except Exception:
+			frappe.db.rollback()
+
+			# items are put back at the head of the batch, so the next claim starts with them
+			attempts = conn.incr(batch_key + ':attempts')
+			conn.expire(batch_key + ':attempts', 86400)
+			if attempts < batch_max_attempts:
+				requeue_batch(conn, batch_key, processing_key)
+				# the batch keeps this job till it times out, so it is not retried right away
+				raise
+
+			run_batch_items(method, batch_method, items)
+
+		conn.pipeline().delete(processing_key, batch_key + ':attempts') \
+			.zrem(batch_processing_key, processing_key).execute()
+
+	if cstr(conn.get(batch_key + ':job')) == job_id:
+		conn.delete(batch_key + ':job')
+
+		# items added after the batch was drained, and before it was released
+		spec = conn.hget(batch_specs_key, batch_key)
+		if spec and conn.llen(batch_key):
+			schedule_batch(conn, batch_key, pickle.loads(spec), max_delay)
+
+def run_batch_items(method, batch_method, items):
+	'''Calls `method` with each of `items` on its own, for a batch that failed repeatedly.
+	Items that fail are logged and dropped.'''
+	for item in items:
+		try:
+			method([item])
+			frappe.db.commit()
+		except Exception:
+			frappe.db.rollback()
+			frappe.log_error('Dropped from batch:\n{0!r}\n\n{1}'.format(item, frappe.get_traceback()),
+				batch_method)
+			frappe.db.commit()
+
+def claim_batch(conn, batch_key, processing_key, batch_size, deadline):
+	'''Moves upto `batch_size` items from the head of the batch to `processing_key` and
+	returns them. They are put back in the batch by `sweep_batches` after `deadline`.'''
+	values = conn.register_script('''
+		local items = redis.call('lrange', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+		if #items > 0 then
+			redis.call('ltrim', KEYS[1], #items, -1)
+			redis.call('rpush', KEYS[2], unpack(items))
+			redis.call('zadd', KEYS[3], ARGV[2], KEYS[2])
+		end
+		return items
+	''')(keys=[batch_key, processing_key, batch_processing_key], args=[batch_size, deadline])
+
+	return [pickle.loads(value) for value in values]
+
+def requeue_batch(conn, batch_key, processing_key):
+	'''Puts the items of `processing_key` back at the head of the batch, in their order'''
+	conn.register_script('''
+		local items = redis.call('lrange', KEYS[2], 0, -1)
+		for i = #items, 1, -1 do
+			redis.call('lpush', KEYS[1], items[i])
+		end
+		redis.call('del', KEYS[2])
+		redis.call('zrem', KEYS[3], KEYS[2])
+		return #items
+	''')(keys=[batch_key, processing_key, batch_processing_key])
+
+def sweep_batches(conn):
+	'''Puts back the items of lost batch jobs, and schedules a job for batches that have items
+	but no job. Called with `move_delayed_jobs`.'''
+	for processing_key in conn.zrangebyscore(batch_processing_key, 0, time.time()):
+		processing_key = cstr(processing_key)
+		requeue_batch(conn, processing_key.split(':processing:')[0], processing_key)
+
+	for batch_key, spec in conn.hgetall(batch_specs_key).items():
+		batch_key = cstr(batch_key)
+		if conn.llen(batch_key):
+			schedule_batch(conn, batch_key, pickle.loads(spec), 0)
+
+		elif not conn.exists(batch_key + ':job'):
+			conn.hdel(batch_specs_key, batch_key)
+
+def get_batch_key(site, method, key):
+	return '{0}:{1}|{2}|{3}'.format(batch_key_prefix, site, method, key)
+
+def is_job_queued(job_name, queue='default', site=None):
+	'''Returns True if a job named `job_name` is queued or running for the site and queue.
+	Looks up the index of enqueued jobs instead of reading every job in the queue.'''
+	from rq.job import Job, JobStatus
+
+	conn = get_redis_conn()
+	job_id = conn.hget(queued_jobs_key, get_job_key(site or frappe.local.site, queue, job_name))
+	if not job_id:
+		return False
+
+	# waiting to be retried
+	if conn.zscore(delayed_jobs_key, job_id) is not None:
+		return True
+
+	# the job may have been removed from the queue without running
+	status = Job(cstr(job_id), connection=conn).get_status()
+	return status in (JobStatus.QUEUED, JobStatus.STARTED)
+
+def remove_from_queued_jobs(site, queue, job_name):
+	'''Removes the job from the index of enqueued jobs, unless it was enqueued again'''
+	from rq import get_current_job
+
+	conn = get_redis_conn()
+	key = get_job_key(site, queue, job_name)
+	current_job = get_current_job(conn)
+	job_id = conn.hget(queued_jobs_key, key)
+
+	if job_id and (not current_job or cstr(job_id)==current_job.id):
+		conn.hdel(queued_jobs_key, key)
+
+def get_job_key(site, queue, job_name):
+	return '{0}|{1}|{2}'.format(site, queue, job_name)
+
+def execute_job(site, method, event, job_name, kwargs, user=None, async=True, retry=0, queue=None):
 	'''Executes job in a worker, performs commit/rollback and logs if there is any error'''
 	from frappe.utils.scheduler import log
 
 	if async:
-		frappe.connect(site)
+		connect_site(site)
 		if os.environ.get('CI'):
 			frappe.flags.in_test = True
 
@@ -67,23 +308,30 @@ def execute_job(site, method, event, job_name, kwargs, user=None, async=True, re
 	else:
 		method_name = cstr(method.__name__)
 
+	start, end = time.time(), None
+	status = 'failed'
+
 	try:
 		method(**kwargs)
 
 	except (MySQLdb.OperationalError, frappe.RetryBackgroundJobError) as e:
 		frappe.db.rollback()
 
-		if (retry < 5 and
+		if (retry < max_retries and
 			(isinstance(e, frappe.RetryBackgroundJobError) or e.args[0] in (1213, 1205))):
 			# retry the job if
 			# 1213 = deadlock
 			# 1205 = lock wait timeout
 			# or RetryBackgroundJobError is explicitly raised
-			frappe.destroy()
-			time.sleep(retry+1)
+			status, end = 'retried', time.time()
 
-			return execute_job(site, method, event, job_name, kwargs,
-				async=async, retry=retry+1)
+			if async:
+				# the worker is free to run other jobs till then
+				enqueue_retry(retry)
+			else:
+				time.sleep(retry+1)
+				return execute_job(site, method, event, job_name, kwargs,
+					async=async, retry=retry+1, queue=queue)
 
 		else:
 			log(method_name, message=repr(locals()))
@@ -96,23 +344,279 @@ def execute_job(site, method, event, job_name, kwargs, user=None, async=True, re
 
 	else:
 		frappe.db.commit()
+		status = 'finished'
 
 	finally:
 		if async:
+			if queue:
+				# not removed if the retry is indexed
+				remove_from_queued_jobs(site, queue, job_name)
+
+			record_job_metrics(site, queue, method_name, start, end or time.time(), retry, status)
+			release_site()
+
+def enqueue_retry(retry):
+	'''Enqueues the current job again after a delay, see `get_retry_delay`.'''
+	from rq import get_current_job
+
+	conn = get_redis_conn()
+	job = get_current_job(conn)
+	kwargs = dict(job.kwargs, retry=retry + 1)
+
+	job_id = enqueue_delayed(conn, job.origin, job.timeout, kwargs, get_retry_delay(retry))
+
+	if kwargs.get('queue'):
+		conn.hset(queued_jobs_key, get_job_key(kwargs['site'], kwargs['queue'], kwargs['job_name']), job_id)
+
+def enqueue_delayed(conn, origin, timeout, kwargs, delay, job_id=None):
+	'''Enqueues `execute_job` with `kwargs` on the rq queue `origin` after `delay` seconds.
+	Returns the id of the job.
+
+	Delayed jobs are moved to their queue by `move_delayed_jobs`, which is run by the scheduler
+	(`enqueue_delayed_jobs`) and by workers while they wait for jobs, so retries are not held
+	back when the scheduler is disabled.'''
+	job_id = job_id or cstr(uuid4())
+
+	pipe = conn.pipeline()
+	pipe.hset(delayed_job_specs_key, job_id, pickle.dumps({
+		'origin': origin,
+		'timeout': timeout,
+		'kwargs': kwargs
+	}))
+	pipe.execute_command('ZADD', delayed_jobs_key, time.time() + delay, job_id)
+	pipe.execute()
+
+	return job_id
+
+def get_retry_delay(retry):
+	'''Returns seconds to wait before a retry, doubling from `job_retry_backoff` (default 2)
+	upto `job_retry_max_delay` (default 300), plus upto `job_retry_jitter` (default 0.5) times
+	of it at random, so that jobs that failed together are not retried together.'''
+	conf = frappe.local.conf
+	delay = min(flt(conf.job_retry_backoff or 2) * (2 ** retry), flt(conf.job_retry_max_delay or 300))
+
+	return delay + random.uniform(0, delay * flt(conf.job_retry_jitter or 0.5))
+
+def enqueue_delayed_jobs():
+	'''Moves jobs whose retry is due to their queue, called by the scheduler. Workers also
+	move due jobs, see `FairQueuesMixin.move_delayed_jobs`.'''
+	with frappe.init_site():
+		conn = get_redis_conn()
+
+	move_delayed_jobs(conn)
+	sweep_batches(conn)
+
+def move_delayed_jobs(conn):
+	'''Enqueues delayed jobs that are due on their queue'''
+	for job_id, spec in claim_delayed_jobs(conn, time.time()):
+		spec = pickle.loads(spec)
+		Queue(spec['origin'], connection=conn).enqueue_call(execute_job, timeout=spec['timeout'],
+			kwargs=spec['kwargs'], job_id=cstr(job_id))
+
+def claim_delayed_jobs(conn, now, limit=1000):
+	'''Removes upto `limit` delayed jobs due by `now` and returns `[(job_id, spec)]`. Atomic,
+	so that a job is claimed by only one of the scheduler and workers.'''
+	values = conn.register_script('''
+		local out = {}
+		for _, job_id in ipairs(redis.call('zrangebyscore', KEYS[1], 0, ARGV[1], 'limit', 0, ARGV[2])) do
+			redis.call('zrem', KEYS[1], job_id)
+			local spec = redis.call('hget', KEYS[2], job_id)
+			if spec then
+				redis.call('hdel', KEYS[2], job_id)
+				table.insert(out, job_id)
+				table.insert(out, spec)
+			end
+		end
+		return out
+	''')(keys=[delayed_jobs_key, delayed_job_specs_key], args=[now, limit])
+
+	return list(zip(values[::2], values[1::2]))
+
+def record_job_metrics(site, queue, method_name, start, end, retry, status):
+	'''Records wait and run time of the job, see `frappe.utils.job_metrics`'''
+	from rq import get_current_job
+	from frappe.utils.job_metrics import record_job
+
+	try:
+		conn = get_redis_conn()
+		job = get_current_job(conn)
+
+		wait_time = None
+		if job and job.enqueued_at and not retry:
+			# enqueued_at is in UTC
+			wait_time = max(start - (job.enqueued_at - datetime(1970, 1, 1)).total_seconds(), 0)
+
+		record_job(site, queue, method_name, wait_time, end - start, retry, status)
+
+	except redis.exceptions.ConnectionError:
+		pass
+
+def connect_site(site):
+	'''Connects to the site before running a job.
+
+	In a persistent worker, the site context of the previous job is reused if it was for the
+	same site and its config has not changed. Only the request scoped state of `frappe.local`
+	and the per connection caches are reset.'''
+	if not persistent_worker:
+		frappe.connect(site)
+		return
+
+	if (getattr(frappe.local, 'site', None) == site and getattr(frappe.local, 'db', None)
+		and getattr(frappe.local, 'config_mtime', None) == get_config_mtime(site) and ping_db()):
+		frappe.init_request_locals()
+		frappe.local.lang = frappe.local.conf.lang or 'en'
+		frappe.db.value_cache = {}
+		frappe.db.clear_lookup_cache()
+		frappe.set_user('Administrator')
+
+	else:
+		if getattr(frappe.local, 'initialised', None):
+			frappe.destroy()
+
+		frappe.connect(site)
+		frappe.local.config_mtime = get_config_mtime(site)
+
+def release_site():
+	'''Ends the site context of a job. A persistent worker keeps it (and the database connection)
+	for the next job, after discarding any uncommitted writes.'''
+	if not persistent_worker:
+		frappe.destroy()
+		return
+
+	frappe.async.flush_realtime_buffer()
+
+	if getattr(frappe.local, 'db', None):
+		try:
+			frappe.db.rollback()
+		except Exception:
+			# connection is broken, connect again for the next job
 			frappe.destroy()
 
-def start_worker(queue=None):
-	'''Wrapper to start rq worker. Connects to redis and monitors these queues.'''
+def get_config_mtime(site):
+	'''Returns modified times of `common_site_config.json` and `site_config.json`'''
+	out = []
+	for path in (os.path.join(frappe.local.sites_path, 'common_site_config.json'),
+		os.path.join(frappe.local.sites_path, site, 'site_config.json')):
+		out.append(os.path.getmtime(path) if os.path.exists(path) else None)
+
+	return tuple(out)
+
+def ping_db():
+	'''Returns True if the database connection of a persistent worker is still open'''
+	try:
+		frappe.db._conn.ping()
+		return True
+	except Exception:
+		return False
+
+class FairQueuesMixin(object):
+	'''Listens on the queues of all priorities, highest first. Within normal priority, the
+	queues of sites (see `get_queue_name`) come first and are rotated after every job,
+	so that sites take turns. A site with weight `n` in `queue_weights` gets `n` turns.
+
+	`dequeue_job_and_maintain_ttl` follows `rq.Worker` of rq 0.8, which is pinned in
+	requirements.txt. Check it against rq before upgrading.'''
+
+	# seconds to block on the queues, before looking for queues of new sites
+	poll_interval = 5
+
+	# seconds for which the queues of sites are reused before they are read again
+	site_queues_ttl = 30
+
+	# seconds between moving due delayed jobs (retries, batches) to their queues
+	delayed_jobs_interval = 5
+
+	def __init__(self, queues, priority=None, weights=None, *args, **kwargs):
+		self.base_queues = queues
+		self.priority = priority
+		self.weights = weights or {}
+		self.turn = 0
+		self.site_queues = None
+		self.site_queues_read_at = 0
+		self.delayed_jobs_moved_at = 0
+
+		super(FairQueuesMixin, self).__init__(
+			[get_queue_name(queue, priority) for queue in queues], *args, **kwargs)
+
+	def get_site_queue_names(self):
+		if self.site_queues is None or time.time() - self.site_queues_read_at > self.site_queues_ttl:
+			self.site_queues = get_site_queue_names(self.connection)
+			self.site_queues_read_at = time.time()
+
+		return self.site_queues
+
+	def move_delayed_jobs(self):
+		'''Moves due delayed jobs to their queues, like the scheduler does, so that retries and
+		batches run even if the scheduler is disabled'''
+		if time.time() - self.delayed_jobs_moved_at > self.delayed_jobs_interval:
+			self.delayed_jobs_moved_at = time.time()
+			move_delayed_jobs(self.connection)
+
+	def dequeue_job_and_maintain_ttl(self, timeout):
+		result = None
+		self.set_state(WorkerStatus.IDLE)
+
+		while True:
+			self.heartbeat()
+			self.move_delayed_jobs()
+			names = get_fair_queue_names(self.base_queues, self.priority, self.turn, self.weights,
+				site_queues=self.get_site_queue_names())
+			if names != [q.name for q in self.queues]:
+				self.queues = [self.queue_class(name, connection=self.connection, job_class=self.job_class)
+					for name in names]
+
+			try:
+				result = self.queue_class.dequeue_any(self.queues,
+					min(timeout, self.poll_interval) if timeout else timeout,
+					connection=self.connection, job_class=self.job_class)
+				if result is not None:
+					job, queue = result
+					self.log.info('{0}: {1} ({2})'.format(queue.name, job.description, job.id))
+
+				break
+			except DequeueTimeout:
+				pass
+
+		self.turn += 1
+		self.heartbeat()
+		return result
+
+class FairWorker(FairQueuesMixin, Worker):
+	pass
+
+class FairSimpleWorker(FairQueuesMixin, SimpleWorker):
+	pass
+
+def start_worker(queue=None, persistent=False, priority=None):
+	'''Wrapper to start rq worker. Connects to redis and monitors these queues.
+
+	:param persistent: Run jobs in the worker process and keep the site context between
+		consecutive jobs of the same site, instead of forking and connecting per job.
+		Can also be set via `persistent_workers` in `common_site_config.json`.
+	:param priority: Only pick up jobs of this priority, e.g. a worker for `high` priority jobs.'''
+	global persistent_worker
+
+	if priority:
+		validate_priority(priority)
+
 	with frappe.init_site():
 		# empty init is required to get redis_queue from common_site_config.json
 		redis_connection = get_redis_conn()
+		persistent = persistent or frappe.local.conf.persistent_workers
+		weights = frappe.local.conf.queue_weights
 
 	if os.environ.get('CI'):
 		setup_loghandlers('ERROR')
 
+	persistent_worker = bool(persistent)
+
+	# a forking worker runs every job in a new process, so nothing would persist
+	worker_class = FairSimpleWorker if persistent_worker else FairWorker
+
 	with Connection(redis_connection):
 		queues = get_queue_list(queue)
-		Worker(queues, name=get_worker_name(queue)).work()
+		worker_class(queues, priority=priority, weights=weights,
+			name=get_worker_name(queue)).work()
 
 def get_worker_name(queue):
 	'''When limiting worker to a specific queue, also append queue name to default worker name'''
@@ -131,20 +635,19 @@ def get_jobs(site=None, queue=None, key='method'):
 	'''Gets jobs per queue or per site or both'''
 	jobs_per_site = defaultdict(list)
 	for queue in get_queue_list(queue):
-		q = get_queue(queue)
-
-		for job in q.jobs:
-			if job.kwargs.get('site'):
-				if site is None:
-					# get jobs for all sites
-					jobs_per_site[job.kwargs['site']].append(job.kwargs[key])
+		for q in get_queues(queue):
+			for job in q.jobs:
+				if job.kwargs.get('site'):
+					if site is None:
+						# get jobs for all sites
+						jobs_per_site[job.kwargs['site']].append(job.kwargs[key])
 
-				elif job.kwargs['site'] == site:
-					# get jobs only for given site
-					jobs_per_site[site].append(job.kwargs[key])
+					elif job.kwargs['site'] == site:
+						# get jobs only for given site
+						jobs_per_site[site].append(job.kwargs[key])
 
-			else:
-				print('No site found in job', job.__dict__)
+				else:
+					print('No site found in job', job.__dict__)
 
 	return jobs_per_site
 
@@ -163,11 +666,79 @@ def get_queue_list(queue_list=None):
 	else:
 		return default_queue_list
 
-def get_queue(queue, async=True):
+def get_queue(queue, async=True, priority=None, site=None):
 	'''Returns a Queue object tied to a redis connection'''
 	validate_queue(queue)
 
-	return Queue(queue, connection=get_redis_conn(), async=async)
+	return Queue(get_queue_name(queue, priority, site), connection=get_redis_conn(), async=async)
+
+def get_queue_name(queue, priority=None, site=None):
+	'''Returns the name of the rq queue for a priority.
+
+	Jobs of normal priority of a site go to a queue of their own if `fair_queues` is set
+	in `common_site_config.json`, so that sites with many jobs do not hold up others.'''
+	if priority and priority != 'normal':
+		validate_priority(priority)
+		return '{0}:{1}'.format(queue, priority)
+
+	if site and frappe.local.conf.fair_queues:
+		return '{0}:site:{1}'.format(queue, site)
+
+	return queue
+
+def get_fair_queue_names(queues, priority=None, turn=0, weights=None, conn=None, site_queues=None):
+	'''Returns the names of queues to listen on, in the order in which they are picked up
+
+	:param site_queues: Queues of sites, see `get_site_queue_names`. Read from redis if not given.'''
+	if site_queues is None:
+		site_queues = get_site_queue_names(conn or get_redis_conn())
+	out = []
+
+	for p in ([priority] if priority else priorities):
+		for queue in queues:
+			if p == 'normal':
+				out.extend(rotate_site_queues(site_queues.get(queue, []), turn, weights or {}))
+
+			out.append(get_queue_name(queue, p))
+
+	return out
+
+def get_site_queue_names(conn):
+	'''Returns the names of queues of sites as `{queue: [names]}`'''
+	out = defaultdict(list)
+	prefix = Queue.redis_queue_namespace_prefix
+
+	for key in conn.smembers(Queue.redis_queues_keys):
+		name = cstr(key)[len(prefix):]
+		if ':site:' in name:
+			out[name.split(':site:')[0]].append(name)
+
+	return out
+
+def rotate_site_queues(names, turn, weights):
+	'''Returns queues of sites, starting from the site whose turn it is'''
+	sequence = [name for name in sorted(names)
+		for i in range(cint(weights.get(name.split(':site:')[1])) or 1)]
+	if not sequence:
+		return []
+
+	i = turn % len(sequence)
+
+	out = []
+	for name in sequence[i:] + sequence[:i]:
+		if name not in out:
+			out.append(name)
+
+	return out
+
+def get_queues(queue):
+	'''Returns Queue objects of a queue, across its priorities and sites'''
+	conn = get_redis_conn()
+	return [Queue(name, connection=conn) for name in get_fair_queue_names([queue], conn=conn)]
+
+def validate_priority(priority):
+	if priority not in priorities:
+		frappe.throw(_("Priority should be one of {0}").format(', '.join(priorities)))
 
 def validate_queue(queue, default_queue_list=None):
 	if not default_queue_list:
@@ -94,11 +94,21 @@ def to_csv(data):
 
 	return writer.getvalue()
 
+def write_csv(data, file):
+	"""Writes rows of `data` to `file` as they are read, so `data` can be a generator"""
+	from frappe.utils.xlsxutils import handle_html
+
+	writer = csv.writer(file)
+	for row in data:
+		# encode only unicode type strings and not int, floats etc.
+		writer.writerow([handle_html(frappe.as_unicode(v)).encode('utf-8')
+			if isinstance(v, string_types) else v for v in row])
 
 class UnicodeWriter:
-	def __init__(self, encoding="utf-8"):
+	def __init__(self, encoding="utf-8", file=None):
+		"""Writes encoded rows to `file` if given (opened in binary mode), else in memory"""
 		self.encoding = encoding
-		self.queue = StringIO()
+		self.queue = file or StringIO()
 		self.writer = csv.writer(self.queue, quoting=csv.QUOTE_NONNUMERIC)
 
 	def writerow(self, row):
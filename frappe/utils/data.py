@@ -7,17 +7,13 @@ from __future__ import unicode_literals
 import frappe
 import operator
 import re, urllib, datetime, math, time
-import babel.dates
-from babel.core import UnknownLocaleError
 from dateutil import parser
-from num2words import num2words
 from six.moves import html_parser as HTMLParser
 <<<<<<< HEAD
 from six.moves.urllib.parse import quote
 =======
 from six.moves.urllib.parse import quote, urljoin
 >>>>>>> 176d241496ede1357a309fa44a037b757a252581
-from html2text import html2text
 from six import iteritems, text_type, string_types, integer_types
 
 DATE_FORMAT = "%Y-%m-%d"
@@ -226,6 +222,9 @@ def formatdate(string_date=None, format_string=None):
 	if not format_string:
 		format_string = get_user_format().replace("mm", "MM")
 
+	import babel.dates
+	from babel.core import UnknownLocaleError
+
 	try:
 		formatted_date = babel.dates.format_date(date, format_string, locale=(frappe.local.lang or "").replace("-", "_"))
 	except UnknownLocaleError:
@@ -233,6 +232,9 @@ def formatdate(string_date=None, format_string=None):
 	return formatted_date
 
 def format_time(txt):
+	import babel.dates
+	from babel.core import UnknownLocaleError
+
 	try:
 		formatted_time = babel.dates.format_time(get_time(txt), locale=(frappe.local.lang or "").replace("-", "_"))
 	except UnknownLocaleError:
@@ -247,6 +249,9 @@ def format_datetime(datetime_string, format_string=None):
 	if not format_string:
 		format_string = get_user_format().replace("mm", "MM") + " HH:mm:ss"
 
+	import babel.dates
+	from babel.core import UnknownLocaleError
+
 	try:
 		formatted_datetime = babel.dates.format_datetime(datetime, format_string, locale=(frappe.local.lang or "").replace("-", "_"))
 	except UnknownLocaleError:
@@ -255,6 +260,7 @@ def format_datetime(datetime_string, format_string=None):
 
 def global_date_format(date):
 	"""returns localized date in the form of January 1, 2012"""
+	import babel.dates
 	date = getdate(date)
 	formatted_date = babel.dates.format_date(date, locale=(frappe.local.lang or "en").replace("-", "_"), format="long")
 	return formatted_date
@@ -490,6 +496,11 @@ def money_in_words(number, main_currency = None, fraction_currency=None):
 #
 # convert number to words
 #
+def num2words(number, *args, **kwargs):
+	'''Wraps `num2words.num2words`, imported on first use as it is slow to import'''
+	from num2words import num2words as _num2words
+	return _num2words(number, *args, **kwargs)
+
 def in_words(integer, in_million=True):
 	"""
 	Returns string in words for the given integer.
@@ -840,6 +851,11 @@ def strip(val, chars=None):
 	# \ufeff is no-width-break, \u200b is no-width-space
 	return (val or "").replace("\ufeff", "").replace("\u200b", "").strip(chars)
 
+def html2text(html, *args, **kwargs):
+	'''Wraps `html2text.html2text`, imported on first use as it is slow to import'''
+	from html2text import html2text as _html2text
+	return _html2text(html, *args, **kwargs)
+
 def to_markdown(html):
 	text = None
 	try:
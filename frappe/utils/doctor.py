@@ -2,8 +2,8 @@ from __future__ import unicode_literals, print_function
 import frappe.utils
 from collections import defaultdict
 from rq import Worker, Connection
-from frappe.utils.background_jobs import get_redis_conn, get_queue, get_queue_list
-from frappe.utils.scheduler import is_scheduler_disabled
+from frappe.utils.background_jobs import get_redis_conn, get_queues, get_queue_list
+from frappe.utils.scheduler import is_scheduler_disabled, get_tick_metrics
 from six import iteritems
 
 
@@ -21,23 +21,23 @@ def purge_pending_jobs(event=None, site=None, queue=None):
 	"""
 	purged_task_count = 0
 	for queue in get_queue_list(queue):
-		q = get_queue(queue)
-		for job in q.jobs:
-			if (site and event):
-				if job.kwargs['site'] == site and job.kwargs['event'] == event:
-					job.delete()
-					purged_task_count+=1
-			elif site:
-				if job.kwargs['site'] == site:
-					job.delete()
-					purged_task_count+=1
-			elif event:
-				if job.kwargs['event'] == event:
-					job.delete()
-					purged_task_count+=1
-			else:
-				purged_task_count += q.count
-				q.empty()
+		for q in get_queues(queue):
+			for job in q.jobs:
+				if (site and event):
+					if job.kwargs['site'] == site and job.kwargs['event'] == event:
+						job.delete()
+						purged_task_count+=1
+				elif site:
+					if job.kwargs['site'] == site:
+						job.delete()
+						purged_task_count+=1
+				elif event:
+					if job.kwargs['event'] == event:
+						job.delete()
+						purged_task_count+=1
+				else:
+					purged_task_count += q.count
+					q.empty()
 
 
 	return purged_task_count
@@ -46,12 +46,12 @@ def get_jobs_by_queue(site=None):
 	jobs_per_queue = defaultdict(list)
 	job_count = consolidated_methods = {}
 	for queue in get_queue_list():
-		q = get_queue(queue)
-		for job in q.jobs:
-			if not site:
-				jobs_per_queue[queue].append(job.kwargs.get('method') or job.description)
-			elif job.kwargs['site'] == site:
-				jobs_per_queue[queue].append(job.kwargs.get('method') or job.description)
+		for q in get_queues(queue):
+			for job in q.jobs:
+				if not site:
+					jobs_per_queue[queue].append(job.kwargs.get('method') or job.description)
+				elif job.kwargs['site'] == site:
+					jobs_per_queue[queue].append(job.kwargs.get('method') or job.description)
 
 		consolidated_methods = {}
 
@@ -71,12 +71,12 @@ def get_jobs_by_queue(site=None):
 def get_pending_jobs(site=None):
 	jobs_per_queue = defaultdict(list)
 	for queue in get_queue_list():
-		q = get_queue(queue)
-		for job in q.jobs:
-			method_kwargs = job.kwargs['kwargs'] if job.kwargs['kwargs'] else ""
-			if job.kwargs['site'] == site:
-				jobs_per_queue[queue].append("{0} {1}".
-					format(job.kwargs['method'], method_kwargs))
+		for q in get_queues(queue):
+			for job in q.jobs:
+				method_kwargs = job.kwargs['kwargs'] if job.kwargs['kwargs'] else ""
+				if job.kwargs['site'] == site:
+					jobs_per_queue[queue].append("{0} {1}".
+						format(job.kwargs['method'], method_kwargs))
 
 	return jobs_per_queue
 
@@ -111,6 +111,15 @@ def doctor(site=None):
 			print("Scheduler disabled for", s)
 		frappe.destroy()
 
+	with frappe.init_site(site):
+		tick = get_tick_metrics()
+
+	if tick:
+		print("Last scheduler tick: {0}, {1} sites in {2}s".format(tick.last_tick, tick.sites, tick.duration))
+		print("Tick duration (last 100): average {0}s, max {1}s".format(tick.average_duration, tick.max_duration))
+		if tick.behind:
+			print("Scheduler is falling behind, the last tick took longer than the interval of {0}s".format(tick.interval))
+
 	# TODO improve this
 	print("Workers online:", workers_online)
 	print("-----{0} Jobs-----".format(site))
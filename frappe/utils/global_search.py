@@ -115,14 +115,8 @@ def rebuild_for_doctype(doctype):
 				# some doctypes has been deleted via future patch, hence controller does not exists
 				pass
 
-			all_contents.append({
-				"doctype": frappe.db.escape(doctype),
-				"name": frappe.db.escape(doc.name),
-				"content": frappe.db.escape(' ||| '.join(content or '')),
-				"published": published,
-				"title": frappe.db.escape(title or ''),
-				"route": frappe.db.escape(route or '')
-			})
+			all_contents.append([doctype, doc.name, ' ||| '.join(content or ''), published,
+				title or '', route or ''])
 	if all_contents:
 		insert_values_for_multiple_docs(all_contents)
 
@@ -182,21 +176,10 @@ def get_children_data(doctype, meta):
 	return all_children, child_search_fields
 
 def insert_values_for_multiple_docs(all_contents):
-	values = []
-	for content in all_contents:
-		values.append("( '{doctype}', '{name}', '{content}', '{published}', '{title}', '{route}')"
-			.format(**content))
-
-	batch_size = 50000
-	for i in range(0, len(values), batch_size):
-		batch_values = values[i:i + batch_size]
-		# ignoring duplicate keys for doctype_name
-		frappe.db.sql('''
-			insert ignore into __global_search
-				(doctype, name, content, published, title, route)
-			values
-				{0}
-			'''.format(", ".join(batch_values)))
+	'''Insert rows of `[doctype, name, content, published, title, route]` in __global_search'''
+	# ignoring duplicate keys for doctype_name
+	frappe.db.bulk_insert("__global_search", ["doctype", "name", "content", "published", "title", "route"],
+		all_contents, ignore_duplicates=True)
 
 
 def update_global_search(doc):
@@ -254,17 +237,23 @@ def sync_global_search(flags=None):
 
 	# Can pass flags manually as frappe.flags.update_global_search isn't reliable at a later time,
 	# when syncing is enqueued
-	for value in flags:
-		frappe.db.sql('''
-			insert into __global_search
-				(doctype, name, content, published, title, route)
-			values
-				(%(doctype)s, %(name)s, %(content)s, %(published)s, %(title)s, %(route)s)
-			on duplicate key update
-				content = %(content)s''', value)
+	fields = ["doctype", "name", "content", "published", "title", "route"]
+	frappe.db.bulk_insert("__global_search", fields, [[value.get(f) for f in fields] for value in flags],
+		update_on_duplicate=["content"])
 
 	frappe.flags.update_global_search = []
 
+def sync_global_search_batch(batch):
+	'''Sync values of many requests, enqueued via `frappe.enqueue_batched`.
+	Only the latest value of a document is written.'''
+	values = {}
+	for flags in batch:
+		for value in flags:
+			values[(value['doctype'], value['name'])] = value
+
+	if values:
+		sync_global_search(list(values.values()))
+
 def delete_for_document(doc):
 	'''Delete the __global_search entry of a document that has
 		been deleted
@@ -2,6 +2,9 @@
 # MIT License. See license.txt
 from __future__ import unicode_literals
 
+# compiled templates, shared by the environments of all requests of this process
+bytecode_cache = None
+
 def get_jenv():
 	import frappe
 
@@ -10,7 +13,7 @@ def get_jenv():
 
 		# frappe will be loaded last, so app templates will get precedence
 		jenv = Environment(loader = get_jloader(),
-			undefined=DebugUndefined)
+			undefined=DebugUndefined, bytecode_cache=get_bytecode_cache())
 		set_filters(jenv)
 
 		jenv.globals.update(get_allowed_functions_for_jenv())
@@ -22,6 +25,45 @@ def get_jenv():
 def get_template(path):
 	return get_jenv().get_template(path)
 
+def get_bytecode_cache():
+	'''Returns an in-memory jinja bytecode cache. Templates are compiled once per process
+	(or once before forking, see `frappe.app.warm_up`), instead of once per request.
+	Changed templates are compiled again as the checksum of their source does not match.'''
+	global bytecode_cache
+
+	if not bytecode_cache:
+		from jinja2 import BytecodeCache
+
+		class MemoryBytecodeCache(BytecodeCache):
+			def __init__(self):
+				self.cache = {}
+
+			def load_bytecode(self, bucket):
+				code = self.cache.get(bucket.key)
+				if code:
+					bucket.bytecode_from_string(code)
+
+			def dump_bytecode(self, bucket):
+				self.cache[bucket.key] = bucket.bytecode_to_string()
+
+			def clear(self):
+				self.cache = {}
+
+		bytecode_cache = MemoryBytecodeCache()
+
+	return bytecode_cache
+
+def compile_templates():
+	'''Compiles the jinja templates of installed apps into the bytecode cache'''
+	jenv = get_jenv()
+	for name in jenv.list_templates(extensions=('html',)):
+		if '/templates/' in '/' + name or '/www/' in '/' + name:
+			try:
+				jenv.get_template(name)
+			except Exception:
+				# not a jinja template
+				pass
+
 def get_email_from_template(name, args):
 	from jinja2 import TemplateNotFound
 
@@ -0,0 +1,115 @@
+# Copyright (c) 2017, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+"""
+Histograms of queue wait time and run time of background jobs, per site, queue and method.
+
+Counts are kept in a redis hash per hour, `frappe:job_metrics:<YYYYmmddHH>`, with fields
+`<site>|<queue>|<method>|<metric>`, and expire after `JOB_METRICS_DAYS`.
+"""
+
+from __future__ import unicode_literals
+import frappe
+from datetime import datetime, timedelta
+from frappe.utils import cstr, flt
+
+JOB_METRICS_DAYS = 7
+job_metrics_key = 'frappe:job_metrics'
+
+# upper bounds of histogram buckets, in seconds
+BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 'inf')
+
+def record_job(site, queue, method, wait_time, run_time, retry, status):
+	'''Adds a run of a job to the histograms of the current hour.
+
+	:param wait_time: Seconds from enqueue to start, None for retries
+	:param run_time: Seconds taken by the method
+	:param retry: Retry count of this run
+	:param status: `finished`, `failed` or `retried`'''
+	from frappe.utils.background_jobs import get_redis_conn
+
+	key = get_hour_key(datetime.utcnow())
+	prefix = '{0}|{1}|{2}|'.format(site, queue, method)
+
+	pipe = get_redis_conn().pipeline(transaction=False)
+	pipe.hincrby(key, prefix + 'count', 1)
+	pipe.hincrby(key, prefix + status, 1)
+	if retry:
+		pipe.hincrby(key, prefix + 'retries', 1)
+
+	pipe.hincrbyfloat(key, prefix + 'run_sum', run_time)
+	pipe.hincrby(key, prefix + 'run:' + get_bucket(run_time), 1)
+
+	if wait_time is not None:
+		pipe.hincrbyfloat(key, prefix + 'wait_sum', wait_time)
+		pipe.hincrby(key, prefix + 'wait:' + get_bucket(wait_time), 1)
+
+	pipe.expire(key, JOB_METRICS_DAYS * 86400)
+	pipe.execute()
+
+def get_job_metrics(site=None, hours=24, method=None):
+	'''Returns metrics of jobs for the last `hours`, per site, queue and method,
+	with the most frequent first. Percentiles are the upper bound of their bucket.
+	`wait_summary` and `run_summary` are the average and p95 formatted for display.'''
+	from frappe.utils.background_jobs import get_redis_conn
+
+	now = datetime.utcnow()
+	pipe = get_redis_conn().pipeline(transaction=False)
+	for i in range(min(int(hours), JOB_METRICS_DAYS * 24)):
+		pipe.hgetall(get_hour_key(now - timedelta(hours=i)))
+
+	metrics = {}
+	for values in pipe.execute():
+		for field, value in values.items():
+			job_site, queue, job_method, metric = cstr(field).split('|', 3)
+			if (site and job_site != site) or (method and job_method != method):
+				continue
+
+			m = metrics.setdefault((job_site, queue, job_method), frappe._dict(site=job_site,
+				queue=queue, method=job_method, wait={}, run={}))
+
+			if ':' in metric:
+				histogram, bucket = metric.split(':')
+				m[histogram][bucket] = m[histogram].get(bucket, 0) + int(value)
+			else:
+				m[metric] = flt(m.get(metric)) + flt(value)
+
+	out = []
+	for m in metrics.values():
+		for histogram in ('wait', 'run'):
+			count = sum(m[histogram].values())
+			m['avg_' + histogram] = flt(m.get(histogram + '_sum')) / count if count else None
+			for p in (50, 95, 99):
+				m['{0}_p{1}'.format(histogram, p)] = get_percentile(m[histogram], count, p)
+
+			m[histogram + '_summary'] = '-' if m['avg_' + histogram] is None else '{0:.2f}s / {1}'.format(
+				m['avg_' + histogram], format_percentile(m[histogram + '_p95']))
+
+		out.append(m)
+
+	return sorted(out, key=lambda m: m.get('count'), reverse=True)
+
+def get_percentile(histogram, count, p):
+	'''Returns the upper bound of the bucket of the `p`th percentile, or `">900"` (the last
+	finite bound with a ">" marker) if it falls in the overflow bucket, None if there are no runs'''
+	total = 0
+	for bucket in BUCKETS:
+		total += histogram.get(str(bucket), 0)
+		if count and total >= count * p / 100.0:
+			return bucket if bucket != 'inf' else '>{0}'.format(BUCKETS[-2])
+
+def format_percentile(value):
+	'''Returns a percentile as `5s`, `>900s`, or `-` if there were no runs'''
+	if value is None:
+		return '-'
+
+	return '{0}s'.format(value)
+
+def get_bucket(seconds):
+	for bucket in BUCKETS[:-1]:
+		if seconds <= bucket:
+			return str(bucket)
+
+	return 'inf'
+
+def get_hour_key(dt):
+	return '{0}:{1}'.format(job_metrics_key, dt.strftime('%Y%m%d%H'))
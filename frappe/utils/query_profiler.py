@@ -0,0 +1,144 @@
+# Copyright (c) 2015, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+"""Per request profiling of database queries and slow query log.
+
+Enable in `site_config.json`:
+
+	"profile_queries": 1,              # profile every request
+	"query_profiler_max_queries": 500, # queries kept with their timings per request
+	"slow_query_threshold": 0.5        # log queries taking longer than 0.5 seconds
+
+In `developer_mode`, a single request can be profiled by sending the
+`X-Frappe-Profile-Queries` header.
+
+The summary of a profiled request is sent back as `X-Frappe-Query-*` response headers
+and stored for an hour, so it can be fetched via `get_profile` with the key in the
+`X-Frappe-Query-Profile` header."""
+
+from __future__ import unicode_literals
+
+import frappe
+import re
+import os
+import traceback
+from collections import deque
+
+PROFILE_EXPIRY = 3600
+
+class QueryProfiler(object):
+	"""Records queries of a request. Only the last `max_queries` are kept with
+	their duration and caller, while all of them are aggregated by normalized query."""
+	def __init__(self, max_queries=500):
+		self.queries = deque(maxlen=max_queries)
+		self.aggregates = {}
+		self.count = 0
+		self.total_time = 0.0
+
+	def record(self, query, duration, rowcount):
+		normalized = normalize_query(query)
+
+		self.count += 1
+		self.total_time += duration
+		self.queries.append(frappe._dict({
+			"query": normalized,
+			"duration": duration,
+			"rows": rowcount,
+			"stack": get_caller_stack()
+		}))
+
+		aggregate = self.aggregates.get(normalized)
+		if not aggregate:
+			aggregate = self.aggregates[normalized] = frappe._dict({
+				"query": normalized,
+				"count": 0,
+				"total_time": 0.0,
+				"max_time": 0.0,
+				"rows": 0
+			})
+
+		aggregate.count += 1
+		aggregate.total_time += duration
+		aggregate.max_time = max(aggregate.max_time, duration)
+		aggregate.rows += max(rowcount, 0)
+
+	def get_duplicates(self):
+		"""Returns aggregates of queries run more than once, a sign of N+1 queries"""
+		return [d for d in self.aggregates.values() if d.count > 1]
+
+	def get_summary(self):
+		return {
+			"count": self.count,
+			"total_time": self.total_time,
+			"duplicates": sorted(self.get_duplicates(), key=lambda d: d.count, reverse=True),
+			"aggregates": sorted(self.aggregates.values(), key=lambda d: d.total_time, reverse=True),
+			"queries": list(self.queries)
+		}
+
+def start(max_queries=None):
+	"""Start profiling queries of the current request / job"""
+	frappe.local.query_profiler = QueryProfiler(max_queries
+		or frappe.conf.query_profiler_max_queries or 500)
+
+def stop(response=None):
+	"""Stop profiling, store the summary and set it in the response headers"""
+	profiler = getattr(frappe.local, "query_profiler", None)
+	if not profiler:
+		return
+
+	frappe.local.query_profiler = None
+	key = frappe.generate_hash(length=10)
+
+	summary = profiler.get_summary()
+	summary["path"] = frappe.request.path if getattr(frappe.local, "request", None) else None
+	summary["lookup_cache"] = frappe.db.get_lookup_cache_stats() if frappe.db else None
+	frappe.cache().set_value("query_profile:" + key, summary, expires_in_sec=PROFILE_EXPIRY)
+
+	if response:
+		response.headers["X-Frappe-Query-Profile"] = key
+		response.headers["X-Frappe-Query-Count"] = str(profiler.count)
+		response.headers["X-Frappe-Query-Time"] = "{0:.2f}".format(profiler.total_time * 1000)
+		response.headers["X-Frappe-Duplicate-Queries"] = str(len(summary["duplicates"]))
+		if summary["lookup_cache"]:
+			response.headers["X-Frappe-Lookup-Cache-Hits"] = str(summary["lookup_cache"].hits)
+
+	return profiler
+
+def is_enabled_for_request(request):
+	return frappe.conf.profile_queries or (frappe.conf.developer_mode
+		and request.headers.get("X-Frappe-Profile-Queries"))
+
+def record(query, values, duration, rowcount):
+	"""Called by `Database.sql` after each query"""
+	profiler = getattr(frappe.local, "query_profiler", None)
+	if profiler:
+		profiler.record(query, duration, rowcount)
+
+	threshold = frappe.conf.slow_query_threshold
+	if threshold and duration > threshold:
+		log_slow_query(query, values, duration, rowcount)
+
+def log_slow_query(query, values, duration, rowcount):
+	frappe.logger("frappe.slow_query").warning("Slow Query ({0:.3f}s, {1} rows):\n{2}\nValues: {3}\n{4}"
+		.format(duration, rowcount, query, values, "\n".join(get_caller_stack())))
+
+def normalize_query(query):
+	"""Replace literals and placeholders with `?` so that queries differing
+	only by values are aggregated together"""
+	query = re.sub(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"", "?", query)
+	query = re.sub(r"%\([^)]+\)s|%s|\b\d+(\.\d+)?\b", "?", query)
+	query = re.sub(r"\(\s*\?(\s*,\s*\?)*\s*\)", "(?)", query)
+	return re.sub(r"\s+", " ", query).strip()
+
+def get_caller_stack(limit=5):
+	"""Returns the last `limit` frames calling the database, outside of this module and `frappe.database`"""
+	ignore = (os.path.join("frappe", "database.py"), os.path.join("frappe", "utils", "query_profiler.py"))
+	stack = [frame for frame in traceback.extract_stack()
+		if not frame[0].endswith(ignore)]
+
+	return ["{0}:{1} {2}".format(*frame[:3]) for frame in stack[-limit:]]
+
+@frappe.whitelist()
+def get_profile(key):
+	"""Returns the stored query profile of a request"""
+	frappe.only_for("System Manager")
+	return frappe.cache().get_value("query_profile:" + key, expires=True)
@@ -4,6 +4,7 @@
 from __future__ import unicode_literals
 import json
 import datetime
+import gzip
 import mimetypes
 import os
 import frappe
@@ -17,9 +18,8 @@ from werkzeug.wsgi import wrap_file
 from werkzeug.wrappers import Response
 from werkzeug.exceptions import NotFound, Forbidden
 from frappe.core.doctype.file.file import check_file_permission
-from frappe.website.render import render
 from frappe.utils import cint
-from six import text_type
+from six import text_type, BytesIO
 
 def report_error(status_code):
 	'''Build error. Show traceback in developer mode'''
@@ -42,7 +42,8 @@ def build_response(response_type=None):
 		'json': as_json,
 		'page': as_page,
 		'redirect': redirect,
-		'binary': as_binary
+		'binary': as_binary,
+		'file': as_file
 	}
 
 	return response_type_map[frappe.response.get('type') or response_type]()
@@ -72,8 +73,20 @@ def as_json():
 	response.mimetype = 'application/json'
 	response.charset = 'utf-8'
 	response.data = json.dumps(frappe.local.response, default=json_handler, separators=(',',':'))
+
+	if frappe.local.flags.gzip_response and getattr(frappe.local, "request", None) \
+		and "gzip" in frappe.local.request.headers.get("Accept-Encoding", ""):
+		response.data = gzip_compress(response.data)
+		response.headers[b"Content-Encoding"] = b"gzip"
+
 	return response
 
+def gzip_compress(data):
+	out = BytesIO()
+	with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6) as f:
+		f.write(data)
+	return out.getvalue()
+
 def as_binary():
 	response = Response()
 	response.mimetype = 'application/octet-stream'
@@ -81,6 +94,17 @@ def as_binary():
 	response.data = frappe.response['filecontent']
 	return response
 
+def as_file():
+	"""Streams a file generated for this response from disk and removes it"""
+	path = frappe.response['filepath']
+	f = open(path, 'rb')
+	os.remove(path)
+
+	response = Response(wrap_file(frappe.local.request.environ, f), direct_passthrough=True)
+	response.mimetype = mimetypes.guess_type(frappe.response['filename'])[0] or b'application/octet-stream'
+	response.headers[b"Content-Disposition"] = ("attachment; filename=\"%s\"" % frappe.response['filename'].replace(' ', '_')).encode("utf-8")
+	return response
+
 def make_logs(response = None):
 	"""make strings for msgprint and errprint"""
 	if not response:
@@ -123,6 +147,7 @@ def json_handler(obj):
 
 def as_page():
 	"""print web page"""
+	from frappe.website.render import render
 	return render(frappe.response['route'], http_status_code=frappe.response.get("http_status_code"))
 
 def redirect():
@@ -176,4 +201,5 @@ def handle_session_stopped():
 	frappe.respond_as_web_page(_("Updating"),
 		_("Your system is being updated. Please refresh again after a few moments"),
 		http_status_code=503, indicator_color='orange', fullpage = True, primary_action=None)
-	return frappe.website.render.render("message", http_status_code=503)
+	from frappe.website.render import render
+	return render("message", http_status_code=503)
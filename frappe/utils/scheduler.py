@@ -17,9 +17,10 @@ import time
 import MySQLdb
 import frappe.utils
 import os
-from frappe.utils import get_sites
+from frappe.utils import get_sites, cint, cstr
 from datetime import datetime
-from frappe.utils.background_jobs import enqueue, get_jobs, queue_timeout
+from multiprocessing.pool import ThreadPool
+from frappe.utils.background_jobs import enqueue, queue_timeout, get_redis_conn, enqueue_delayed_jobs
 from frappe.limits import has_expired
 from frappe.utils.data import get_datetime, now_datetime
 from frappe.core.doctype.user.user import STANDARD_USERS
@@ -28,6 +29,11 @@ from six import string_types
 
 DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
 
+# last event of every site, so that a tick can read them at once
+last_event_key = 'frappe:scheduler_last_event'
+tick_key = 'frappe:scheduler_tick'
+tick_durations_key = 'frappe:scheduler_tick_durations'
+
 def start_scheduler():
 	'''Run enqueue_events_for_all_sites every 2 minutes (default).
 	Specify scheduler_interval in seconds in common_site_config.json'''
@@ -35,29 +41,52 @@ def start_scheduler():
 	interval = frappe.get_conf().scheduler_interval or 240
 	schedule.every(interval).seconds.do(enqueue_events_for_all_sites)
 
+	# retries of failed jobs, see `frappe.utils.background_jobs.enqueue_retry`
+	schedule.every(frappe.get_conf().delayed_jobs_interval or 5).seconds.do(enqueue_delayed_jobs)
+
 	while True:
 		schedule.run_pending()
 		time.sleep(1)
 
 def enqueue_events_for_all_sites():
-	'''Loop through sites and enqueue events that are not already queued'''
+	'''Enqueue events that are not already queued for all sites.
+
+	Sites are evaluated concurrently, `scheduler_workers` (default 8) at a time,
+	as set in common_site_config.json. The duration of the tick is recorded in redis
+	and logged if it is longer than the scheduler interval.'''
 
 	if os.path.exists(os.path.join('.', '.restarting')):
 		# Don't add task to queue if webserver is in restart mode
 		return
 
+	start = time.time()
 	with frappe.init_site():
-		jobs_per_site = get_jobs()
 		sites = get_sites()
+		workers = cint(frappe.local.conf.scheduler_workers) or 8
+		interval = cint(frappe.local.conf.scheduler_interval) or 240
+		conn = get_redis_conn()
+
+	last_events = get_last_events(conn)
 
-	for site in sites:
+	def _enqueue_events_for_site(site):
 		try:
-			enqueue_events_for_site(site=site, queued_jobs=jobs_per_site[site])
+			enqueue_events_for_site(site=site, last_event=last_events.get(site))
+			return True
 		except:
 			# it should try to enqueue other sites
 			print(frappe.get_traceback())
+			return False
 
-def enqueue_events_for_site(site, queued_jobs):
+	pool = ThreadPool(max(min(workers, len(sites)), 1))
+	try:
+		results = pool.map(_enqueue_events_for_site, sites)
+	finally:
+		pool.close()
+		pool.join()
+
+	set_tick_metrics(conn, start, len(sites), results.count(False), interval)
+
+def enqueue_events_for_site(site, queued_jobs=None, last_event=None):
 	try:
 		frappe.init(site=site)
 		if frappe.local.conf.maintenance_mode:
@@ -70,7 +99,7 @@ def enqueue_events_for_site(site, queued_jobs):
 		if is_scheduler_disabled():
 			return
 
-		enqueue_events(site=site, queued_jobs=queued_jobs)
+		enqueue_events(site=site, queued_jobs=queued_jobs, last_event=last_event)
 
 		frappe.logger(__name__).debug('Queued events for site {0}'.format(site))
 
@@ -82,15 +111,19 @@ def enqueue_events_for_site(site, queued_jobs):
 	finally:
 		frappe.destroy()
 
-def enqueue_events(site, queued_jobs):
+def enqueue_events(site, queued_jobs=None, last_event=None):
+	'''Enqueue the events due since the last event of the site.
+
+	:param last_event: Last event read from redis, if not given, it is read from System Settings'''
 	nowtime = frappe.utils.now_datetime()
-	last = frappe.db.get_value('System Settings', 'System Settings', 'scheduler_last_event')
+	last = last_event or frappe.db.get_value('System Settings', 'System Settings', 'scheduler_last_event')
 
 	# set scheduler last event
 	frappe.db.set_value('System Settings', 'System Settings',
 		'scheduler_last_event', nowtime.strftime(DATETIME_FORMAT),
 		update_modified=False)
 	frappe.db.commit()
+	get_redis_conn().hset(last_event_key, site, nowtime.strftime(DATETIME_FORMAT))
 
 	out = []
 	if last:
@@ -99,7 +132,45 @@ def enqueue_events(site, queued_jobs):
 
 	return '\n'.join(out)
 
-def enqueue_applicable_events(site, nowtime, last, queued_jobs=()):
+def get_last_events(conn):
+	'''Returns the last scheduler event of all sites as `{site: timestamp}`'''
+	return {cstr(site): cstr(last) for site, last in conn.hgetall(last_event_key).items()}
+
+def set_tick_metrics(conn, start, sites, errors, interval):
+	'''Records the duration of a scheduler tick, along with the last 100 durations'''
+	duration = round(time.time() - start, 3)
+
+	conn.hmset(tick_key, {
+		'last_tick': frappe.utils.now_datetime().strftime(DATETIME_FORMAT),
+		'duration': duration,
+		'sites': sites,
+		'errors': errors,
+		'interval': interval
+	})
+	conn.lpush(tick_durations_key, duration)
+	conn.ltrim(tick_durations_key, 0, 99)
+
+	if duration > interval:
+		frappe.logger(__name__).warning('Scheduler tick for {0} sites took {1}s, longer than the interval of {2}s'
+			.format(sites, duration, interval))
+
+def get_tick_metrics():
+	'''Returns the last scheduler tick, and the average and maximum duration of the last 100 ticks.
+	The scheduler is `behind` if the last tick took longer than the interval.'''
+	conn = get_redis_conn()
+	out = frappe._dict({cstr(key): cstr(value) for key, value in conn.hgetall(tick_key).items()})
+	durations = [float(d) for d in conn.lrange(tick_durations_key, 0, -1)]
+
+	if durations:
+		out.average_duration = round(sum(durations) / len(durations), 3)
+		out.max_duration = max(durations)
+
+		# newest first, a single slow tick in the past does not mean the scheduler is behind now
+		out.behind = durations[0] > cint(out.interval or 240)
+
+	return out
+
+def enqueue_applicable_events(site, nowtime, last, queued_jobs=None):
 	nowtime_str = nowtime.strftime(DATETIME_FORMAT)
 	out = []
 
@@ -143,12 +214,13 @@ def enqueue_applicable_events(site, nowtime, last, queued_jobs=()):
 
 	return out
 
-def trigger(site, event, queued_jobs=(), now=False):
-	"""trigger method in hooks.scheduler_events"""
+def trigger(site, event, queued_jobs=None, now=False):
+	"""trigger method in hooks.scheduler_events
+
+	Handlers already queued or running are not queued again. `queued_jobs` is the list
+	of their methods, if not given, it is looked up for each handler."""
 	queue = 'long' if event.endswith('_long') else 'short'
 	timeout = queue_timeout[queue]
-	if not queued_jobs and not now:
-		queued_jobs = get_jobs(site=site, queue=queue)
 
 	if frappe.flags.in_test:
 		frappe.flags.ran_schedulers.append(event)
@@ -159,7 +231,9 @@ def trigger(site, event, queued_jobs=(), now=False):
 
 	for handler in events:
 		if not now:
-			if handler not in queued_jobs:
+			if queued_jobs is None:
+				enqueue(handler, queue, timeout, event, deduplicate=True)
+			elif handler not in queued_jobs:
 				enqueue(handler, queue, timeout, event)
 		else:
 			scheduler_task(site=site, event=event, handler=handler, now=True)
@@ -7,7 +7,6 @@ import frappe, json
 from frappe import _dict
 import frappe.share
 from frappe.utils import cint
-from frappe.boot import get_allowed_reports
 from frappe.permissions import get_roles, get_valid_perms
 from frappe.core.doctype.domain_settings.domain_settings import get_active_modules
 
@@ -219,6 +218,7 @@ class UserPermissions:
 		return d
 
 	def get_all_reports(self):
+		from frappe.boot import get_allowed_reports
 		return get_allowed_reports()
 
 def get_user_fullname(user):
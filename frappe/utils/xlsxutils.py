@@ -12,7 +12,9 @@ from six import StringIO, string_types
 
 
 # return xlsx file object
-def make_xlsx(data, sheet_name):
+def make_xlsx(data, sheet_name, file=None):
+	"""Writes rows of `data` to a write only workbook. Rows are consumed as they are
+	written, so `data` can be a generator. Saved to `file` if given, else in memory"""
 
 	wb = openpyxl.Workbook(write_only=True)
 	ws = wb.create_sheet(sheet_name, 0)
@@ -31,7 +33,7 @@ def make_xlsx(data, sheet_name):
 
 		ws.append(clean_row)
 
-	xlsx_file = StringIO()
+	xlsx_file = file or StringIO()
 	wb.save(xlsx_file)
 	return xlsx_file
 